@@ -50,6 +50,10 @@ class Settings(BaseSettings):
     cache_ttl: int = Field(default=3600, env="CACHE_TTL")
     enable_query_cache: bool = Field(default=True, env="ENABLE_QUERY_CACHE")
     enable_embedding_cache: bool = Field(default=True, env="ENABLE_EMBEDDING_CACHE")
+    embedding_cache_max_entries: int = Field(default=10000, env="EMBEDDING_CACHE_MAX_ENTRIES")
+    enable_answer_cache: bool = Field(default=True, env="ENABLE_ANSWER_CACHE")
+    answer_cache_max_distance: float = Field(default=0.05, env="ANSWER_CACHE_MAX_DISTANCE")
+    answer_cache_max_entries: int = Field(default=1000, env="ANSWER_CACHE_MAX_ENTRIES")
     
     # =============================================================================
     # LLM API SETTINGS
@@ -69,6 +73,7 @@ class Settings(BaseSettings):
     embedding_model: str = Field(default="all-MiniLM-L6-v2", env="EMBEDDING_MODEL")
     embedding_dimension: int = Field(default=384, env="EMBEDDING_DIMENSION")
     embedding_batch_size: int = Field(default=32, env="EMBEDDING_BATCH_SIZE")
+    embedding_max_concurrency: int = Field(default=4, env="EMBEDDING_MAX_CONCURRENCY")
     use_openai_embeddings: bool = Field(default=False, env="USE_OPENAI_EMBEDDINGS")
     
     # =============================================================================
@@ -93,6 +98,12 @@ class Settings(BaseSettings):
     max_retrieved_chunks: int = Field(default=5, env="MAX_RETRIEVED_CHUNKS")
     similarity_threshold: float = Field(default=0.7, env="SIMILARITY_THRESHOLD")
     rerank_top_k: int = Field(default=3, env="RERANK_TOP_K")
+    retrieval_stage_timeout: float = Field(default=5.0, env="RETRIEVAL_STAGE_TIMEOUT")
+    
+    # pgvector HNSW index parameters (m/ef_construction apply when the index is built)
+    hnsw_m: int = Field(default=16, env="HNSW_M")
+    hnsw_ef_construction: int = Field(default=64, env="HNSW_EF_CONSTRUCTION")
+    hnsw_ef_search: int = Field(default=40, env="HNSW_EF_SEARCH")
     
     max_response_length: int = Field(default=2000, env="MAX_RESPONSE_LENGTH")
     temperature: float = Field(default=0.7, env="TEMPERATURE")
@@ -126,6 +137,14 @@ class Settings(BaseSettings):
     max_concurrent_requests: int = Field(default=100, env="MAX_CONCURRENT_REQUESTS")
     request_timeout: int = Field(default=30, env="REQUEST_TIMEOUT")
     
+    # Background document ingestion
+    ingestion_workers: int = Field(default=2, env="INGESTION_WORKERS")
+    ingestion_progress_interval: float = Field(default=1.0, env="INGESTION_PROGRESS_INTERVAL")
+    ingestion_heartbeat_interval: float = Field(default=15.0, env="INGESTION_HEARTBEAT_INTERVAL")
+    ingestion_lease_seconds: float = Field(default=60.0, env="INGESTION_LEASE_SECONDS")
+    ingestion_poll_interval: float = Field(default=5.0, env="INGESTION_POLL_INTERVAL")
+    ingestion_max_attempts: int = Field(default=3, env="INGESTION_MAX_ATTEMPTS")
+    
     # =============================================================================
     # WEBSOCKET SETTINGS
     # =============================================================================
@@ -258,11 +277,15 @@ class Settings(BaseSettings):
                 "max_retrieved_chunks": self.max_retrieved_chunks,
                 "similarity_threshold": self.similarity_threshold,
                 "rerank_top_k": self.rerank_top_k,
+                "hnsw_m": self.hnsw_m,
+                "hnsw_ef_construction": self.hnsw_ef_construction,
+                "hnsw_ef_search": self.hnsw_ef_search,
             },
             "embedding": {
                 "model": self.embedding_model,
                 "dimension": self.embedding_dimension,
                 "batch_size": self.embedding_batch_size,
+                "max_concurrency": self.embedding_max_concurrency,
                 "use_openai": self.use_openai_embeddings,
             }
         }
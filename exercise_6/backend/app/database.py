@@ -3,12 +3,17 @@ Database configuration and connection management for Exercise 6 RAG Chatbot
 Handles PostgreSQL with pgvector extension
 """
 
+import asyncio
 import logging
+import struct
+import time
+from collections import deque
 from datetime import datetime
 from typing import AsyncGenerator, Dict, Any, Optional
 from contextlib import asynccontextmanager
 
 import asyncpg
+import numpy as np
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from sqlalchemy import text
@@ -23,6 +28,52 @@ engine = None
 async_session_maker = None
 connection_pool = None
 
+
+class PoolMetrics:
+    """Counters for asyncpg pool usage, used to size db_pool_size from data"""
+    
+    def __init__(self, window: int = 1000):
+        self.in_use = 0
+        self.waiters = 0
+        self.max_waiters = 0
+        self.acquires = 0
+        self.timeouts = 0
+        self.total_acquire_ms = 0.0
+        self.max_acquire_ms = 0.0
+        self._recent_acquire_ms = deque(maxlen=window)
+    
+    def record_acquire(self, elapsed_ms: float):
+        self.acquires += 1
+        self.total_acquire_ms += elapsed_ms
+        self.max_acquire_ms = max(self.max_acquire_ms, elapsed_ms)
+        self._recent_acquire_ms.append(elapsed_ms)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        recent = sorted(self._recent_acquire_ms)
+        
+        def percentile(pct: float) -> float:
+            if not recent:
+                return 0.0
+            return round(recent[min(len(recent) - 1, int(len(recent) * pct))], 3)
+        
+        return {
+            "in_use": self.in_use,
+            "waiters": self.waiters,
+            "max_waiters": self.max_waiters,
+            "acquires": self.acquires,
+            "timeouts": self.timeouts,
+            "acquire_latency_ms": {
+                "avg": round(self.total_acquire_ms / self.acquires, 3) if self.acquires else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(self.max_acquire_ms, 3),
+            },
+        }
+
+
+pool_metrics = PoolMetrics()
+
 # =============================================================================
 # DATABASE INITIALIZATION
 # =============================================================================
@@ -57,6 +108,7 @@ async def init_database():
             min_size=5,
             max_size=settings.db_pool_size,
             command_timeout=settings.db_pool_timeout,
+            init=register_vector_codec,
         )
         
         # Test connection
@@ -94,7 +146,7 @@ async def close_database():
 async def check_pgvector_extension():
     """Check if pgvector extension is available"""
     try:
-        async with connection_pool.acquire() as conn:
+        async with get_db_connection() as conn:
             result = await conn.fetchval(
                 "SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = 'vector')"
             )
@@ -143,28 +195,87 @@ async def get_db_session():
             await session.close()
 
 
+async def _connect_direct() -> asyncpg.Connection:
+    """Open a standalone asyncpg connection (used when the pool is not available)"""
+    logger.warning("Connection pool not available, creating direct connection")
+    # Convert SQLAlchemy URL to asyncpg format
+    asyncpg_url = settings.database_url.replace("postgresql+asyncpg://", "postgresql://")
+    conn = await asyncpg.connect(asyncpg_url)
+    await register_vector_codec(conn)
+    return conn
+
+
 async def get_connection() -> asyncpg.Connection:
-    """Get direct asyncpg connection from pool or create new connection"""
+    """
+    Get direct asyncpg connection from pool or create new connection
+    
+    The caller owns the connection and must hand it back with
+    release_connection(); prefer ``async with get_db_connection()``.
+    """
+    if connection_pool:
+        return await connection_pool.acquire(timeout=settings.db_pool_timeout)
+    return await _connect_direct()
+
+
+async def release_connection(conn: asyncpg.Connection):
+    """Return a connection obtained from get_connection()"""
     if connection_pool:
-        return await connection_pool.acquire()
+        await connection_pool.release(conn)
     else:
-        # Fallback: create direct connection if pool not available
-        logger.warning("Connection pool not available, creating direct connection")
-        # Convert SQLAlchemy URL to asyncpg format
-        asyncpg_url = settings.database_url.replace("postgresql+asyncpg://", "postgresql://")
-        return await asyncpg.connect(asyncpg_url)
+        await conn.close()
 
 
 @asynccontextmanager
 async def get_db_connection():
-    """Context manager for direct database connections"""
-    conn = await connection_pool.acquire()
+    """
+    Context manager for direct database connections
+    
+    Pooled connections are always released back to the pool (never closed),
+    and acquire latency / in-use / waiter counts are recorded in pool_metrics.
+    """
+    if not connection_pool:
+        conn = await _connect_direct()
+        try:
+            yield conn
+        finally:
+            await conn.close()
+        return
+    
+    start_time = time.perf_counter()
+    pool_metrics.waiters += 1
+    pool_metrics.max_waiters = max(pool_metrics.max_waiters, pool_metrics.waiters)
+    try:
+        conn = await connection_pool.acquire(timeout=settings.db_pool_timeout)
+    except asyncio.TimeoutError:
+        pool_metrics.timeouts += 1
+        raise
+    finally:
+        pool_metrics.waiters -= 1
+    pool_metrics.record_acquire((time.perf_counter() - start_time) * 1000)
+    
+    pool_metrics.in_use += 1
     try:
         yield conn
     finally:
+        pool_metrics.in_use -= 1
         await connection_pool.release(conn)
 
 
+def get_pool_metrics() -> Dict[str, Any]:
+    """Get connection pool configuration, live usage and acquire latency"""
+    metrics = {
+        "initialized": connection_pool is not None,
+        "configured_max_size": settings.db_pool_size,
+        **pool_metrics.snapshot(),
+    }
+    if connection_pool:
+        metrics["size"] = connection_pool.get_size()
+        metrics["idle"] = connection_pool.get_idle_size()
+        metrics["min_size"] = connection_pool.get_min_size()
+        metrics["max_size"] = connection_pool.get_max_size()
+    return metrics
+
+
 # =============================================================================
 # HEALTH CHECK
 # =============================================================================
@@ -185,13 +296,13 @@ async def get_database_health() -> Dict[str, Any]:
             health_info["details"]["postgresql_version"] = version
         
         # Test connection pool
-        async with connection_pool.acquire() as conn:
+        async with get_db_connection() as conn:
             pool_size = connection_pool.get_size()
             health_info["details"]["pool_size"] = pool_size
             health_info["details"]["pool_available"] = connection_pool.get_idle_size()
         
         # Check pgvector extension
-        async with connection_pool.acquire() as conn:
+        async with get_db_connection() as conn:
             pgvector_available = await conn.fetchval(
                 "SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = 'vector')"
             )
@@ -211,10 +322,39 @@ async def get_database_health() -> Dict[str, Any]:
 # VECTOR OPERATIONS
 # =============================================================================
 
+def encode_vector(value) -> bytes:
+    """Encode a sequence of floats as pgvector binary (uint16 dim, uint16 unused, float4[dim])"""
+    vector = np.asarray(value, dtype='>f4')
+    if vector.ndim != 1:
+        raise ValueError(f"Expected a 1-D vector, got shape {vector.shape}")
+    return struct.pack('>HH', vector.shape[0], 0) + vector.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    """Decode pgvector binary into a float32 NumPy array"""
+    dimension, _ = struct.unpack_from('>HH', data)
+    return np.frombuffer(data, dtype='>f4', count=dimension, offset=4).astype(np.float32)
+
+
+async def register_vector_codec(conn: asyncpg.Connection):
+    """Register a binary codec for the pgvector ``vector`` type on a connection"""
+    try:
+        await conn.set_type_codec(
+            'vector',
+            schema='public',
+            encoder=encode_vector,
+            decoder=decode_vector,
+            format='binary',
+        )
+    except ValueError:
+        # Type lookup fails when the extension is missing; check_pgvector_extension reports it
+        logger.warning("pgvector type not found - binary vector codec not registered")
+
+
 async def create_vector_index(table_name: str, column_name: str, dimension: int):
     """Create vector index for similarity search"""
     try:
-        async with connection_pool.acquire() as conn:
+        async with get_db_connection() as conn:
             # Create IVFFlat index for vector similarity search
             index_name = f"idx_{table_name}_{column_name}_vector"
             
@@ -241,7 +381,7 @@ async def similarity_search(
 ) -> list:
     """Perform vector similarity search"""
     try:
-        async with connection_pool.acquire() as conn:
+        async with get_db_connection() as conn:
             query = f"""
                 SELECT *, 1 - ({column_name} <=> $1) as similarity
                 FROM {table_name}
@@ -265,7 +405,7 @@ async def similarity_search(
 async def execute_raw_query(query: str, *args) -> list:
     """Execute raw SQL query"""
     try:
-        async with connection_pool.acquire() as conn:
+        async with get_db_connection() as conn:
             results = await conn.fetch(query, *args)
             return [dict(row) for row in results]
             
@@ -277,7 +417,7 @@ async def execute_raw_query(query: str, *args) -> list:
 async def execute_raw_command(query: str, *args) -> str:
     """Execute raw SQL command (INSERT, UPDATE, DELETE)"""
     try:
-        async with connection_pool.acquire() as conn:
+        async with get_db_connection() as conn:
             result = await conn.execute(query, *args)
             return result
             
@@ -289,7 +429,7 @@ async def execute_raw_command(query: str, *args) -> str:
 async def get_table_info(table_name: str) -> Dict[str, Any]:
     """Get information about a table"""
     try:
-        async with connection_pool.acquire() as conn:
+        async with get_db_connection() as conn:
             # Get column information
             columns = await conn.fetch("""
                 SELECT column_name, data_type, is_nullable, column_default
@@ -319,7 +459,7 @@ async def get_table_info(table_name: str) -> Dict[str, Any]:
 async def run_migration(migration_sql: str):
     """Run database migration"""
     try:
-        async with connection_pool.acquire() as conn:
+        async with get_db_connection() as conn:
             await conn.execute(migration_sql)
             logger.info("✅ Migration executed successfully")
             
@@ -331,7 +471,7 @@ async def run_migration(migration_sql: str):
 async def check_table_exists(table_name: str) -> bool:
     """Check if table exists"""
     try:
-        async with connection_pool.acquire() as conn:
+        async with get_db_connection() as conn:
             result = await conn.fetchval("""
                 SELECT EXISTS (
                     SELECT FROM information_schema.tables 
@@ -0,0 +1,203 @@
+"""
+Exercise 6: RAG Chatbot - Embedding Cache
+Two-tier cache for embeddings: in-process LRU + persistent PostgreSQL table
+"""
+
+import logging
+import hashlib
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+
+from app.config import settings
+from app.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+EmbedFunction = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of the stripped text, matching document_chunks.content_hash"""
+    return hashlib.sha256(text.strip().encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Embedding cache keyed by (model, sha256(content))
+
+    Lookups go to the in-process LRU first, then to the ``embedding_cache``
+    table; only texts missing from both are sent to the embedding function.
+    Duplicate texts within one request are embedded once.
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: int = None):
+        self.max_entries = max_entries or settings.embedding_cache_max_entries
+        self.ttl_seconds = ttl_seconds or settings.cache_ttl
+        self.enabled = settings.enable_embedding_cache
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._table_ready = False
+        self._stats = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "persistent_errors": 0,
+        }
+
+    async def get_or_compute(
+        self,
+        texts: List[str],
+        compute: EmbedFunction,
+        model: Optional[str] = None
+    ) -> List[List[float]]:
+        """
+        Return embeddings for ``texts`` in order, computing only cache misses
+
+        Args:
+            texts: Texts to embed
+            compute: Coroutine that embeds a list of texts (called with misses only)
+            model: Embedding model name (defaults to the configured RAG model)
+
+        Returns:
+            One embedding per input text
+        """
+        if not texts:
+            return []
+
+        model = model or settings.rag_embedding_model
+        if not self.enabled:
+            return await compute(texts)
+
+        hashes = [content_hash(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+
+        # Tier 1: in-process LRU
+        for digest in hashes:
+            if digest in found:
+                continue
+            embedding = self._memory_get(model, digest)
+            if embedding is not None:
+                found[digest] = embedding
+                self._stats["memory_hits"] += 1
+
+        # Tier 2: persistent table
+        pending = [digest for digest in dict.fromkeys(hashes) if digest not in found]
+        if pending:
+            persisted = await self._persistent_get(model, pending)
+            for digest, embedding in persisted.items():
+                found[digest] = embedding
+                self._memory_put(model, digest, embedding)
+            self._stats["persistent_hits"] += len(persisted)
+
+        # Compute the remaining unique texts
+        missing: Dict[str, str] = {}
+        for text, digest in zip(texts, hashes):
+            if digest not in found and digest not in missing:
+                missing[digest] = text
+
+        if missing:
+            self._stats["misses"] += len(missing)
+            computed = await compute(list(missing.values()))
+            new_entries = list(zip(missing.keys(), computed))
+            for digest, embedding in new_entries:
+                found[digest] = embedding
+                self._memory_put(model, digest, embedding)
+            await self._persistent_put(model, new_entries)
+
+        return [found[digest] for digest in hashes]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache hit/miss statistics"""
+        lookups = self._stats["memory_hits"] + self._stats["persistent_hits"] + self._stats["misses"]
+        hits = self._stats["memory_hits"] + self._stats["persistent_hits"]
+        return {
+            **self._stats,
+            "enabled": self.enabled,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def clear(self):
+        """Drop all in-process entries (the persistent table is kept)"""
+        self._memory.clear()
+
+    # =============================================================================
+    # IN-PROCESS TIER
+    # =============================================================================
+
+    def _memory_get(self, model: str, digest: str) -> Optional[List[float]]:
+        key = (model, digest)
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+
+        stored_at, embedding = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._memory[key]
+            return None
+
+        self._memory.move_to_end(key)
+        return embedding
+
+    def _memory_put(self, model: str, digest: str, embedding: List[float]):
+        key = (model, digest)
+        self._memory[key] = (time.monotonic(), embedding)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    # =============================================================================
+    # PERSISTENT TIER
+    # =============================================================================
+
+    async def _ensure_table(self, conn):
+        if self._table_ready:
+            return
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                model VARCHAR(100) NOT NULL,
+                content_hash VARCHAR(64) NOT NULL,
+                embedding REAL[] NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (model, content_hash)
+            )
+        """)
+        self._table_ready = True
+
+    async def _persistent_get(self, model: str, digests: List[str]) -> Dict[str, List[float]]:
+        try:
+            async with get_db_connection() as conn:
+                await self._ensure_table(conn)
+                rows = await conn.fetch("""
+                    SELECT content_hash, embedding FROM embedding_cache
+                    WHERE model = $1 AND content_hash = ANY($2::text[])
+                """, model, digests)
+                return {row["content_hash"]: list(row["embedding"]) for row in rows}
+        except Exception as e:
+            # The persistent tier is an optimization; fall back to computing
+            self._stats["persistent_errors"] += 1
+            logger.warning(f"Embedding cache lookup failed: {e}")
+            return {}
+
+    async def _persistent_put(self, model: str, entries: List[Tuple[str, List[float]]]):
+        if not entries:
+            return
+        try:
+            async with get_db_connection() as conn:
+                await self._ensure_table(conn)
+                await conn.executemany("""
+                    INSERT INTO embedding_cache (model, content_hash, embedding)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (model, content_hash) DO NOTHING
+                """, [(model, digest, embedding) for digest, embedding in entries])
+        except Exception as e:
+            self._stats["persistent_errors"] += 1
+            logger.warning(f"Embedding cache write failed: {e}")
+
+
+# Global instance shared by all vector/QA services
+embedding_cache = EmbeddingCache()
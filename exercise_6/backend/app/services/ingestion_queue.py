@@ -0,0 +1,432 @@
+"""
+Exercise 6: RAG Chatbot - Document Ingestion Queue
+Background worker pool for document uploads, with job state persisted in PostgreSQL
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Set
+
+from app.config import settings
+from app.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+JOB_COLUMNS = """
+    id, document_id, knowledge_base_id, filename, content_type, file_size,
+    status, progress, result, error, attempts, created_at, started_at, finished_at,
+    worker_id, heartbeat_at
+"""
+
+
+class IngestionJobQueue:
+    """
+    Queue of document ingestion jobs processed by a pool of asyncio workers
+
+    Uploaded files are written to ``upload_directory/ingestion`` and a row is
+    added to ``ingestion_jobs``; the upload request returns immediately. At
+    most ``ingestion_workers`` documents are processed at once. Progress
+    counters are written back at most every ``ingestion_progress_interval``
+    seconds.
+
+    The table is the queue: idle workers claim the oldest queued job with
+    ``FOR UPDATE SKIP LOCKED``, woken by a submit in this process or every
+    ``ingestion_poll_interval`` seconds, so any live process picks up jobs
+    queued by one that died. A claimed job records the claiming process
+    (``worker_id``) and a lease that process renews every
+    ``ingestion_heartbeat_interval`` seconds (``heartbeat_at``). A job still
+    'processing' whose lease is older than ``ingestion_lease_seconds``
+    belongs to a process that died, and is re-queued; jobs another live
+    process is working on are left alone. A job whose worker died during
+    each of ``ingestion_max_attempts`` attempts is marked failed.
+    """
+
+    def __init__(self, num_workers: int = None):
+        self.num_workers = max(1, num_workers or settings.ingestion_workers)
+        self.upload_dir = Path(settings.upload_directory) / "ingestion"
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._lease_task: Optional[asyncio.Task] = None
+        self._table_ready = False
+        # Identifies this process in ingestion_jobs.worker_id
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._active_jobs: Set[str] = set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        """Create the job table, re-queue abandoned jobs and start the workers"""
+        if self.running:
+            return
+
+        self._wakeup = asyncio.Event()
+        async with get_db_connection() as conn:
+            await self._ensure_table(conn)
+            await self._requeue_expired(conn)
+            queued = await conn.fetchval("SELECT COUNT(*) FROM ingestion_jobs WHERE status = 'queued'")
+
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"ingestion-worker-{i}")
+            for i in range(self.num_workers)
+        ]
+        self._lease_task = asyncio.create_task(self._renew_leases(), name="ingestion-leases")
+        logger.info(f"✅ Ingestion queue started with {self.num_workers} workers ({queued} jobs queued)")
+
+    async def stop(self):
+        """Cancel the workers and hand their jobs back, so another process can resume them right away"""
+        tasks = self._workers + ([self._lease_task] if self._lease_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._lease_task = None
+
+        try:
+            async with get_db_connection() as conn:
+                # An interrupted attempt doesn't count towards ingestion_max_attempts
+                await conn.execute("""
+                    UPDATE ingestion_jobs
+                    SET status = 'queued', started_at = NULL, worker_id = NULL, heartbeat_at = NULL,
+                        attempts = GREATEST(attempts - 1, 0)
+                    WHERE status = 'processing' AND worker_id = $1
+                """, self.worker_id)
+        except Exception as e:
+            # Their leases expire and they are re-queued then
+            logger.warning(f"Failed to hand back ingestion jobs: {e}")
+        self._active_jobs.clear()
+        logger.info("✅ Ingestion queue stopped")
+
+    async def submit(
+        self,
+        content: bytes,
+        filename: str,
+        content_type: Optional[str] = None,
+        knowledge_base_id: str = "default"
+    ) -> Dict[str, Any]:
+        """
+        Store an uploaded file and queue it for processing
+
+        Args:
+            content: Raw file bytes
+            filename: Original filename
+            content_type: MIME type reported by the client
+            knowledge_base_id: Knowledge base to add the document to
+
+        Returns:
+            The queued job
+        """
+        if not self.running:
+            raise RuntimeError("Ingestion queue is not running")
+
+        job_id = str(uuid.uuid4())
+        file_path = self.upload_dir / f"{job_id}{Path(filename).suffix.lower()}"
+        await asyncio.get_running_loop().run_in_executor(None, self._write_file, file_path, content)
+
+        try:
+            async with get_db_connection() as conn:
+                row = await conn.fetchrow(f"""
+                    INSERT INTO ingestion_jobs (
+                        id, document_id, knowledge_base_id, filename,
+                        content_type, file_path, file_size
+                    ) VALUES ($1, $2, $3, $4, $5, $6, $7)
+                    RETURNING {JOB_COLUMNS}
+                """, job_id, str(uuid.uuid4()), knowledge_base_id, filename,
+                    content_type, str(file_path), len(content))
+        except Exception:
+            self._remove_file(str(file_path))
+            raise
+
+        self._wakeup.set()
+        logger.info(f"Queued ingestion job {job_id} for {filename}")
+        return self._format_job(row)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job with its progress and throughput"""
+        async with get_db_connection() as conn:
+            row = await conn.fetchrow(
+                f"SELECT {JOB_COLUMNS} FROM ingestion_jobs WHERE id = $1", job_id
+            )
+        return self._format_job(row) if row else None
+
+    async def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """List the most recent jobs, optionally filtered by status"""
+        async with get_db_connection() as conn:
+            rows = await conn.fetch(f"""
+                SELECT {JOB_COLUMNS} FROM ingestion_jobs
+                WHERE $1::text IS NULL OR status = $1
+                ORDER BY created_at DESC
+                LIMIT $2
+            """, status, limit)
+        return [self._format_job(row) for row in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get worker pool status"""
+        return {
+            "running": self.running,
+            "workers": self.num_workers,
+            "processing": len(self._active_jobs),
+            "worker_id": self.worker_id,
+        }
+
+    # =============================================================================
+    # WORKERS
+    # =============================================================================
+
+    async def _worker(self, worker_id: int):
+        while True:
+            try:
+                job = await self._claim_next_job()
+            except Exception as e:
+                logger.error(f"Ingestion worker {worker_id} failed to claim a job: {e}")
+                job = None
+
+            if job is None:
+                # Until a job is submitted here, or the next look for jobs queued elsewhere
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.ingestion_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                # Cleared before the next claim, so a submit from now on wakes us again
+                self._wakeup.clear()
+                continue
+
+            job_id = str(job["id"])
+            self._active_jobs.add(job_id)
+            try:
+                await self._process_job(job_id, job)
+            except Exception as e:
+                logger.error(f"Ingestion worker {worker_id} failed on job {job_id}: {e}")
+            finally:
+                self._active_jobs.discard(job_id)
+
+    async def _claim_next_job(self):
+        """Claim the oldest queued job; rows other workers are claiming right now are skipped"""
+        async with get_db_connection() as conn:
+            return await conn.fetchrow("""
+                UPDATE ingestion_jobs
+                SET status = 'processing', started_at = NOW(), attempts = attempts + 1,
+                    worker_id = $1, heartbeat_at = NOW()
+                WHERE id = (
+                    SELECT id FROM ingestion_jobs
+                    WHERE status = 'queued'
+                    ORDER BY created_at
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, document_id, knowledge_base_id, filename, file_path
+            """, self.worker_id)
+
+    async def _process_job(self, job_id: str, job):
+        # Lazy import, the RAG service is heavy to load
+        from app.services.rag.rag_service import rag_service
+
+        logger.info(f"Processing ingestion job {job_id}: {job['filename']}")
+        last_write = time.monotonic()
+
+        async def on_progress(progress: Dict[str, Any]):
+            nonlocal last_write
+            if time.monotonic() - last_write < settings.ingestion_progress_interval:
+                return
+            last_write = time.monotonic()
+            await self._update_progress(job_id, progress)
+
+        try:
+            result = await rag_service.process_uploaded_document(
+                file_path=job["file_path"],
+                filename=job["filename"],
+                knowledge_base_id=job["knowledge_base_id"],
+                document_id=str(job["document_id"]),
+                on_progress=on_progress
+            )
+        except Exception as e:
+            result = {"processing_status": "failed", "error": str(e)}
+
+        status = "completed" if result.get("processing_status") == "completed" else "failed"
+        async with get_db_connection() as conn:
+            finished = await conn.fetchval("""
+                UPDATE ingestion_jobs
+                SET status = $2, progress = COALESCE($3::jsonb, progress),
+                    result = $4::jsonb, error = $5, finished_at = NOW()
+                WHERE id = $1 AND worker_id = $6
+                RETURNING id
+            """, job_id, status,
+                json.dumps(result["progress"]) if result.get("progress") else None,
+                json.dumps({
+                    "chunks_count": result.get("chunks_count", 0),
+                    "total_characters": result.get("total_characters", 0),
+                    "timings_ms": result.get("timings_ms", {})
+                }),
+                result.get("error"), self.worker_id)
+        if finished is None:
+            # Our lease expired and the job was re-queued; its new worker needs the file
+            logger.warning(f"Ingestion job {job_id} was taken over by another worker, result discarded")
+            return
+
+        self._remove_file(job["file_path"])
+        logger.info(f"Ingestion job {job_id} {status}")
+
+    async def _update_progress(self, job_id: str, progress: Dict[str, Any]):
+        async with get_db_connection() as conn:
+            await conn.execute("""
+                UPDATE ingestion_jobs SET progress = $2::jsonb, heartbeat_at = NOW()
+                WHERE id = $1 AND worker_id = $3
+            """, job_id, json.dumps(progress), self.worker_id)
+
+    async def _renew_leases(self):
+        """Renew the leases of this process's jobs and re-queue jobs whose lease expired"""
+        while True:
+            await asyncio.sleep(settings.ingestion_heartbeat_interval)
+            try:
+                async with get_db_connection() as conn:
+                    if self._active_jobs:
+                        await conn.execute("""
+                            UPDATE ingestion_jobs SET heartbeat_at = NOW()
+                            WHERE id = ANY($1::uuid[]) AND worker_id = $2
+                        """, list(self._active_jobs), self.worker_id)
+                    if await self._requeue_expired(conn):
+                        self._wakeup.set()
+            except Exception as e:
+                logger.error(f"Failed to renew ingestion job leases: {e}")
+
+    async def _requeue_expired(self, conn) -> List[str]:
+        """
+        Re-queue 'processing' jobs whose worker stopped renewing its lease
+
+        A conditional UPDATE, so when several processes look at once each job
+        is re-queued (and then claimed) only once. A missing heartbeat counts
+        as expired. A job that has used up ``ingestion_max_attempts`` is
+        marked failed instead: its worker keeps dying on it.
+
+        Returns:
+            IDs of the re-queued jobs
+        """
+        rows = await conn.fetch("""
+            UPDATE ingestion_jobs
+            SET status = CASE WHEN attempts >= $2 THEN 'failed' ELSE 'queued' END,
+                error = CASE WHEN attempts >= $2
+                    THEN 'Worker stopped during each of ' || attempts || ' attempts'
+                    ELSE error END,
+                started_at = CASE WHEN attempts >= $2 THEN started_at END,
+                finished_at = CASE WHEN attempts >= $2 THEN NOW() END,
+                worker_id = NULL, heartbeat_at = NULL
+            WHERE status = 'processing'
+              AND (heartbeat_at IS NULL OR heartbeat_at < NOW() - make_interval(secs => $1))
+            RETURNING id, status, file_path
+        """, float(settings.ingestion_lease_seconds), settings.ingestion_max_attempts)
+
+        requeued = [str(row["id"]) for row in rows if row["status"] == "queued"]
+        failed = [row for row in rows if row["status"] == "failed"]
+        if requeued:
+            logger.warning(f"Re-queued {len(requeued)} ingestion jobs whose worker lease expired")
+        for row in failed:
+            logger.error(f"Ingestion job {row['id']} failed: its worker stopped on every attempt")
+            self._remove_file(row["file_path"])
+        return requeued
+
+    # =============================================================================
+    # HELPERS
+    # =============================================================================
+
+    async def _ensure_table(self, conn):
+        if self._table_ready:
+            return
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                id UUID PRIMARY KEY,
+                document_id UUID NOT NULL,
+                knowledge_base_id VARCHAR(255) NOT NULL DEFAULT 'default',
+                filename VARCHAR(500) NOT NULL,
+                content_type VARCHAR(100),
+                file_path TEXT NOT NULL,
+                file_size BIGINT,
+                status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                progress JSONB NOT NULL DEFAULT '{}',
+                result JSONB,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP WITH TIME ZONE,
+                finished_at TIMESTAMP WITH TIME ZONE,
+                worker_id VARCHAR(255),
+                heartbeat_at TIMESTAMP WITH TIME ZONE
+            )
+        """)
+        # Tables created before job leases existed
+        await conn.execute("""
+            ALTER TABLE ingestion_jobs
+            ADD COLUMN IF NOT EXISTS worker_id VARCHAR(255),
+            ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITH TIME ZONE
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status
+            ON ingestion_jobs(status, created_at)
+        """)
+        self._table_ready = True
+
+    @staticmethod
+    def _write_file(file_path: Path, content: bytes):
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+
+    @staticmethod
+    def _remove_file(file_path: str):
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to delete ingested file {file_path}: {e}")
+
+    @staticmethod
+    def _format_job(row) -> Dict[str, Any]:
+        progress = row["progress"] or {}
+        if isinstance(progress, str):
+            progress = json.loads(progress)
+        result = row["result"]
+        if isinstance(result, str):
+            result = json.loads(result)
+
+        # Throughput over the processing time so far
+        throughput = {}
+        if row["started_at"]:
+            finished = row["finished_at"] or datetime.now(timezone.utc)
+            elapsed = (finished - row["started_at"]).total_seconds()
+            if elapsed > 0:
+                throughput = {
+                    "elapsed_seconds": round(elapsed, 2),
+                    "chunks_per_second": round(progress.get("rows_written", 0) / elapsed, 2),
+                    "characters_per_second": round(progress.get("characters_extracted", 0) / elapsed, 2),
+                }
+
+        return {
+            "id": str(row["id"]),
+            "document_id": str(row["document_id"]),
+            "knowledge_base_id": row["knowledge_base_id"],
+            "filename": row["filename"],
+            "content_type": row["content_type"],
+            "file_size": row["file_size"],
+            "status": row["status"],
+            "progress": progress,
+            "throughput": throughput,
+            "result": result,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+            "started_at": row["started_at"].isoformat() if row["started_at"] else None,
+            "finished_at": row["finished_at"].isoformat() if row["finished_at"] else None,
+            "worker_id": row["worker_id"],
+            "heartbeat_at": row["heartbeat_at"].isoformat() if row["heartbeat_at"] else None,
+        }
+
+
+# Global instance
+ingestion_queue = IngestionJobQueue()
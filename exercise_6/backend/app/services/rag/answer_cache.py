@@ -0,0 +1,172 @@
+"""
+Semantic Answer Cache for RAG System
+Reuses chat answers for near-identical questions against an unchanged knowledge base
+"""
+
+import logging
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _CacheScope:
+    """Cached answers for one (knowledge base, retrieval parameters) combination"""
+
+    def __init__(self):
+        self.entries: List[Dict[str, Any]] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.vstack([entry["embedding"] for entry in self.entries])
+        return self._matrix
+
+    def add(self, entry: Dict[str, Any], max_entries: int):
+        self.entries.append(entry)
+        if len(self.entries) > max_entries:
+            # Drop the least recently used entry
+            self.entries.pop(min(range(len(self.entries)), key=lambda i: self.entries[i]["last_used"]))
+        self._matrix = None
+
+    def remove(self, indexes: List[int]):
+        for index in sorted(indexes, reverse=True):
+            self.entries.pop(index)
+        self._matrix = None
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by query embedding similarity
+
+    A cached answer is returned when a new query's embedding is within
+    ``answer_cache_max_distance`` cosine distance of a cached query for the
+    same knowledge base and retrieval parameters. Each knowledge base has a
+    version that is bumped when its documents change; answers computed
+    against an older version are never served.
+    """
+
+    def __init__(self):
+        self.enabled = settings.enable_answer_cache
+        self.max_distance = settings.answer_cache_max_distance
+        self.max_entries = settings.answer_cache_max_entries
+        self.ttl_seconds = settings.cache_ttl
+        self._scopes: Dict[Tuple, _CacheScope] = {}
+        self._versions: Dict[str, int] = {}
+        self._epoch = 0  # bumped when every knowledge base is invalidated at once
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "expired": 0}
+
+    def get_version(self, knowledge_base_id: str) -> Tuple[int, int]:
+        """Current document version of a knowledge base"""
+        return self._epoch, self._versions.get(knowledge_base_id, 0)
+
+    def lookup(
+        self,
+        scope_key: Tuple,
+        query_embedding: List[float]
+    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Find a cached answer for a semantically equivalent query
+
+        Args:
+            scope_key: (knowledge_base_id, *retrieval parameters)
+            query_embedding: Embedding of the new query
+
+        Returns:
+            (cached response, similarity) on a hit, otherwise None
+        """
+        if not self.enabled or query_embedding is None:
+            return None
+
+        scope = self._scopes.get(scope_key)
+        if not scope or not scope.entries:
+            self._stats["misses"] += 1
+            return None
+
+        # Expire stale answers before matching
+        now = time.monotonic()
+        expired = [i for i, entry in enumerate(scope.entries) if now - entry["stored_at"] > self.ttl_seconds]
+        if expired:
+            scope.remove(expired)
+            self._stats["expired"] += len(expired)
+            if not scope.entries:
+                self._stats["misses"] += 1
+                return None
+
+        query = self._normalize(query_embedding)
+        similarities = scope.matrix @ query
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+
+        if 1 - similarity > self.max_distance:
+            self._stats["misses"] += 1
+            return None
+
+        entry = scope.entries[best]
+        entry["last_used"] = now
+        self._stats["hits"] += 1
+        return entry["response"], similarity
+
+    def store(
+        self,
+        scope_key: Tuple,
+        query_embedding: List[float],
+        response: Dict[str, Any],
+        version: Tuple[int, int]
+    ) -> bool:
+        """Cache an answer computed against knowledge base ``version``"""
+        if not self.enabled or query_embedding is None:
+            return False
+
+        # The knowledge base changed while the answer was being generated
+        if version != self.get_version(scope_key[0]):
+            return False
+
+        now = time.monotonic()
+        scope = self._scopes.setdefault(scope_key, _CacheScope())
+        scope.add({
+            "embedding": self._normalize(query_embedding),
+            "response": response,
+            "stored_at": now,
+            "last_used": now
+        }, self.max_entries)
+        self._stats["stores"] += 1
+        return True
+
+    def invalidate(self, knowledge_base_id: Optional[str] = None):
+        """Drop cached answers for a knowledge base (or all of them) and bump its version"""
+        if knowledge_base_id is None:
+            self._scopes.clear()
+            self._epoch += 1
+        else:
+            for key in [key for key in self._scopes if key[0] == knowledge_base_id]:
+                del self._scopes[key]
+            self._versions[knowledge_base_id] = self._versions.get(knowledge_base_id, 0) + 1
+        self._stats["invalidations"] += 1
+        logger.info(f"Invalidated semantic answer cache for: {knowledge_base_id or 'all knowledge bases'}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss metrics"""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "enabled": self.enabled,
+            "entries": sum(len(scope.entries) for scope in self._scopes.values()),
+            "max_distance": self.max_distance,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+# Global instance
+answer_cache = SemanticAnswerCache()
@@ -6,9 +6,11 @@ Handles document parsing, chunking, and embedding generation
 import logging
 import os
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable, Awaitable
 from pathlib import Path
+from itertools import islice
 import asyncio
+import time
 
 # Document processing
 import PyPDF2
@@ -19,10 +21,12 @@ import openai
 # ChromaDB imports removed - now using PostgreSQL + pgvector
 
 from app.config import settings
-from app.database import get_connection
+from app.database import get_db_connection
 
 logger = logging.getLogger(__name__)
 
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
 class DocumentProcessor:
     """Handles document processing, chunking, and embedding generation"""
     
@@ -39,224 +43,297 @@ class DocumentProcessor:
         self.vector_service = PostgreSQLVectorService()
         logger.info("Document processor configured to use PostgreSQL + pgvector")
     
-    async def process_document(self, file_path: str, filename: str, document_id: str) -> Dict[str, Any]:
+    async def process_document(
+        self,
+        file_path: str,
+        filename: str,
+        document_id: str,
+        knowledge_base_id: str = "default",
+        on_progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
         """
         Process a document: extract text, chunk it, generate embeddings, and store in vector DB
         
+        Extraction and chunking run as a generator pipeline in a worker thread,
+        one batch of ``embedding_batch_size`` chunks at a time. Each batch is
+        embedded and stored while the next one is extracted, with at most
+        ``embedding_max_concurrency`` batches in flight, so memory is bounded by
+        the batch size rather than the document size.
+        
         Args:
             file_path: Path to the uploaded file
             filename: Original filename
             document_id: Unique document identifier
+            knowledge_base_id: Knowledge base the document's chunks belong to
+            on_progress: Optional coroutine called with progress counters after each stored batch
             
         Returns:
             Dictionary with processing results
         """
+        loop = asyncio.get_running_loop()
+        batch_size = max(1, settings.embedding_batch_size)
+        max_in_flight = max(1, settings.embedding_max_concurrency)
+        
+        progress = {
+            "segments_extracted": 0,
+            "characters_extracted": 0,
+            "chunks_created": 0,
+            "chunks_embedded": 0,
+            "rows_written": 0
+        }
+        timings = {"extract_ms": 0.0, "embedding_ms": 0.0, "store_ms": 0.0}
+        # First chunk index of each stored batch -> ids of its rows (batches finish out of order)
+        stored_ids: Dict[int, List[str]] = {}
+        chunk_iter = self._iter_chunks(self._iter_text_segments(file_path, filename, progress))
+        pending = set()
+        chunk_count = 0
+        
+        def next_batch() -> List[str]:
+            stage_start = time.perf_counter()
+            batch = list(islice(chunk_iter, batch_size))
+            timings["extract_ms"] += (time.perf_counter() - stage_start) * 1000
+            return batch
+        
         try:
             logger.info(f"Processing document: {filename} (ID: {document_id})")
+            start_time = time.perf_counter()
+            await self.vector_service.initialize()
             
-            # Extract text from document
-            text_content = await self._extract_text(file_path, filename)
-            
-            if not text_content.strip():
-                raise ValueError("No text content extracted from document")
-            
-            # Split text into chunks
-            chunks = self._split_text(text_content)
-            logger.info(f"Split document into {len(chunks)} chunks")
-            
-            # Generate embeddings for chunks
-            chunk_embeddings = await self._generate_embeddings(chunks)
-            
-            # Store chunks and embeddings in ChromaDB
-            chunk_ids = []
-            chunk_metadatas = []
-            
-            for i, (chunk, embedding) in enumerate(zip(chunks, chunk_embeddings)):
-                chunk_id = f"{document_id}_chunk_{i}"
-                chunk_ids.append(chunk_id)
+            while True:
+                # Extract and chunk the next batch off the event loop
+                texts = await loop.run_in_executor(None, next_batch)
+                if not texts:
+                    break
                 
-                metadata = {
-                    "document_id": document_id,
-                    "filename": filename,
-                    "chunk_index": i,
-                    "chunk_text": chunk[:500],  # Store first 500 chars for preview
-                    "chunk_length": len(chunk)
-                }
-                chunk_metadatas.append(metadata)
+                batch = []
+                for chunk in texts:
+                    batch.append({
+                        "content": chunk,
+                        "metadata": {
+                            "document_id": document_id,
+                            "knowledge_base_id": knowledge_base_id,
+                            "filename": filename,
+                            "chunk_index": chunk_count,
+                            "chunk_text": chunk[:500],  # Store first 500 chars for preview
+                            "chunk_length": len(chunk)
+                        },
+                        "token_count": len(chunk.split()),
+                        "chunk_index": chunk_count
+                    })
+                    chunk_count += 1
+                progress["chunks_created"] = chunk_count
+                
+                pending.add(asyncio.create_task(
+                    self._store_batch(document_id, batch, timings, progress, stored_ids, on_progress)
+                ))
+                if len(pending) >= max_in_flight:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
             
-            # Add to PostgreSQL + pgvector
-            await self.vector_service.initialize()
+            await asyncio.gather(*pending)
+            pending = set()
             
-            # Prepare chunks for PostgreSQL storage
-            chunk_data = []
-            for i, (chunk, embedding, metadata) in enumerate(zip(chunks, chunk_embeddings, chunk_metadatas)):
-                chunk_data.append({
-                    "content": chunk,
-                    "embedding": embedding,
-                    "metadata": metadata,
-                    "token_count": len(chunk.split()),
-                    "chunk_index": i
-                })
+            if not chunk_count:
+                raise ValueError("No text content extracted from document")
             
-            await self.vector_service.add_document_chunks(document_id, chunk_data)
+            timings = {key: round(value, 2) for key, value in timings.items()}
+            timings["total_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
             
-            logger.info(f"Successfully stored {len(chunks)} chunks in PostgreSQL + pgvector")
+            logger.info(f"Successfully stored {chunk_count} chunks in PostgreSQL + pgvector (timings: {timings})")
             
             return {
                 "document_id": document_id,
                 "filename": filename,
-                "chunks_count": len(chunks),
-                "total_characters": len(text_content),
+                "chunks_count": chunk_count,
+                "total_characters": progress["characters_extracted"],
                 "processing_status": "completed",
-                "chunk_ids": chunk_ids
+                "chunk_ids": [chunk_id for _, ids in sorted(stored_ids.items()) for chunk_id in ids],
+                "timings_ms": timings,
+                "progress": progress
             }
             
         except Exception as e:
             logger.error(f"Error processing document {filename}: {e}")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            
+            # Don't leave a partially stored document behind
+            if chunk_count:
+                try:
+                    await self.vector_service.delete_document_chunks(document_id)
+                except Exception as cleanup_error:
+                    logger.warning(f"Failed to clean up chunks for document {document_id}: {cleanup_error}")
+            
             return {
                 "document_id": document_id,
                 "filename": filename,
                 "processing_status": "failed",
                 "error": str(e)
             }
+        finally:
+            chunk_iter.close()
     
-    async def _extract_text(self, file_path: str, filename: str) -> str:
-        """Extract text content from various file formats"""
+    async def _store_batch(
+        self,
+        document_id: str,
+        batch: List[Dict[str, Any]],
+        timings: Dict[str, float],
+        progress: Dict[str, int],
+        stored_ids: Dict[int, List[str]],
+        on_progress: Optional[ProgressCallback] = None
+    ):
+        """Embed and store one batch of chunks, accumulating stage timings, progress and row ids"""
+        store_timings = {}
+        chunk_ids = await self.vector_service.add_document_chunks(document_id, batch, timings=store_timings)
+        stored_ids[batch[0]["chunk_index"]] = chunk_ids
+        timings["embedding_ms"] += store_timings.get("embedding_ms", 0)
+        timings["store_ms"] += store_timings.get("insert_ms", 0)
+        progress["chunks_embedded"] += len(batch)
+        progress["rows_written"] += len(chunk_ids)
         
+        if on_progress:
+            try:
+                await on_progress(dict(progress))
+            except Exception as e:
+                logger.warning(f"Progress callback failed for document {document_id}: {e}")
+    
+    def _iter_text_segments(
+        self,
+        file_path: str,
+        filename: str,
+        progress: Optional[Dict[str, int]] = None
+    ) -> Iterator[str]:
+        """Yield the text of a document piece by piece (pages, paragraphs or blocks)"""
         file_extension = Path(filename).suffix.lower()
         
+        if file_extension == '.pdf':
+            segments = self._iter_pdf_text(file_path)
+        elif file_extension == '.docx':
+            segments = self._iter_docx_text(file_path)
+        elif file_extension == '.txt':
+            segments = self._iter_txt_text(file_path)
+        else:
+            raise ValueError(f"Unsupported file format: {file_extension}")
+        
         try:
-            if file_extension == '.pdf':
-                return await self._extract_pdf_text(file_path)
-            elif file_extension == '.docx':
-                return await self._extract_docx_text(file_path)
-            elif file_extension == '.txt':
-                return await self._extract_txt_text(file_path)
-            else:
-                raise ValueError(f"Unsupported file format: {file_extension}")
-                
+            for segment in segments:
+                if progress is not None:
+                    progress["segments_extracted"] += 1
+                    progress["characters_extracted"] += len(segment)
+                yield segment
         except Exception as e:
             logger.error(f"Error extracting text from {filename}: {e}")
             raise
     
-    async def _extract_pdf_text(self, file_path: str) -> str:
-        """Extract text from PDF file"""
-        text_content = ""
-        
-        def extract_sync():
-            nonlocal text_content
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text_content += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
-                    except Exception as e:
-                        logger.warning(f"Error extracting text from page {page_num + 1}: {e}")
-        
-        # Run in thread pool to avoid blocking
-        await asyncio.get_event_loop().run_in_executor(None, extract_sync)
-        return text_content
+    def _iter_pdf_text(self, file_path: str) -> Iterator[str]:
+        """Yield the text of a PDF file page by page"""
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for page_num, page in enumerate(pdf_reader.pages):
+                try:
+                    page_text = page.extract_text()
+                except Exception as e:
+                    logger.warning(f"Error extracting text from page {page_num + 1}: {e}")
+                    continue
+                if page_text:
+                    yield f"\n--- Page {page_num + 1} ---\n{page_text}\n"
     
-    async def _extract_docx_text(self, file_path: str) -> str:
-        """Extract text from DOCX file"""
-        text_content = ""
-        
-        def extract_sync():
-            nonlocal text_content
-            doc = Document(file_path)
-            paragraphs = []
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    paragraphs.append(paragraph.text)
-            text_content = "\n".join(paragraphs)
-        
-        await asyncio.get_event_loop().run_in_executor(None, extract_sync)
-        return text_content
+    def _iter_docx_text(self, file_path: str) -> Iterator[str]:
+        """Yield the non-empty paragraphs of a DOCX file, newline separated"""
+        doc = Document(file_path)
+        first = True
+        for paragraph in doc.paragraphs:
+            if paragraph.text.strip():
+                yield paragraph.text if first else "\n" + paragraph.text
+                first = False
     
-    async def _extract_txt_text(self, file_path: str) -> str:
-        """Extract text from TXT file"""
-        def extract_sync():
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-                return file.read()
-        
-        return await asyncio.get_event_loop().run_in_executor(None, extract_sync)
+    def _iter_txt_text(self, file_path: str, block_size: int = 64 * 1024) -> Iterator[str]:
+        """Yield the contents of a TXT file in fixed-size blocks"""
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
+            while True:
+                block = file.read(block_size)
+                if not block:
+                    break
+                yield block
     
-    def _split_text(self, text: str) -> List[str]:
-        """Simple text splitter with overlap"""
-        chunks = []
-        text_length = len(text)
-        
-        if text_length <= self.chunk_size:
-            return [text]
+    def _iter_chunks(self, segments: Iterable[str]) -> Iterator[str]:
+        """
+        Incremental text splitter with overlap
         
+        Produces the same chunks as splitting the concatenated segments at once,
+        but only keeps the text from the current chunk start onwards in memory.
+        """
+        buffer = ""
         start = 0
-        while start < text_length:
-            end = start + self.chunk_size
+        emitted = False
+        
+        for segment in segments:
+            buffer += segment
             
-            # Try to break at sentence or paragraph boundaries
-            if end < text_length:
-                # Look for sentence endings
-                for i in range(end, max(start + self.chunk_size // 2, end - 200), -1):
-                    if text[i] in '.!?\n':
-                        end = i + 1
-                        break
+            # A chunk can be cut once text past its end position is available
+            while len(buffer) - start > self.chunk_size:
+                end = self._find_chunk_end(buffer, start)
+                chunk = buffer[start:end].strip()
+                if chunk:
+                    emitted = True
+                    yield chunk
+                start = end - self.chunk_overlap
             
-            chunk = text[start:end].strip()
+            # Drop text that no later chunk can include
+            if start > 0:
+                buffer = buffer[start:]
+                start = 0
+        
+        # Short documents are returned as a single chunk
+        if not emitted:
+            if buffer.strip():
+                yield buffer
+            return
+        
+        while start < len(buffer):
+            end = self._find_chunk_end(buffer, start)
+            chunk = buffer[start:end].strip()
             if chunk:
-                chunks.append(chunk)
+                yield chunk
             
-            # Move start position with overlap
             start = end - self.chunk_overlap
-            if start >= text_length:
-                break
+    
+    def _find_chunk_end(self, text: str, start: int) -> int:
+        """End of the chunk starting at ``start``, preferring a sentence or paragraph break"""
+        end = start + self.chunk_size
+        if end >= len(text):
+            return end
         
-        return chunks
+        # Look back for the last sentence ending in (lower, end]
+        lower = max(start + self.chunk_size // 2, end - 200)
+        window = text[lower + 1:end + 1]
+        boundary = max(window.rfind(char) for char in '.!?\n')
+        if boundary >= 0:
+            return lower + 1 + boundary + 1
+        return end
+    
+    def _split_text(self, text: str) -> List[str]:
+        """Simple text splitter with overlap"""
+        return list(self._iter_chunks([text]))
     
     async def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts using OpenAI"""
+        """Generate embeddings for a list of texts using OpenAI (cached, batched, concurrent)"""
         try:
-            # Generate embeddings in batches to avoid rate limits
-            batch_size = 100
-            all_embeddings = []
-            
-            for i in range(0, len(texts), batch_size):
-                batch = texts[i:i + batch_size]
-                
-                def generate_sync():
-                    response = self.openai_client.embeddings.create(
-                        model=settings.rag_embedding_model,
-                        input=batch
-                    )
-                    return [embedding.embedding for embedding in response.data]
-                
-                batch_embeddings = await asyncio.get_event_loop().run_in_executor(None, generate_sync)
-                all_embeddings.extend(batch_embeddings)
-                
-                logger.info(f"Generated embeddings for batch {i//batch_size + 1}/{(len(texts) + batch_size - 1)//batch_size}")
-            
-            return all_embeddings
+            return await self.vector_service._generate_embeddings(texts)
             
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
             raise
     
     async def delete_document(self, document_id: str) -> bool:
-        """Delete all chunks for a document from ChromaDB"""
+        """Delete all chunks for a document from PostgreSQL"""
         try:
-            # Get all chunk IDs for this document
-            results = self.collection.get(
-                where={"document_id": document_id}
-            )
-            
-            if results['ids']:
-                self.collection.delete(ids=results['ids'])
-                logger.info(f"Deleted {len(results['ids'])} chunks for document {document_id}")
-                return True
-            else:
+            deleted = await self.vector_service.delete_document_chunks(document_id)
+            if not deleted:
                 logger.warning(f"No chunks found for document {document_id}")
-                return False
+            return deleted > 0
                 
         except Exception as e:
             logger.error(f"Error deleting document {document_id}: {e}")
@@ -266,15 +343,12 @@ class DocumentProcessor:
         """Get statistics about the document collection from PostgreSQL"""
         try:
             await self.vector_service.initialize()
-            conn = await get_connection()
-            try:
+            async with get_db_connection() as conn:
                 count = await conn.fetchval("SELECT COUNT(*) FROM document_chunks")
                 return {
                     "total_chunks": count,
                     "database": "postgresql_pgvector"
                 }
-            finally:
-                await conn.close()
         except Exception as e:
             logger.error(f"Error getting collection stats: {e}")
             return {"total_chunks": 0, "database": "postgresql_pgvector"}
@@ -4,8 +4,7 @@ Handles OpenAI integration for response generation using retrieved context
 """
 
 import logging
-from typing import List, Dict, Any, Optional
-import asyncio
+from typing import List, Dict, Any, Optional, AsyncIterator
 from datetime import datetime
 
 import openai
@@ -46,8 +45,8 @@ class LLMService:
     """Handles LLM integration for response generation"""
     
     def __init__(self):
-        # Initialize OpenAI client
-        self.openai_client = openai.OpenAI(api_key=settings.openai_api_key)
+        # Async OpenAI client for chat completions and streaming
+        self.async_client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
         
         self.system_prompt = """You are a helpful AI assistant that answers questions based on the provided context from documents and Q&A pairs.
 
@@ -90,37 +89,19 @@ Always maintain a helpful and professional tone."""
             
             # Build context from retrieved information
             context = self._build_context(document_chunks, qa_matches)
-            
-            # Create messages for the conversation
-            messages = [{"role": "system", "content": self.system_prompt}]
-            
-            # Add conversation history if provided
-            if conversation_history:
-                for msg in conversation_history[-5:]:  # Last 5 messages for context
-                    if msg.get('role') in ['user', 'assistant']:
-                        messages.append({
-                            "role": msg['role'],
-                            "content": msg['content']
-                        })
-            
-            # Add current query with context
-            user_message = self._format_user_message(query, context)
-            messages.append({"role": "user", "content": user_message})
+            messages = self._build_messages(query, context, conversation_history)
             
             logger.info(f"Generating response for query: '{query[:100]}...'")
             logger.info(f"Context includes {len(document_chunks)} document chunks and {len(qa_matches)} Q&A matches")
             
             # Generate response with timeout
-            def generate_sync():
-                return self.openai_client.chat.completions.create(
-                    model=settings.openai_model,
-                    messages=messages,
-                    temperature=settings.openai_temperature,
-                    max_tokens=min(settings.openai_max_tokens, 500),  # Limit tokens for faster response
-                    timeout=20.0  # 20 second timeout for OpenAI API
-                )
-            
-            response = await asyncio.get_event_loop().run_in_executor(None, generate_sync)
+            response = await self.async_client.chat.completions.create(
+                model=settings.openai_model,
+                messages=messages,
+                temperature=settings.openai_temperature,
+                max_tokens=min(settings.openai_max_tokens, 500),  # Limit tokens for faster response
+                timeout=20.0  # 20 second timeout for OpenAI API
+            )
             
             end_time = datetime.now()
             processing_time = (end_time - start_time).total_seconds() * 1000  # Convert to milliseconds
@@ -156,6 +137,69 @@ Always maintain a helpful and professional tone."""
                 "timestamp": datetime.now().isoformat()
             }
     
+    async def stream_response(
+        self,
+        query: str,
+        document_chunks: List[Dict[str, Any]],
+        qa_matches: List[Dict[str, Any]],
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream response tokens from OpenAI as they are generated
+        
+        Args:
+            query: User's question
+            document_chunks: Relevant document chunks from vector search
+            qa_matches: Matching Q&A pairs
+            conversation_history: Previous conversation messages
+            
+        Yields:
+            Content deltas in generation order
+        """
+        context = self._build_context(document_chunks, qa_matches)
+        messages = self._build_messages(query, context, conversation_history)
+        
+        logger.info(f"Streaming response for query: '{query[:100]}...'")
+        
+        stream = await self.async_client.chat.completions.create(
+            model=settings.openai_model,
+            messages=messages,
+            temperature=settings.openai_temperature,
+            max_tokens=min(settings.openai_max_tokens, 500),
+            stream=True,
+            timeout=20.0
+        )
+        
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    
+    def _build_messages(
+        self,
+        query: str,
+        context: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> List[Dict[str, str]]:
+        """Create the chat messages: system prompt, recent history, then the query with context"""
+        messages = [{"role": "system", "content": self.system_prompt}]
+        
+        # Add conversation history if provided
+        if conversation_history:
+            for msg in conversation_history[-5:]:  # Last 5 messages for context
+                if msg.get('role') in ['user', 'assistant']:
+                    messages.append({
+                        "role": msg['role'],
+                        "content": msg['content']
+                    })
+        
+        # Add current query with context
+        user_message = self._format_user_message(query, context)
+        messages.append({"role": "user", "content": user_message})
+        return messages
+    
     def _build_context(self, document_chunks: List[Dict[str, Any]], qa_matches: List[Dict[str, Any]]) -> str:
         """Build context string from retrieved information"""
         context_parts = []
@@ -211,15 +255,12 @@ Please provide a comprehensive answer based on the context above. If the context
                 {"role": "user", "content": text}
             ]
             
-            def generate_sync():
-                return self.openai_client.chat.completions.create(
-                    model=settings.openai_model,
-                    messages=messages,
-                    temperature=0.3,
-                    max_tokens=100
-                )
-            
-            response = await asyncio.get_event_loop().run_in_executor(None, generate_sync)
+            response = await self.async_client.chat.completions.create(
+                model=settings.openai_model,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=100
+            )
             summary = response.choices[0].message.content
             
             # Truncate if still too long
@@ -240,15 +281,12 @@ Please provide a comprehensive answer based on the context above. If the context
                 {"role": "user", "content": "Say 'API connection successful' if you can read this."}
             ]
             
-            def test_sync():
-                return self.openai_client.chat.completions.create(
-                    model=settings.openai_model,
-                    messages=test_messages,
-                    temperature=0,
-                    max_tokens=50
-                )
-            
-            response = await asyncio.get_event_loop().run_in_executor(None, test_sync)
+            response = await self.async_client.chat.completions.create(
+                model=settings.openai_model,
+                messages=test_messages,
+                temperature=0,
+                max_tokens=50
+            )
             
             return {
                 "status": "connected",
@@ -14,6 +14,7 @@ from chromadb.config import Settings
 import openai
 
 from app.config import settings
+from app.services.embedding_cache import embedding_cache
 
 logger = logging.getLogger(__name__)
 
@@ -133,19 +134,29 @@ class QAEmbeddingService:
             logger.error(f"Failed to add Q&A pair: {e}")
             raise
     
-    async def search_qa_pairs(self, query: str, max_results: int = 5, similarity_threshold: float = 0.7) -> List[Dict[str, Any]]:
-        """Search Q&A pairs using semantic similarity"""
+    async def search_qa_pairs(
+        self,
+        query: str,
+        max_results: int = 5,
+        similarity_threshold: float = 0.7,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Search Q&A pairs using semantic similarity (optionally with a precomputed query embedding)"""
         await self.initialize()
         
         try:
             # Generate query embedding
-            query_embedding = await self._generate_embedding(query)
+            if query_embedding is None:
+                query_embedding = await self._generate_embedding(query)
             
-            # Search in ChromaDB
-            results = self.qa_collection.query(
-                query_embeddings=[query_embedding],
-                n_results=max_results * 2,  # Get more results to filter and deduplicate
-                include=["documents", "metadatas", "distances"]
+            # Search in ChromaDB (HTTP client is synchronous, keep it off the event loop)
+            results = await asyncio.get_event_loop().run_in_executor(
+                None,
+                lambda: self.qa_collection.query(
+                    query_embeddings=[list(query_embedding)],
+                    n_results=max_results * 2,  # Get more results to filter and deduplicate
+                    include=["documents", "metadatas", "distances"]
+                )
             )
             
             # Process results and group by Q&A pair
@@ -258,25 +269,30 @@ class QAEmbeddingService:
             return False
     
     async def _generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for text using OpenAI"""
+        """Generate embedding for text using OpenAI (through the embedding cache)"""
         try:
-            # Run in executor to avoid blocking the event loop with timeout
-            loop = asyncio.get_event_loop()
-            
-            def create_embedding():
-                return self.openai_client.embeddings.create(
-                    model=settings.rag_embedding_model,
-                    input=text.strip(),
-                    timeout=10.0  # 10 second timeout for OpenAI API
-                )
-            
-            response = await loop.run_in_executor(None, create_embedding)
-            return response.data[0].embedding
+            embeddings = await embedding_cache.get_or_compute([text], self._create_embeddings)
+            return embeddings[0]
             
         except Exception as e:
             logger.error(f"Failed to generate embedding: {e}")
             raise
     
+    async def _create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Call the OpenAI embeddings API for cache misses"""
+        # Run in executor to avoid blocking the event loop with timeout
+        loop = asyncio.get_event_loop()
+        
+        def create_embedding():
+            return self.openai_client.embeddings.create(
+                model=settings.rag_embedding_model,
+                input=[text.strip() for text in texts],
+                timeout=10.0  # 10 second timeout for OpenAI API
+            )
+        
+        response = await loop.run_in_executor(None, create_embedding)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    
     async def get_system_status(self) -> Dict[str, Any]:
         """Get Q&A system status"""
         try:
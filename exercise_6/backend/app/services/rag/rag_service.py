@@ -4,14 +4,17 @@ Orchestrates document processing, retrieval, and response generation
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Awaitable, AsyncIterator, Tuple
 from datetime import datetime
+import asyncio
+import time
 import uuid
 
-from .document_processor import document_processor
+from .document_processor import document_processor, ProgressCallback
 from .retrieval_service import retrieval_service
 from .llm_service import llm_service
 from .qa_service import qa_service
+from .answer_cache import answer_cache
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -24,18 +27,28 @@ class RAGService:
         self.retrieval_service = retrieval_service
         self.llm_service = llm_service
     
-    async def process_uploaded_document(self, file_path: str, filename: str) -> Dict[str, Any]:
+    async def process_uploaded_document(
+        self,
+        file_path: str,
+        filename: str,
+        knowledge_base_id: str = "default",
+        document_id: Optional[str] = None,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
         """
         Process an uploaded document through the RAG pipeline
         
         Args:
             file_path: Path to the uploaded file
             filename: Original filename
+            knowledge_base_id: Knowledge base to add the document to
+            document_id: Document identifier (generated when not given)
+            on_progress: Optional coroutine called with ingestion progress counters
             
         Returns:
             Processing results with document metadata
         """
-        document_id = str(uuid.uuid4())
+        document_id = document_id or str(uuid.uuid4())
         
         try:
             logger.info(f"Starting RAG processing for document: {filename}")
@@ -44,7 +57,9 @@ class RAGService:
             result = await self.document_processor.process_document(
                 file_path=file_path,
                 filename=filename,
-                document_id=document_id
+                document_id=document_id,
+                knowledge_base_id=knowledge_base_id,
+                on_progress=on_progress
             )
             
             if result.get("processing_status") == "completed":
@@ -62,6 +77,9 @@ class RAGService:
                 "processing_status": "failed",
                 "error": str(e)
             }
+        finally:
+            # Chunks may have been (partially) written either way
+            answer_cache.invalidate(knowledge_base_id)
     
     async def chat_with_rag(
         self,
@@ -69,39 +87,55 @@ class RAGService:
         qa_pairs: Optional[List[Dict[str, Any]]] = None,
         conversation_history: Optional[List[Dict[str, str]]] = None,
         max_chunks: Optional[int] = None,
-        similarity_threshold: Optional[float] = None
+        similarity_threshold: Optional[float] = None,
+        knowledge_base_id: str = "default"
     ) -> Dict[str, Any]:
         """
         Process a chat query using the full RAG pipeline
         
+        Near-identical questions (without conversation history) are answered
+        from the semantic answer cache while the knowledge base is unchanged.
+        
         Args:
             query: User's question
             qa_pairs: Available Q&A pairs to search through
             conversation_history: Previous conversation messages
             max_chunks: Maximum number of document chunks to retrieve
             similarity_threshold: Minimum similarity score for retrieval
+            knowledge_base_id: Knowledge base the question is asked against
             
         Returns:
             Complete RAG response with sources and metadata
         """
         try:
             start_time = datetime.now()
+            stage_timings: Dict[str, float] = {}
+            timed_out_stages: List[str] = []
+            
+            max_chunks = max_chunks or settings.max_chunks_per_query
+            similarity_threshold = similarity_threshold or settings.similarity_threshold
             
             logger.info(f"Processing RAG query: '{query[:100]}...'")
             
-            # Step 1: Retrieve relevant document chunks
-            document_chunks = await self.retrieval_service.search_documents(
-                query=query,
-                max_results=max_chunks or settings.max_chunks_per_query,
-                similarity_threshold=similarity_threshold or settings.similarity_threshold
-            )
+            # Step 1: Embed the query once
+            query_embedding = await self._embed_query(query, stage_timings, timed_out_stages)
+            
+            # Step 2: Serve near-identical questions from the semantic answer cache
+            scope_key = (knowledge_base_id, max_chunks, similarity_threshold, bool(qa_pairs))
+            cacheable = not conversation_history
+            kb_version = answer_cache.get_version(knowledge_base_id)
+            if cacheable:
+                cached = answer_cache.lookup(scope_key, query_embedding)
+                if cached:
+                    return self._cached_response(query, cached, start_time, stage_timings)
             
-            # Step 2: Search through Q&A pairs if provided
-            qa_matches = []
-            if qa_pairs:
-                qa_matches = await self._search_qa_pairs(query, qa_pairs)
+            # Step 3: Search documents and Q&A pairs concurrently
+            document_chunks, qa_matches = await self._retrieve_context(
+                query, qa_pairs, max_chunks, similarity_threshold, query_embedding,
+                knowledge_base_id, stage_timings, timed_out_stages
+            )
             
-            # Step 3: Generate response using LLM with retrieved context
+            # Step 4: Generate response using LLM with retrieved context
             llm_result = await self.llm_service.generate_response(
                 query=query,
                 document_chunks=document_chunks,
@@ -125,12 +159,22 @@ class RAGService:
                 "retrieval_stats": {
                     "document_chunks_found": len(document_chunks),
                     "qa_matches_found": len(qa_matches),
-                    "similarity_threshold": similarity_threshold or settings.similarity_threshold,
-                    "max_chunks_requested": max_chunks or settings.max_chunks_per_query
+                    "similarity_threshold": similarity_threshold,
+                    "max_chunks_requested": max_chunks,
+                    "stage_timings_ms": {
+                        **stage_timings,
+                        "llm": llm_result.get("processing_time_ms", 0)
+                    },
+                    "timed_out_stages": timed_out_stages
                 },
-                "llm_processing_time_ms": llm_result.get("processing_time_ms", 0)
+                "llm_processing_time_ms": llm_result.get("processing_time_ms", 0),
+                "cache": {"hit": False}
             }
             
+            # Only cache complete answers
+            if cacheable and not llm_result.get("error") and not timed_out_stages:
+                answer_cache.store(scope_key, query_embedding, response, kb_version)
+            
             logger.info(f"RAG query completed in {total_processing_time:.2f}ms with {len(document_chunks)} document sources and {len(qa_matches)} Q&A matches")
             
             return response
@@ -149,14 +193,264 @@ class RAGService:
                 "error": str(e)
             }
     
-    async def _search_qa_pairs(self, query: str, qa_pairs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def stream_chat_with_rag(
+        self,
+        query: str,
+        qa_pairs: Optional[List[Dict[str, Any]]] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        max_chunks: Optional[int] = None,
+        similarity_threshold: Optional[float] = None,
+        knowledge_base_id: str = "default"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a chat query through the RAG pipeline
+        
+        Yields events in order: ``sources`` (retrieved chunks and Q&A matches),
+        one ``token`` per LLM content delta, then ``done`` with timings
+        (including time to first token), or ``error`` if generation fails.
+        A semantic cache hit is streamed as a single token.
+        """
+        start = time.perf_counter()
+        start_time = datetime.now()
+        stage_timings: Dict[str, float] = {}
+        timed_out_stages: List[str] = []
+        max_chunks = max_chunks or settings.max_chunks_per_query
+        similarity_threshold = similarity_threshold or settings.similarity_threshold
+        
+        logger.info(f"Streaming RAG query: '{query[:100]}...'")
+        
+        query_embedding = await self._embed_query(query, stage_timings, timed_out_stages)
+        
+        scope_key = (knowledge_base_id, max_chunks, similarity_threshold, bool(qa_pairs))
+        cacheable = not conversation_history
+        kb_version = answer_cache.get_version(knowledge_base_id)
+        if cacheable:
+            cached = answer_cache.lookup(scope_key, query_embedding)
+            if cached:
+                response = self._cached_response(query, cached, start_time, stage_timings)
+                yield {
+                    "event": "sources",
+                    "data": {
+                        "id": response["id"],
+                        "message": query,
+                        "sources": response["sources"],
+                        "qa_matches": response["qa_matches"],
+                        "retrieval_stats": response["retrieval_stats"]
+                    }
+                }
+                yield {"event": "token", "data": {"content": response["response"]}}
+                yield {
+                    "event": "done",
+                    "data": {
+                        "timestamp": response["timestamp"],
+                        "model_used": response["model_used"],
+                        "time_to_first_token_ms": round((time.perf_counter() - start) * 1000, 2),
+                        "processing_time_ms": round((time.perf_counter() - start) * 1000, 2),
+                        "tokens_streamed": 1,
+                        "stage_timings_ms": stage_timings,
+                        "cache": response["cache"]
+                    }
+                }
+                return
+        
+        document_chunks, qa_matches = await self._retrieve_context(
+            query, qa_pairs, max_chunks, similarity_threshold, query_embedding,
+            knowledge_base_id, stage_timings, timed_out_stages
+        )
+        sources = self._format_document_sources(document_chunks)
+        formatted_qa_matches = self._format_qa_matches(qa_matches)
+        retrieval_stats = {
+            "document_chunks_found": len(document_chunks),
+            "qa_matches_found": len(qa_matches),
+            "similarity_threshold": similarity_threshold,
+            "max_chunks_requested": max_chunks,
+            "stage_timings_ms": stage_timings,
+            "timed_out_stages": timed_out_stages
+        }
+        
+        yield {
+            "event": "sources",
+            "data": {
+                "id": str(uuid.uuid4()),
+                "message": query,
+                "sources": sources,
+                "qa_matches": formatted_qa_matches,
+                "retrieval_stats": retrieval_stats
+            }
+        }
+        
+        llm_start = time.perf_counter()
+        first_token_ms = None
+        token_count = 0
+        tokens: List[str] = []
+        try:
+            async for token in self.llm_service.stream_response(
+                query=query,
+                document_chunks=document_chunks,
+                qa_matches=qa_matches,
+                conversation_history=conversation_history
+            ):
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - start) * 1000, 2)
+                token_count += 1
+                tokens.append(token)
+                yield {"event": "token", "data": {"content": token}}
+        except Exception as e:
+            logger.error(f"Error streaming RAG response: {e}")
+            yield {"event": "error", "data": {"error": str(e)}}
+            return
+        
+        stage_timings["llm"] = round((time.perf_counter() - llm_start) * 1000, 2)
+        end_time = datetime.now()
+        processing_time_ms = round((time.perf_counter() - start) * 1000, 2)
+        
+        if cacheable and not timed_out_stages:
+            answer_cache.store(scope_key, query_embedding, {
+                "id": str(uuid.uuid4()),
+                "message": query,
+                "response": "".join(tokens),
+                "sources": sources,
+                "qa_matches": formatted_qa_matches,
+                "timestamp": end_time.isoformat(),
+                "processing_time_ms": processing_time_ms,
+                "model_used": settings.openai_model,
+                "retrieval_stats": retrieval_stats,
+                "llm_processing_time_ms": stage_timings["llm"],
+                "cache": {"hit": False}
+            }, kb_version)
+        
+        yield {
+            "event": "done",
+            "data": {
+                "timestamp": end_time.isoformat(),
+                "model_used": settings.openai_model,
+                "time_to_first_token_ms": first_token_ms,
+                "processing_time_ms": processing_time_ms,
+                "tokens_streamed": token_count,
+                "stage_timings_ms": stage_timings,
+                "cache": {"hit": False}
+            }
+        }
+    
+    async def _embed_query(
+        self,
+        query: str,
+        stage_timings: Dict[str, float],
+        timed_out_stages: List[str]
+    ) -> Optional[List[float]]:
+        """Embed the query once for the cache lookup and both retrieval stages"""
+        return await self._run_stage(
+            "query_embedding",
+            self.retrieval_service._generate_query_embedding(query),
+            None, stage_timings, timed_out_stages
+        )
+    
+    async def _retrieve_context(
+        self,
+        query: str,
+        qa_pairs: Optional[List[Dict[str, Any]]],
+        max_chunks: int,
+        similarity_threshold: float,
+        query_embedding: Optional[List[float]],
+        knowledge_base_id: Optional[str],
+        stage_timings: Dict[str, float],
+        timed_out_stages: List[str]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Search the knowledge base's chunks and the Q&A pairs concurrently with a shared query embedding"""
+        retrieval_start = time.perf_counter()
+        stages = [
+            self._run_stage(
+                "document_search",
+                self.retrieval_service.search_documents(
+                    query=query,
+                    max_results=max_chunks,
+                    similarity_threshold=similarity_threshold,
+                    query_embedding=query_embedding,
+                    knowledge_base_id=knowledge_base_id
+                ),
+                [], stage_timings, timed_out_stages
+            )
+        ]
+        if qa_pairs:
+            stages.append(self._run_stage(
+                "qa_search",
+                self._search_qa_pairs(query, qa_pairs, query_embedding=query_embedding),
+                [], stage_timings, timed_out_stages
+            ))
+        
+        results = await asyncio.gather(*stages)
+        stage_timings["retrieval_total"] = round((time.perf_counter() - retrieval_start) * 1000, 2)
+        return results[0], (results[1] if qa_pairs else [])
+    
+    def _cached_response(
+        self,
+        query: str,
+        cached: Tuple[Dict[str, Any], float],
+        start_time: datetime,
+        stage_timings: Dict[str, float]
+    ) -> Dict[str, Any]:
+        """Build a chat response from a semantic cache hit"""
+        cached_response, similarity = cached
+        end_time = datetime.now()
+        processing_time = (end_time - start_time).total_seconds() * 1000
+        
+        logger.info(f"Semantic cache hit (similarity {similarity:.4f}) for query: '{query[:100]}...'")
+        
+        return {
+            **cached_response,
+            "id": str(uuid.uuid4()),
+            "message": query,
+            "timestamp": end_time.isoformat(),
+            "processing_time_ms": round(processing_time, 2),
+            "retrieval_stats": {
+                **cached_response.get("retrieval_stats", {}),
+                "stage_timings_ms": dict(stage_timings),
+                "timed_out_stages": []
+            },
+            "llm_processing_time_ms": 0,
+            "cache": {
+                "hit": True,
+                "similarity": round(similarity, 4),
+                "cached_message": cached_response.get("message")
+            }
+        }
+    
+    async def _run_stage(
+        self,
+        name: str,
+        stage: Awaitable[Any],
+        default: Any,
+        stage_timings: Dict[str, float],
+        timed_out_stages: List[str]
+    ) -> Any:
+        """Await a pipeline stage under the per-stage deadline, recording its duration"""
+        stage_start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(stage, timeout=settings.retrieval_stage_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"RAG stage '{name}' exceeded {settings.retrieval_stage_timeout}s deadline")
+            timed_out_stages.append(name)
+            return default
+        except Exception as e:
+            logger.error(f"RAG stage '{name}' failed: {e}")
+            return default
+        finally:
+            stage_timings[name] = round((time.perf_counter() - stage_start) * 1000, 2)
+    
+    async def _search_qa_pairs(
+        self,
+        query: str,
+        qa_pairs: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
         """Search through Q&A pairs using ChromaDB vector similarity"""
         try:
             # Use ChromaDB Q&A service for semantic search
             matches = await qa_service.search_qa_pairs(
                 query=query,
                 max_results=3,
-                similarity_threshold=0.7  # Use higher threshold for embeddings
+                similarity_threshold=0.7,  # Use higher threshold for embeddings
+                query_embedding=query_embedding
             )
             
             logger.info(f"Found {len(matches)} Q&A matches using ChromaDB for query: '{query[:50]}...'")
@@ -227,6 +521,9 @@ class RAGService:
         except Exception as e:
             logger.error(f"Error deleting document {document_id}: {e}")
             return False
+        finally:
+            # The document's knowledge base is not known here, so drop every cached answer
+            answer_cache.invalidate()
     
     async def get_system_status(self) -> Dict[str, Any]:
         """Get comprehensive status of the RAG system"""
@@ -264,7 +561,8 @@ class RAGService:
                     "chunk_size": settings.chunk_size,
                     "max_chunks_per_query": settings.max_chunks_per_query,
                     "similarity_threshold": settings.similarity_threshold
-                }
+                },
+                "answer_cache": answer_cache.get_stats()
             }
             
         except Exception as e:
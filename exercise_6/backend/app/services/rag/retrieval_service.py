@@ -11,7 +11,8 @@ import openai
 # ChromaDB imports removed - now using PostgreSQL + pgvector for documents
 
 from app.config import settings
-from app.database import get_connection
+from app.database import get_db_connection
+from app.services.embedding_cache import embedding_cache
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +32,9 @@ class RetrievalService:
         self, 
         query: str, 
         max_results: int = None,
-        similarity_threshold: float = None
+        similarity_threshold: float = None,
+        query_embedding: Optional[List[float]] = None,
+        knowledge_base_id: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         Search for relevant document chunks based on query
@@ -40,6 +43,8 @@ class RetrievalService:
             query: Search query
             max_results: Maximum number of results to return
             similarity_threshold: Minimum similarity score
+            query_embedding: Precomputed embedding of the query (skips re-embedding)
+            knowledge_base_id: Only search chunks of this knowledge base (all when None)
             
         Returns:
             List of relevant document chunks with metadata
@@ -55,8 +60,10 @@ class RetrievalService:
             await self.vector_service.initialize()
             relevant_chunks = await self.vector_service.search_document_chunks(
                 query=query,
+                knowledge_base_id=knowledge_base_id,
                 max_results=max_results,
-                similarity_threshold=similarity_threshold
+                similarity_threshold=similarity_threshold,
+                query_embedding=query_embedding
             )
             
             logger.info(f"Found {len(relevant_chunks)} relevant chunks from PostgreSQL + pgvector")
@@ -72,16 +79,19 @@ class RetrievalService:
     
     async def _generate_query_embedding(self, query: str) -> List[float]:
         """Generate embedding for search query"""
-        try:
+        async def generate(texts: List[str]) -> List[List[float]]:
             def generate_sync():
                 response = self.openai_client.embeddings.create(
                     model=settings.rag_embedding_model,
-                    input=[query]
+                    input=texts
                 )
-                return response.data[0].embedding
+                return [item.embedding for item in response.data]
             
-            embedding = await asyncio.get_event_loop().run_in_executor(None, generate_sync)
-            return embedding
+            return await asyncio.get_event_loop().run_in_executor(None, generate_sync)
+        
+        try:
+            embeddings = await embedding_cache.get_or_compute([query], generate)
+            return embeddings[0]
             
         except Exception as e:
             logger.error(f"Error generating query embedding: {e}")
@@ -155,8 +165,7 @@ class RetrievalService:
         """Get information about the document collection from PostgreSQL"""
         try:
             await self.vector_service.initialize()
-            conn = await get_connection()
-            try:
+            async with get_db_connection() as conn:
                 # Get document chunks count
                 count = await conn.fetchval("SELECT COUNT(*) FROM document_chunks")
                 
@@ -170,8 +179,6 @@ class RetrievalService:
                     "sample_documents": doc_count,
                     "embedding_model": settings.rag_embedding_model
                 }
-            finally:
-                await conn.close()
         except Exception as e:
             return {
                 "status": "error",
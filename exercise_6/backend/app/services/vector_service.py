@@ -10,13 +10,15 @@ import json
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import asyncio
+import time
 
 import asyncpg
 import openai
 import numpy as np
 
 from app.config import settings
-from app.database import get_connection
+from app.database import get_db_connection
+from app.services.embedding_cache import embedding_cache
 
 logger = logging.getLogger(__name__)
 
@@ -34,8 +36,7 @@ class PostgreSQLVectorService:
         
         try:
             # Test database connection
-            conn = await get_connection()
-            try:
+            async with get_db_connection() as conn:
                 # Verify pgvector extension is available
                 result = await conn.fetchval(
                     "SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = 'vector')"
@@ -43,15 +44,91 @@ class PostgreSQLVectorService:
                 if not result:
                     raise Exception("pgvector extension is not installed")
                 
+                try:
+                    await self.check_schema(conn)
+                except Exception as e:
+                    logger.warning(f"Failed to check the document_chunks schema: {e}")
+                
                 logger.info("PostgreSQL vector service initialized successfully")
                 self._initialized = True
-            finally:
-                await conn.close()
                 
         except Exception as e:
             logger.error(f"Failed to initialize PostgreSQL vector service: {e}")
             raise
     
+    # =============================================================================
+    # INDEX MANAGEMENT
+    # =============================================================================
+    
+    async def check_schema(self, conn: asyncpg.Connection):
+        """
+        Warn when document_chunks predates the knowledge_base_id column or the HNSW index
+        
+        Nothing is changed here: a backfill and an index build would hold up
+        startup and block writes to the table for as long as they run.
+        scripts/migrate_document_chunks.py does both without blocking writes.
+        """
+        row = await conn.fetchrow("""
+            SELECT
+                EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'document_chunks' AND column_name = 'knowledge_base_id'
+                ) AS has_kb_column,
+                (
+                    SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = 'idx_chunks_embedding_hnsw'
+                ) AS hnsw_valid
+        """)
+        if not row["has_kb_column"]:
+            logger.error(
+                "document_chunks has no knowledge_base_id column; chunk searches fail "
+                "until scripts/migrate_document_chunks.py is run"
+            )
+        elif not row["hnsw_valid"]:
+            logger.warning(
+                "document_chunks has no valid HNSW index; chunk searches scan every chunk "
+                "until scripts/migrate_document_chunks.py is run"
+            )
+    
+    async def rebuild_vector_index(
+        self,
+        m: Optional[int] = None,
+        ef_construction: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Rebuild the HNSW index on document_chunks with new build parameters"""
+        await self.initialize()
+        
+        m = int(m or settings.hnsw_m)
+        ef_construction = int(ef_construction or settings.hnsw_ef_construction)
+        
+        start_time = time.perf_counter()
+        async with get_db_connection() as conn:
+            async with conn.transaction():
+                await conn.execute("DROP INDEX IF EXISTS idx_chunks_embedding_hnsw")
+                await conn.execute(f"""
+                    CREATE INDEX idx_chunks_embedding_hnsw
+                    ON document_chunks USING hnsw (embedding vector_cosine_ops)
+                    WITH (m = {m}, ef_construction = {ef_construction})
+                """)
+        
+        build_ms = (time.perf_counter() - start_time) * 1000
+        logger.info(f"Rebuilt HNSW index (m={m}, ef_construction={ef_construction}) in {build_ms:.2f}ms")
+        return {"m": m, "ef_construction": ef_construction, "build_time_ms": round(build_ms, 2)}
+    
+    async def get_index_status(self) -> List[Dict[str, Any]]:
+        """List indexes on document_chunks with their definitions and sizes"""
+        await self.initialize()
+        
+        async with get_db_connection() as conn:
+            rows = await conn.fetch("""
+                SELECT indexname, indexdef,
+                       pg_size_pretty(pg_relation_size(quote_ident(indexname)::regclass)) AS size
+                FROM pg_indexes
+                WHERE tablename = 'document_chunks'
+                ORDER BY indexname
+            """)
+            return [dict(row) for row in rows]
+    
     # =============================================================================
     # DOCUMENT EMBEDDING METHODS
     # =============================================================================
@@ -59,54 +136,112 @@ class PostgreSQLVectorService:
     async def add_document_chunks(
         self, 
         document_id: str, 
-        chunks: List[Dict[str, Any]]
+        chunks: List[Dict[str, Any]],
+        timings: Optional[Dict[str, float]] = None
     ) -> List[str]:
-        """Add document chunks with embeddings to PostgreSQL"""
+        """
+        Add document chunks with embeddings to PostgreSQL
+        
+        Chunks that already carry an ``embedding`` are stored as-is; the rest are
+        embedded in batches of ``embedding_batch_size`` with at most
+        ``embedding_max_concurrency`` requests in flight. All rows are written
+        with a single ``executemany`` inside one transaction.
+        
+        Args:
+            document_id: Document the chunks belong to
+            chunks: Chunk dictionaries (content, metadata, token_count, optional embedding)
+            timings: Optional dictionary populated with per-stage timings in milliseconds
+            
+        Returns:
+            IDs of the stored chunks, ordered by chunk index
+        """
         await self.initialize()
         
         try:
-            chunk_ids = []
+            start_time = time.perf_counter()
             
-            conn = await get_connection()
-            try:
-                for i, chunk in enumerate(chunks):
-                    content = chunk.get('content', '').strip()
-                    if not content:
-                        continue
-                    
+            # Prepare rows, keeping the original chunk position as chunk_index
+            # (callers storing a document in batches pass an explicit chunk_index)
+            rows = []
+            for i, chunk in enumerate(chunks):
+                content = chunk.get('content', '').strip()
+                if not content:
+                    continue
+                
+                metadata = chunk.get('metadata', {})
+                rows.append({
+                    "chunk_index": chunk.get('chunk_index', i),
+                    "knowledge_base_id": chunk.get('knowledge_base_id') or metadata.get('knowledge_base_id'),
+                    "content": content,
                     # Generate content hash for deduplication
-                    content_hash = hashlib.sha256(content.encode()).hexdigest()
-                    
-                    # Generate embedding
-                    embedding = await self._generate_embedding(content)
-                    
-                    # Insert chunk with embedding (convert to pgvector format)
-                    embedding_str = '[' + ','.join(map(str, embedding)) + ']'
-                    metadata_json = json.dumps(chunk.get('metadata', {}))
-                    chunk_id = await conn.fetchval("""
+                    "content_hash": hashlib.sha256(content.encode()).hexdigest(),
+                    "token_count": chunk.get('token_count'),
+                    "embedding": chunk.get('embedding'),
+                    "metadata": metadata
+                })
+            
+            if not rows:
+                return []
+            
+            # Embed only the chunks that don't have an embedding yet
+            embed_start = time.perf_counter()
+            missing = [row for row in rows if row["embedding"] is None]
+            if missing:
+                embeddings = await self._generate_embeddings([row["content"] for row in missing])
+                for row, embedding in zip(missing, embeddings):
+                    row["embedding"] = embedding
+            embed_ms = (time.perf_counter() - embed_start) * 1000
+            
+            # Embeddings are sent as float32 arrays via the binary vector codec
+            records = [
+                (
+                    document_id, row["chunk_index"], row["content"], row["content_hash"],
+                    row["token_count"], len(row["content"]),
+                    np.asarray(row["embedding"], dtype=np.float32),
+                    json.dumps(row["metadata"]), row["knowledge_base_id"]
+                )
+                for row in rows
+            ]
+            
+            insert_start = time.perf_counter()
+            async with get_db_connection() as conn:
+                async with conn.transaction():
+                    await conn.executemany("""
                         INSERT INTO document_chunks (
                             document_id, chunk_index, content, content_hash,
-                            token_count, char_count, embedding, metadata
-                        ) VALUES ($1, $2, $3, $4, $5, $6, $7::vector, $8::jsonb)
+                            token_count, char_count, embedding, metadata, knowledge_base_id
+                        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8::jsonb, $9)
                         ON CONFLICT (document_id, chunk_index) 
                         DO UPDATE SET 
                             content = EXCLUDED.content,
                             content_hash = EXCLUDED.content_hash,
                             embedding = EXCLUDED.embedding,
-                            metadata = EXCLUDED.metadata
-                        RETURNING id
-                    """, 
-                        document_id, i, content, content_hash,
-                        chunk.get('token_count'), len(content), 
-                        embedding_str, metadata_json
-                    )
+                            metadata = EXCLUDED.metadata,
+                            knowledge_base_id = EXCLUDED.knowledge_base_id
+                    """, records)
                     
-                    chunk_ids.append(str(chunk_id))
-                
-                logger.info(f"Added {len(chunk_ids)} document chunks with embeddings for document {document_id}")
-                return chunk_ids
-            finally:
-                await conn.close()
+                    id_rows = await conn.fetch("""
+                        SELECT id FROM document_chunks
+                        WHERE document_id = $1 AND chunk_index = ANY($2::int[])
+                        ORDER BY chunk_index
+                    """, document_id, [row["chunk_index"] for row in rows])
+            insert_ms = (time.perf_counter() - insert_start) * 1000
+            
+            chunk_ids = [str(row["id"]) for row in id_rows]
+            stage_timings = {
+                "embedding_ms": round(embed_ms, 2),
+                "insert_ms": round(insert_ms, 2),
+                "total_ms": round((time.perf_counter() - start_time) * 1000, 2),
+                "chunks_embedded": len(missing),
+            }
+            if timings is not None:
+                timings.update(stage_timings)
+            
+            logger.info(
+                f"Added {len(chunk_ids)} document chunks with embeddings for document {document_id} "
+                f"(embedded {len(missing)} in {embed_ms:.2f}ms, stored in {insert_ms:.2f}ms)"
+            )
+            return chunk_ids
                 
         except Exception as e:
             logger.error(f"Failed to add document chunks: {e}")
@@ -117,17 +252,26 @@ class PostgreSQLVectorService:
         query: str, 
         knowledge_base_id: Optional[str] = None,
         max_results: int = 5, 
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
-        """Search document chunks using vector similarity"""
+        """
+        Search document chunks using vector similarity
+        
+        The query orders by cosine distance with a LIMIT so pgvector can serve it
+        from the HNSW index; the similarity threshold is applied to the top-k
+        afterwards instead of in the WHERE clause (which forces a sequential scan).
+        Pass ``query_embedding`` to reuse an embedding computed by the caller.
+        """
         await self.initialize()
         
         try:
             # Generate query embedding
-            query_embedding = await self._generate_embedding(query)
+            if query_embedding is None:
+                query_embedding = await self._generate_embedding(query)
             
-            # Build SQL query (convert query embedding to pgvector format)
-            query_embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
+            # Build SQL query (query embedding is sent in binary via the vector codec)
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
             sql = """
                 SELECT 
                     dc.id,
@@ -137,26 +281,34 @@ class PostgreSQLVectorService:
                     dc.metadata,
                     (dc.metadata->>'filename') as filename,
                     (dc.metadata->>'title') as title,
-                    1 - (dc.embedding <=> $1::vector) as similarity_score
+                    dc.embedding <=> $1 as distance
                 FROM document_chunks dc
-                WHERE 1 - (dc.embedding <=> $1::vector) >= $2
             """
             
-            params = [query_embedding_str, similarity_threshold]
+            params = [query_vector]
             
             if knowledge_base_id:
-                sql += " AND (dc.metadata->>'knowledge_base_id') = $3"
+                sql += " WHERE dc.knowledge_base_id = $2"
                 params.append(knowledge_base_id)
             
-            sql += " ORDER BY dc.embedding <=> $1::vector LIMIT $" + str(len(params) + 1)
+            sql += " ORDER BY dc.embedding <=> $1 LIMIT $" + str(len(params) + 1)
             params.append(max_results)
             
-            conn = await get_connection()
-            try:
-                rows = await conn.fetch(sql, *params)
+            # ef_search must be at least k for the index scan to return k rows
+            ef_search = max(int(settings.hnsw_ef_search), int(max_results))
+            
+            async with get_db_connection() as conn:
+                async with conn.transaction():
+                    await conn.execute(f"SET LOCAL hnsw.ef_search = {ef_search}")
+                    rows = await conn.fetch(sql, *params)
                 
                 results = []
                 for row in rows:
+                    similarity_score = 1 - float(row["distance"])
+                    if similarity_score < similarity_threshold:
+                        # Rows are ordered by distance, so the rest are below threshold too
+                        break
+                    
                     results.append({
                         "id": str(row["id"]),
                         "document_id": str(row["document_id"]),
@@ -164,19 +316,29 @@ class PostgreSQLVectorService:
                         "chunk_index": row["chunk_index"],
                         "filename": row["filename"],
                         "title": row["title"],
-                        "similarity_score": float(row["similarity_score"]),
+                        "similarity_score": similarity_score,
                         "metadata": row["metadata"] or {}
                     })
                 
                 logger.info(f"Found {len(results)} document chunks for query: '{query[:50]}...'")
                 return results
-            finally:
-                await conn.close()
                 
         except Exception as e:
             logger.error(f"Failed to search document chunks: {e}")
             return []
     
+    async def delete_document_chunks(self, document_id: str) -> int:
+        """Delete all chunks of a document, returning the number of rows removed"""
+        await self.initialize()
+        
+        async with get_db_connection() as conn:
+            result = await conn.execute(
+                "DELETE FROM document_chunks WHERE document_id = $1", document_id
+            )
+        deleted = int(result.split()[-1])
+        logger.info(f"Deleted {deleted} chunks for document {document_id}")
+        return deleted
+    
     # =============================================================================
     # Q&A EMBEDDING METHODS
     # =============================================================================
@@ -196,8 +358,7 @@ class PostgreSQLVectorService:
             question_embedding = await self._generate_embedding(question)
             answer_embedding = await self._generate_embedding(answer)
             
-            conn = await get_connection()
-            try:
+            async with get_db_connection() as conn:
                 # Get or create knowledge base
                 kb_id = await self._ensure_knowledge_base(conn, knowledge_base_id)
                 
@@ -211,15 +372,14 @@ class PostgreSQLVectorService:
                     RETURNING id
                 """, 
                     kb_id, question, answer,
-                    question_embedding, answer_embedding,
+                    np.asarray(question_embedding, dtype=np.float32),
+                    np.asarray(answer_embedding, dtype=np.float32),
                     metadata.get('tags', []) if metadata else [],
                     metadata or {}
                 )
                 
                 logger.info(f"Added Q&A pair with embeddings: {qa_id}")
                 return str(qa_id)
-            finally:
-                await conn.close()
                 
         except Exception as e:
             logger.error(f"Failed to add Q&A pair: {e}")
@@ -270,7 +430,7 @@ class PostgreSQLVectorService:
                 FROM all_matches
             """
             
-            params = [query_embedding, similarity_threshold]
+            params = [np.asarray(query_embedding, dtype=np.float32), similarity_threshold]
             
             if knowledge_base_id:
                 # Add knowledge base filter (need to join with knowledge_bases table)
@@ -286,8 +446,7 @@ class PostgreSQLVectorService:
             sql += " ORDER BY id, similarity_score DESC LIMIT $" + str(len(params) + 1)
             params.append(max_results)
             
-            conn = await get_connection()
-            try:
+            async with get_db_connection() as conn:
                 rows = await conn.fetch(sql, *params)
                 
                 results = []
@@ -305,8 +464,6 @@ class PostgreSQLVectorService:
                 
                 logger.info(f"Found {len(results)} Q&A matches for query: '{query[:50]}...'")
                 return results
-            finally:
-                await conn.close()
                 
         except Exception as e:
             logger.error(f"Failed to search Q&A pairs: {e}")
@@ -332,8 +489,7 @@ class PostgreSQLVectorService:
             
             sql += " ORDER BY qa.created_at DESC"
             
-            conn = await get_connection()
-            try:
+            async with get_db_connection() as conn:
                 rows = await conn.fetch(sql, *params)
                 
                 results = []
@@ -350,8 +506,6 @@ class PostgreSQLVectorService:
                     })
                 
                 return results
-            finally:
-                await conn.close()
                 
         except Exception as e:
             logger.error(f"Failed to get Q&A pairs: {e}")
@@ -362,8 +516,7 @@ class PostgreSQLVectorService:
         await self.initialize()
         
         try:
-            conn = await get_connection()
-            try:
+            async with get_db_connection() as conn:
                 result = await conn.execute(
                     "UPDATE qa_pairs SET status = 'archived' WHERE id = $1",
                     qa_id
@@ -374,8 +527,6 @@ class PostgreSQLVectorService:
                     logger.info(f"Archived Q&A pair: {qa_id}")
                 
                 return success
-            finally:
-                await conn.close()
                 
         except Exception as e:
             logger.error(f"Failed to delete Q&A pair {qa_id}: {e}")
@@ -386,23 +537,50 @@ class PostgreSQLVectorService:
     # =============================================================================
     
     async def _generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for text using OpenAI"""
+        """Generate embedding for text using OpenAI (through the embedding cache)"""
         try:
-            # Run in executor to avoid blocking the event loop
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.openai_client.embeddings.create(
-                    model=settings.rag_embedding_model,
-                    input=text.strip()
-                )
-            )
-            return response.data[0].embedding
+            embeddings = await embedding_cache.get_or_compute([text], self._embed_batches)
+            return embeddings[0]
             
         except Exception as e:
             logger.error(f"Failed to generate embedding: {e}")
             raise
     
+    async def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for many texts, computing only cache misses"""
+        try:
+            return await embedding_cache.get_or_compute(texts, self._embed_batches)
+            
+        except Exception as e:
+            logger.error(f"Failed to generate embeddings: {e}")
+            raise
+    
+    async def _embed_batches(self, texts: List[str]) -> List[List[float]]:
+        """Call the embeddings API in batches with bounded concurrency"""
+        if not texts:
+            return []
+        
+        batch_size = max(1, settings.embedding_batch_size)
+        semaphore = asyncio.Semaphore(max(1, settings.embedding_max_concurrency))
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        loop = asyncio.get_event_loop()
+        
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                response = await loop.run_in_executor(
+                    None,
+                    lambda: self.openai_client.embeddings.create(
+                        model=settings.rag_embedding_model,
+                        input=[text.strip() for text in batch]
+                    )
+                )
+                # The API may return items out of order; restore input order
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        
+        batch_results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        logger.info(f"Generated {len(texts)} embeddings in {len(batches)} batches")
+        return [embedding for batch in batch_results for embedding in batch]
+    
     async def _ensure_knowledge_base(self, conn: asyncpg.Connection, name: str) -> str:
         """Ensure knowledge base exists and return its ID"""
         try:
@@ -438,8 +616,7 @@ class PostgreSQLVectorService:
         try:
             await self.initialize()
             
-            conn = await get_connection()
-            try:
+            async with get_db_connection() as conn:
                 # Get document chunks count
                 doc_chunks_count = await conn.fetchval(
                     "SELECT COUNT(*) FROM document_chunks WHERE embedding IS NOT NULL"
@@ -462,10 +639,9 @@ class PostgreSQLVectorService:
                     "embedding_dimension": 1536,
                     "document_chunks": doc_chunks_count,
                     "qa_pairs": qa_pairs_count,
-                    "knowledge_bases": kb_count
+                    "knowledge_bases": kb_count,
+                    "embedding_cache": embedding_cache.get_stats()
                 }
-            finally:
-                await conn.close()
                 
         except Exception as e:
             return {
@@ -55,6 +55,7 @@ CREATE TABLE documents (
 CREATE TABLE document_chunks (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     document_id UUID REFERENCES documents(id) ON DELETE CASCADE,
+    knowledge_base_id VARCHAR(255), -- Knowledge base identifier used to scope searches
     chunk_index INTEGER NOT NULL,
     content TEXT NOT NULL,
     content_hash VARCHAR(64) NOT NULL, -- SHA-256 hash for deduplication
@@ -95,6 +96,36 @@ CREATE TABLE qa_pairs (
     CONSTRAINT non_empty_answer CHECK (LENGTH(TRIM(answer)) > 0)
 );
 
+-- Embedding cache keyed by model + SHA-256 of the embedded text
+CREATE TABLE embedding_cache (
+    model VARCHAR(100) NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    embedding REAL[] NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (model, content_hash)
+);
+
+-- Background document ingestion jobs (survive restarts; see ingestion_queue.py)
+CREATE TABLE ingestion_jobs (
+    id UUID PRIMARY KEY,
+    document_id UUID NOT NULL,
+    knowledge_base_id VARCHAR(255) NOT NULL DEFAULT 'default',
+    filename VARCHAR(500) NOT NULL,
+    content_type VARCHAR(100),
+    file_path TEXT NOT NULL,
+    file_size BIGINT,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    progress JSONB NOT NULL DEFAULT '{}',
+    result JSONB,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    
+    CONSTRAINT valid_ingestion_status CHECK (status IN ('queued', 'processing', 'completed', 'failed'))
+);
+
 -- =============================================================================
 -- CHAT AND CONVERSATION TABLES
 -- =============================================================================
@@ -180,7 +211,11 @@ CREATE INDEX idx_documents_tags ON documents USING GIN(tags);
 -- Document chunks indexes
 CREATE INDEX idx_chunks_document_id ON document_chunks(document_id);
 CREATE INDEX idx_chunks_content_hash ON document_chunks(content_hash);
-CREATE INDEX idx_chunks_embedding ON document_chunks USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+CREATE INDEX idx_chunks_kb_id ON document_chunks(knowledge_base_id);
+CREATE INDEX idx_chunks_embedding_hnsw ON document_chunks USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+-- Ingestion job indexes
+CREATE INDEX idx_ingestion_jobs_status ON ingestion_jobs(status, created_at);
 
 -- Q&A pairs indexes
 CREATE INDEX idx_qa_pairs_kb_id ON qa_pairs(knowledge_base_id);
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Exercise 6: RAG Chatbot - Vector Search Benchmark
+
+Compares document chunk search latency vs. corpus size for:
+  * legacy:  WHERE 1 - (embedding <=> q) >= threshold AND metadata->>'knowledge_base_id' = kb
+             (sequential scan, no usable index)
+  * indexed: WHERE knowledge_base_id = kb ORDER BY embedding <=> q LIMIT k
+             (HNSW index + btree on knowledge_base_id, threshold applied afterwards)
+
+Runs against a temporary table, so it is safe to point at the development database.
+
+Usage (from exercise_6/backend):
+    python ../scripts/benchmark_vector_search.py --sizes 1000 10000 50000 --queries 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import asyncpg
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.config import settings  # noqa: E402
+from app.database import register_vector_codec  # noqa: E402
+
+KNOWLEDGE_BASES = ["default", "kb-a", "kb-b", "kb-c"]
+
+LEGACY_SQL = """
+    SELECT id, 1 - (embedding <=> $1) AS similarity_score
+    FROM bench_chunks
+    WHERE 1 - (embedding <=> $1) >= $2
+      AND (metadata->>'knowledge_base_id') = $3
+    ORDER BY embedding <=> $1
+    LIMIT $4
+"""
+
+INDEXED_SQL = """
+    SELECT id, embedding <=> $1 AS distance
+    FROM bench_chunks
+    WHERE knowledge_base_id = $2
+    ORDER BY embedding <=> $1
+    LIMIT $3
+"""
+
+
+def random_unit_vectors(count: int, dimension: int, rng: np.random.Generator) -> np.ndarray:
+    vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentile_ms(samples, pct: float) -> float:
+    return round(float(np.percentile(samples, pct)) * 1000, 2)
+
+
+async def load_corpus(conn: asyncpg.Connection, size: int, dimension: int, rng: np.random.Generator) -> np.ndarray:
+    await conn.execute("DROP TABLE IF EXISTS bench_chunks")
+    await conn.execute(f"""
+        CREATE TEMP TABLE bench_chunks (
+            id SERIAL PRIMARY KEY,
+            knowledge_base_id VARCHAR(255),
+            metadata JSONB,
+            embedding vector({dimension})
+        )
+    """)
+
+    vectors = random_unit_vectors(size, dimension, rng)
+    kbs = rng.choice(KNOWLEDGE_BASES, size=size)
+    records = [
+        (str(kb), json.dumps({"knowledge_base_id": str(kb)}), vector)
+        for kb, vector in zip(kbs, vectors)
+    ]
+    await conn.copy_records_to_table(
+        "bench_chunks",
+        records=records,
+        columns=["knowledge_base_id", "metadata", "embedding"],
+    )
+    await conn.execute("ANALYZE bench_chunks")
+    return vectors
+
+
+async def build_indexes(conn: asyncpg.Connection) -> float:
+    start = time.perf_counter()
+    await conn.execute("CREATE INDEX ON bench_chunks (knowledge_base_id)")
+    await conn.execute(f"""
+        CREATE INDEX ON bench_chunks USING hnsw (embedding vector_cosine_ops)
+        WITH (m = {settings.hnsw_m}, ef_construction = {settings.hnsw_ef_construction})
+    """)
+    await conn.execute("ANALYZE bench_chunks")
+    return time.perf_counter() - start
+
+
+async def time_queries(conn, sql, make_params, queries):
+    samples, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        rows = await conn.fetch(sql, *make_params(query))
+        samples.append(time.perf_counter() - start)
+        results.append({row["id"] for row in rows})
+    return samples, results
+
+
+async def run(args):
+    url = os.getenv("DATABASE_URL", settings.database_url).replace("postgresql+asyncpg://", "postgresql://")
+    conn = await asyncpg.connect(url)
+    await register_vector_codec(conn)
+    rng = np.random.default_rng(args.seed)
+
+    print(f"{'chunks':>8} | {'legacy p50':>10} {'legacy p95':>10} | "
+          f"{'hnsw p50':>9} {'hnsw p95':>9} | {'recall@k':>8} | {'index build':>11}")
+    print("-" * 84)
+
+    try:
+        for size in args.sizes:
+            vectors = await load_corpus(conn, size, args.dimension, rng)
+
+            # Queries are noisy copies of stored chunks so the threshold has matches
+            picks = rng.integers(0, size, args.queries)
+            noise = random_unit_vectors(args.queries, args.dimension, rng) * args.noise
+            queries = [(vectors[i] + n).astype(np.float32) for i, n in zip(picks, noise)]
+            kb = KNOWLEDGE_BASES[0]
+
+            legacy_samples, legacy_results = await time_queries(
+                conn, LEGACY_SQL, lambda q: (q, args.threshold, kb, args.k), queries
+            )
+
+            build_seconds = await build_indexes(conn)
+            ef_search = max(settings.hnsw_ef_search, args.k)
+            await conn.execute(f"SET hnsw.ef_search = {ef_search}")
+            indexed_samples, indexed_results = await time_queries(
+                conn, INDEXED_SQL, lambda q: (q, kb, args.k), queries
+            )
+
+            # Recall of the top-k over the thresholded exact results
+            hits = sum(len(exact & approx) for exact, approx in zip(legacy_results, indexed_results))
+            total = sum(len(exact) for exact in legacy_results)
+            recall = hits / total if total else 1.0
+
+            print(f"{size:>8} | {percentile_ms(legacy_samples, 50):>8}ms {percentile_ms(legacy_samples, 95):>8}ms | "
+                  f"{percentile_ms(indexed_samples, 50):>7}ms {percentile_ms(indexed_samples, 95):>7}ms | "
+                  f"{recall:>8.3f} | {build_seconds:>10.1f}s")
+    finally:
+        await conn.execute("DROP TABLE IF EXISTS bench_chunks")
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark document chunk vector search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=settings.similarity_threshold)
+    parser.add_argument("--noise", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
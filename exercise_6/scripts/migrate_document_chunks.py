@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Exercise 6: RAG Chatbot - document_chunks Migration
+
+Brings a database created before the knowledge_base_id column and the HNSW
+index existed up to date with database/init.sql, without blocking writes
+for the duration:
+  * adds the knowledge_base_id column (a catalog-only change)
+  * backfills it in batches from metadata->>'knowledge_base_id', or "default"
+    (the upload default), each batch in its own short transaction
+  * builds idx_chunks_kb_id and idx_chunks_embedding_hnsw with
+    CREATE INDEX CONCURRENTLY; an invalid index left by an interrupted
+    build is dropped and built again
+  * drops the legacy IVFFlat index idx_chunks_embedding, so writes only
+    maintain one ANN index
+
+Safe to run again; every step skips work that is already done. Run it before
+(or while) serving with the new backend.
+
+Usage (from exercise_6/backend):
+    python ../scripts/migrate_document_chunks.py --batch-size 5000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import asyncpg
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.config import settings  # noqa: E402
+
+BACKFILL_SQL = """
+    UPDATE document_chunks
+    SET knowledge_base_id = COALESCE(metadata->>'knowledge_base_id', 'default')
+    WHERE id IN (
+        SELECT id FROM document_chunks
+        WHERE knowledge_base_id IS NULL
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    )
+"""
+
+
+async def index_state(conn: asyncpg.Connection, name: str) -> str:
+    """'missing', 'valid' or 'invalid' (left behind by an interrupted concurrent build)"""
+    valid = await conn.fetchval("""
+        SELECT i.indisvalid
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = $1
+    """, name)
+    if valid is None:
+        return "missing"
+    return "valid" if valid else "invalid"
+
+
+async def build_index(conn: asyncpg.Connection, name: str, definition: str):
+    """CREATE INDEX CONCURRENTLY ``name`` unless a valid one exists; runs outside a transaction"""
+    state = await index_state(conn, name)
+    if state == "valid":
+        print(f"  {name}: already built")
+        return
+    if state == "invalid":
+        print(f"  {name}: dropping the invalid index of an interrupted build")
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+    start = time.perf_counter()
+    await conn.execute(f"CREATE INDEX CONCURRENTLY {name} ON document_chunks {definition}")
+    print(f"  {name}: built in {time.perf_counter() - start:.1f}s")
+
+
+async def run(args):
+    url = os.getenv("DATABASE_URL", settings.database_url).replace("postgresql+asyncpg://", "postgresql://")
+    conn = await asyncpg.connect(url)
+
+    try:
+        # Fail rather than queue every other query behind the ALTER's table lock
+        await conn.execute(f"SET lock_timeout = '{int(args.lock_timeout_ms)}ms'")
+        await conn.execute(
+            "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS knowledge_base_id VARCHAR(255)"
+        )
+        await conn.execute("RESET lock_timeout")
+
+        print("Backfilling knowledge_base_id")
+        backfilled = 0
+        while True:
+            status = await conn.execute(BACKFILL_SQL, args.batch_size)
+            updated = int(status.split()[-1])
+            if not updated:
+                break
+            backfilled += updated
+            print(f"  {backfilled} chunks")
+            if args.pause_ms:
+                await asyncio.sleep(args.pause_ms / 1000)
+        print(f"  done, {backfilled} chunks updated")
+
+        print("Building indexes")
+        await build_index(conn, "idx_chunks_kb_id", "(knowledge_base_id)")
+        await build_index(
+            conn,
+            "idx_chunks_embedding_hnsw",
+            f"USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = {int(args.m)}, ef_construction = {int(args.ef_construction)})"
+        )
+
+        if await index_state(conn, "idx_chunks_embedding") != "missing":
+            await conn.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_chunks_embedding")
+            print("  idx_chunks_embedding: dropped the legacy IVFFlat index")
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add knowledge_base_id and the HNSW index to document_chunks")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Chunks backfilled per transaction")
+    parser.add_argument("--pause-ms", type=int, default=0, help="Pause between backfill batches")
+    parser.add_argument("--lock-timeout-ms", type=int, default=5000)
+    parser.add_argument("--m", type=int, default=settings.hnsw_m)
+    parser.add_argument("--ef-construction", type=int, default=settings.hnsw_ef_construction)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
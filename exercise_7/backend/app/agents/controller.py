@@ -1,5 +1,6 @@
 import asyncio
-from typing import Dict, Any, Tuple
+from dataclasses import dataclass
+from typing import Dict, Any, Tuple, List, Callable, Awaitable
 
 from app.config import settings
 from .router import route, detect_stock_intent
@@ -22,6 +23,110 @@ TOOLS = {
 }
 
 
+@dataclass(frozen=True)
+class PlanNode:
+    name: str
+    depends_on: Tuple[str, ...] = ()
+
+
+def build_plan(intent: str) -> List[PlanNode]:
+    """Plan as a dependency DAG: a node only waits for the nodes whose output it reads."""
+    if intent == "quote":
+        return [PlanNode("trading_quote")]
+    if intent == "trade":
+        return [
+            PlanNode("trading_quote"),
+            PlanNode("trading_recommend", ("trading_quote",)),
+            PlanNode("trading_trade", ("trading_recommend",)),
+        ]
+    # search and price don't read each other's results
+    return [PlanNode("search"), PlanNode("price")]
+
+
+def validate_plan(nodes: List[PlanNode]) -> None:
+    """Reject duplicate names, unknown dependencies and cycles."""
+    names = [node.name for node in nodes]
+    if len(set(names)) != len(names):
+        raise ValueError("duplicate plan node")
+    remaining = {node.name: set(node.depends_on) for node in nodes}
+    for node in nodes:
+        unknown = set(node.depends_on) - remaining.keys()
+        if unknown:
+            raise ValueError(f"{node.name} depends on unknown node(s) {sorted(unknown)}")
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"plan has a cycle among {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+async def execute_dag(
+    nodes: List[PlanNode],
+    run_node: Callable[[PlanNode], Awaitable[bool]],
+    max_concurrency: int,
+    node_timeout_s: float,
+    run_timeout_s: float,
+) -> Tuple[Dict[str, str], str | None]:
+    """Run each node as soon as its dependencies succeeded, at most max_concurrency at once.
+
+    A node gets node_timeout_s, capped by what is left of the run's run_timeout_s.
+    The first node to fail or time out cancels its running siblings and nothing
+    new starts. Returns the status of every node ("ok", "failed", "timeout",
+    "cancelled" or "skipped") and the name of the node that stopped the run.
+    """
+    validate_plan(nodes)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + run_timeout_s
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    status: Dict[str, str] = {}
+    pending = {node.name: node for node in nodes}
+    running: Dict[asyncio.Task, PlanNode] = {}
+    stopped_by: str | None = None
+
+    async def run_guarded(node: PlanNode) -> bool:
+        async with semaphore:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            return await asyncio.wait_for(run_node(node), min(node_timeout_s, remaining))
+
+    def start_ready() -> None:
+        for name, node in list(pending.items()):
+            if all(status.get(dep) == "ok" for dep in node.depends_on):
+                del pending[name]
+                running[asyncio.create_task(run_guarded(node))] = node
+
+    try:
+        start_ready()
+        while running and stopped_by is None:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                node = running.pop(task)
+                try:
+                    status[node.name] = "ok" if task.result() else "failed"
+                except asyncio.TimeoutError:
+                    status[node.name] = "timeout"
+                except Exception:
+                    status[node.name] = "failed"
+                if status[node.name] != "ok" and stopped_by is None:
+                    stopped_by = node.name
+            if stopped_by is None:
+                start_ready()
+    finally:
+        # Stopped early (or the run itself was cancelled): don't leave siblings running
+        for task, node in running.items():
+            task.cancel()
+            status[node.name] = "cancelled"
+        await asyncio.gather(*running, return_exceptions=True)
+
+    for name in pending:
+        status[name] = "skipped"
+    return status, stopped_by
+
+
 async def react_recover(query: str, context: Dict[str, Any]) -> ToolResult:
     # Simple ReAct stub: try cache as a degraded fallback for price
     tool = TOOLS["CacheTool"]
@@ -38,15 +143,11 @@ async def run_plan(trace_id: str, query: str, overrides: Dict[str, Any] | None =
         if overrides is not None:
             overrides.setdefault("symbols", symbols)
 
-    if intent == "quote":
-        plan_nodes = ["trading_quote"]
-    elif intent == "trade":
-        if overrides is not None and "action" not in overrides and trade_action:
-            overrides["action"] = trade_action
-        plan_nodes = ["trading_quote", "trading_recommend", "trading_trade"]
-    else:
-        plan_nodes = ["search", "price"]
-    async def run_node(node: str, parent_span_id: str | None) -> Tuple[bool, str | None]:
+    if intent == "trade" and overrides is not None and "action" not in overrides and trade_action:
+        overrides["action"] = trade_action
+    plan_nodes = build_plan(intent)
+
+    async def run_node(node: str, parent_span_id: str | None, depends_on: Tuple[str, ...] = ()) -> bool:
         # Map nodes to tools
         if node == "trading_quote":
             tool_name = "TradingQuoteTool"
@@ -67,6 +168,7 @@ async def run_plan(trace_id: str, query: str, overrides: Dict[str, Any] | None =
             "retry_count": 0,
             "budget_usd": settings.budget_usd,
             "over_budget": False,
+            "depends_on": list(depends_on),
         }) as (node_span_id, attrs):
             idempotency_key = make_idempotency_key(trace_id, node, 1)
             attrs["idempotency_key"] = idempotency_key
@@ -86,36 +188,45 @@ async def run_plan(trace_id: str, query: str, overrides: Dict[str, Any] | None =
                     if node == "search":
                         candidates = (result.value or {}).get("candidates", [])
                         context["search_top"] = rerank_top_one(candidates)
-                    return True, node_span_id
+                    return True
                 else:
                     circuit_breaker.record_failure(tool_name)
                     # Try ReAct fallback once
                     recovered = await react_recover(query, context)
                     if recovered.ok:
                         context[node] = recovered.value
-                        return True, node_span_id
-                    return False, node_span_id
+                        return True
+                    return False
             except Exception:
                 circuit_breaker.record_failure(tool_name)
                 # Try ReAct fallback once
                 recovered = await react_recover(query, context)
                 if recovered.ok:
                     context[node] = recovered.value
-                    return True, node_span_id
-                return False, node_span_id
+                    return True
+                return False
+
+    max_concurrency = int((overrides or {}).get("max_concurrency", settings.plan_max_concurrency))
 
-    # Root span
+    # Root span; every node span is its child, dependencies are recorded as attributes
     with span(trace_id, "plan_execute", None, attributes={
         "prompt_id": "prompt://agent/planner@v1",
         "model": (overrides or {}).get("model", settings.model),
         "budget_usd": float((overrides or {}).get("budget_usd", settings.budget_usd)),
         "over_budget": False,
-    }) as (root_span_id, _):
-        parent_id = root_span_id
-        for node in plan_nodes:
-            ok, parent_id = await run_node(node, parent_id)
-            if not ok:
-                return {"status": "degraded", "message": f"{node}_failed", "context": context}
-        return {"status": "success", "context": context}
+        "max_concurrency": max_concurrency,
+    }) as (root_span_id, root_attrs):
+        node_status, stopped_by = await execute_dag(
+            plan_nodes,
+            lambda node: run_node(node.name, root_span_id, node.depends_on),
+            max_concurrency,
+            float((overrides or {}).get("node_timeout_s", settings.plan_node_timeout_seconds)),
+            float((overrides or {}).get("run_timeout_s", settings.plan_run_timeout_seconds)),
+        )
+        root_attrs["node_status"] = node_status
+        if stopped_by is not None:
+            reason = "timeout" if node_status[stopped_by] == "timeout" else "failed"
+            return {"status": "degraded", "message": f"{stopped_by}_{reason}", "context": context, "nodes": node_status}
+        return {"status": "success", "context": context, "nodes": node_status}
 
 
@@ -0,0 +1,232 @@
+import bisect
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Tuple, Deque
+
+from app.config import settings
+
+# Upper bounds (ms) of the latency histogram bins; the last bin is open-ended
+LATENCY_BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+PERCENTILES = (0.50, 0.95, 0.99)
+DIMENSIONS = ("tool", "prompt", "model")
+OTHER_KEY = "_other"
+
+
+class Rollup:
+    """Counters and a latency histogram for one key (or the whole window)."""
+
+    __slots__ = ("count", "errors", "cost_usd", "latency")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.cost_usd = 0.0
+        self.latency = [0] * (len(LATENCY_BOUNDS_MS) + 1)
+
+    def add(self, latency_ms: int, error: bool, cost_usd: float) -> None:
+        self.count += 1
+        self.errors += error
+        self.cost_usd += cost_usd
+        self.latency[bisect.bisect_left(LATENCY_BOUNDS_MS, latency_ms)] += 1
+
+    def copy(self) -> "Rollup":
+        other = Rollup()
+        other.count, other.errors, other.cost_usd, other.latency = self.count, self.errors, self.cost_usd, list(self.latency)
+        return other
+
+    def minus(self, earlier: Optional["Rollup"]) -> "Rollup":
+        if earlier is None:
+            return self
+        diff = Rollup()
+        diff.count = self.count - earlier.count
+        diff.errors = self.errors - earlier.errors
+        diff.cost_usd = self.cost_usd - earlier.cost_usd
+        diff.latency = [a - b for a, b in zip(self.latency, earlier.latency)]
+        return diff
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Latency at quantile ``q``, interpolated linearly inside the histogram bin."""
+        samples = sum(self.latency)
+        if not samples:
+            return None
+        rank = q * samples
+        seen = 0
+        for index, bin_count in enumerate(self.latency):
+            if bin_count and seen + bin_count >= rank:
+                if index == len(LATENCY_BOUNDS_MS):
+                    return float(LATENCY_BOUNDS_MS[-1])
+                lower = LATENCY_BOUNDS_MS[index - 1] if index else 0
+                upper = LATENCY_BOUNDS_MS[index]
+                return round(lower + (upper - lower) * (rank - seen) / bin_count, 1)
+            seen += bin_count
+        return float(LATENCY_BOUNDS_MS[-1])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "cost_usd": round(self.cost_usd, 6),
+            **{f"p{int(q * 100)}_ms": self.percentile(q) for q in PERCENTILES},
+        }
+
+
+class RollupState:
+    """Cumulative rollups since startup: run totals plus one Rollup per tool, prompt version and model."""
+
+    __slots__ = ("runs", "calls", "keys")
+
+    def __init__(self) -> None:
+        self.runs = Rollup()
+        self.calls = Rollup()
+        self.keys: Dict[str, Dict[str, Rollup]] = {dimension: {} for dimension in DIMENSIONS}
+
+    def copy(self) -> "RollupState":
+        other = RollupState()
+        other.runs = self.runs.copy()
+        other.calls = self.calls.copy()
+        other.keys = {dimension: {key: rollup.copy() for key, rollup in rollups.items()}
+                      for dimension, rollups in self.keys.items()}
+        return other
+
+    def rollup(self, dimension: str, key: str) -> Rollup:
+        rollups = self.keys[dimension]
+        if key not in rollups and len(rollups) >= settings.cost_max_keys_per_dimension:
+            key = OTHER_KEY
+        if key not in rollups:
+            rollups[key] = Rollup()
+        return rollups[key]
+
+
+class CostAggregator:
+    """Folds finished spans into time-bucketed cumulative rollups.
+
+    At every bucket boundary the cumulative state is checkpointed, so the
+    rollups of any window are one subtraction of two checkpoints: the cost
+    of a report depends on the number of keys, not on the number of spans or
+    the length of the window. Spans are bucketed by their end time; one that
+    ends before the current bucket (clock skew) counts towards the current
+    bucket. Checkpoints older than ``cost_retention_hours`` are dropped.
+    """
+
+    def __init__(self, bucket_seconds: int = settings.cost_bucket_seconds,
+                 retention_hours: float = settings.cost_retention_hours) -> None:
+        self.bucket_seconds = bucket_seconds
+        self._state = RollupState()
+        self._checkpoints: Deque[Tuple[float, RollupState]] = deque(
+            maxlen=max(1, int(retention_hours * 3600 // bucket_seconds))
+        )
+        self._started_at = self._align(time.time())
+        self._bucket_start = self._started_at
+
+    def fold(self, record) -> None:
+        """Add one finished span (a tracing.SpanRecord)."""
+        self._roll(record.end)
+        attrs = record.attributes
+        latency_ms = int(attrs.get("latency_ms") or 0)
+        error = attrs.get("tool_status", "ok") != "ok"
+        if record.parent_span_id is None:
+            # Root span: one plan run, attributed to its prompt version
+            self._state.runs.add(latency_ms, error, 0.0)
+            self._state.rollup("prompt", str(attrs.get("prompt_id") or "unknown")).add(latency_ms, error, 0.0)
+            return
+        tool_name = attrs.get("tool_name")
+        if not tool_name:
+            return
+        cost_usd = float(attrs.get("cost_usd") or 0.0)
+        self._state.calls.add(latency_ms, error, cost_usd)
+        self._state.rollup("tool", str(tool_name)).add(latency_ms, error, cost_usd)
+        self._state.rollup("model", str(attrs.get("model") or "unknown")).add(latency_ms, error, cost_usd)
+        # Prompt rollups count runs; tool calls only add their cost
+        self._state.rollup("prompt", str(attrs.get("prompt_id") or "unknown")).cost_usd += cost_usd
+
+    def report(self, from_ts: Optional[float] = None, to_ts: Optional[float] = None) -> Dict[str, Any]:
+        """Rollups for [from_ts, to_ts), widened to bucket boundaries and clipped to the retained range."""
+        now = time.time()
+        self._roll(now)
+        full = len(self._checkpoints) == self._checkpoints.maxlen
+        earliest = self._checkpoints[0][0] if full else self._started_at
+        start = max(self._align(from_ts) if from_ts is not None else earliest, earliest)
+        end = max(start, self._align(to_ts if to_ts is not None else now, up=True))
+
+        upper = self._state_at(end)
+        # Nothing was folded before startup, so a window starting there subtracts nothing
+        lower = self._state_at(start) if start > self._started_at else None
+        runs = upper.runs.minus(lower.runs if lower else None)
+        calls = upper.calls.minus(lower.calls if lower else None)
+
+        def rows(dimension: str) -> List[Dict[str, Any]]:
+            result = []
+            for key, rollup in upper.keys[dimension].items():
+                window = rollup.minus(lower.keys[dimension].get(key) if lower else None)
+                if window.count or window.cost_usd:
+                    result.append({"key": key, **window.to_dict()})
+            return sorted(result, key=lambda row: (-row["cost_usd"], -row["count"]))
+
+        by_prompt = []
+        for row in rows("prompt"):
+            key = row.pop("key")
+            by_prompt.append({"prompt_id": key, "version": key.rpartition("@")[2] or key,
+                              "traces": row["count"], **row})
+        return {
+            "window": {
+                "from_ts": start,
+                "to_ts": end,
+                "bucket_seconds": self.bucket_seconds,
+            },
+            "summary": {
+                "total_cost_usd": round(calls.cost_usd, 6),
+                "total_traces": runs.count,
+                "failed_traces": runs.errors,
+                "tool_calls": calls.count,
+                "run_latency": runs.to_dict(),
+                "tool_latency": calls.to_dict(),
+            },
+            "by_prompt_version": by_prompt,
+            "by_tool": [{"tool": row.pop("key"), **row} for row in rows("tool")],
+            "by_model": [{"model": row.pop("key"), **row} for row in rows("model")],
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "checkpoints": len(self._checkpoints),
+            "max_checkpoints": self._checkpoints.maxlen,
+            "keys": {dimension: len(rollups) for dimension, rollups in self._state.keys.items()},
+        }
+
+    def _align(self, ts: float, up: bool = False) -> float:
+        buckets = ts // self.bucket_seconds
+        if up and ts % self.bucket_seconds:
+            buckets += 1
+        return buckets * self.bucket_seconds
+
+    def _roll(self, ts: float) -> None:
+        bucket_start = self._align(ts)
+        if bucket_start > self._bucket_start:
+            # Cumulative totals up to (not including) the new bucket
+            self._checkpoints.append((bucket_start, self._state.copy()))
+            self._bucket_start = bucket_start
+
+    def _state_at(self, ts: float) -> RollupState:
+        """Cumulative state at bucket boundary ``ts``: the first checkpoint at or after it, else the live state."""
+        index = bisect.bisect_left(self._checkpoints, ts, key=lambda checkpoint: checkpoint[0])
+        if index < len(self._checkpoints):
+            return self._checkpoints[index][1]
+        return self._state
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds or an ISO 8601 datetime (naive means UTC)."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+cost_aggregator = CostAggregator()
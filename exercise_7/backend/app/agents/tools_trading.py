@@ -1,19 +1,145 @@
 import asyncio
+import json
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, List
+from typing import Any, Dict, Optional, List, Tuple
 
 import httpx
 
 from app.config import settings
 from .tools import ToolResult, BaseTool
 
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+QUOTE_CACHE_MAX_ENTRIES = 256
+
+
+class TradingClient:
+    """Shared HTTP client for the trading agent.
+
+    One pooled AsyncClient keeps connections alive across tool calls (HTTP/2
+    when h2 is installed and the agent speaks it over TLS). Concurrent /quotes
+    requests for the same symbol set share one upstream call, built from the
+    normalized request rather than any one caller's payload, and quote
+    responses are cached for a few seconds per symbol set. Responses may be
+    shared between callers: treat them as read-only.
+    """
+
+    def __init__(self) -> None:
+        self._client: Optional[httpx.AsyncClient] = None
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._quote_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._stats = {"requests": 0, "errors": 0, "coalesced": 0, "cache_hits": 0, "clients_created": 0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=settings.trading_agent_url.rstrip("/"),
+                timeout=settings.trading_timeout_seconds,
+                http2=HTTP2_AVAILABLE and settings.trading_http2,
+                limits=httpx.Limits(
+                    max_connections=settings.trading_max_connections,
+                    max_keepalive_connections=settings.trading_max_keepalive_connections,
+                    keepalive_expiry=settings.trading_keepalive_expiry_seconds,
+                ),
+            )
+            self._stats["clients_created"] += 1
+        return self._client
+
+    async def post_json(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self._stats["requests"] += 1
+        try:
+            resp = await self._get_client().post(path, json=payload)
+            resp.raise_for_status()
+            return resp.json()
+        except Exception:
+            self._stats["errors"] += 1
+            raise
+
+    async def quotes(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST /quotes, answered from the cache or an identical in-flight request when possible."""
+        request = _quote_request(payload)
+        key = json.dumps(request, sort_keys=True, default=str)
+        cached = self._quote_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self._stats["cache_hits"] += 1
+            return cached[1]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_quotes(key, request))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish_quotes(key, done))
+        else:
+            self._stats["coalesced"] += 1
+        # A cancelled caller (e.g. a plan deadline) must not cancel the shared request
+        return await asyncio.shield(task)
+
+    async def _fetch_quotes(self, key: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        data = await self.post_json("/quotes", request)
+        ttl = settings.trading_quote_cache_ttl_seconds
+        if ttl > 0:
+            self._quote_cache[key] = (time.monotonic() + ttl, data)
+            self._quote_cache.move_to_end(key)
+            while len(self._quote_cache) > QUOTE_CACHE_MAX_ENTRIES:
+                self._quote_cache.popitem(last=False)
+        return data
+
+    def _finish_quotes(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the error as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        stats = {
+            **self._stats,
+            "in_flight": len(self._in_flight),
+            "cache_entries": sum(1 for expires, _ in self._quote_cache.values() if expires > now),
+            "http2": HTTP2_AVAILABLE and settings.trading_http2,
+            "max_connections": settings.trading_max_connections,
+            "max_keepalive_connections": settings.trading_max_keepalive_connections,
+        }
+        # httpx doesn't expose its pool; httpcore's connection list is best effort
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            stats["connections"] = len(connections)
+            stats["idle_connections"] = sum(1 for conn in connections if conn.is_idle())
+        return stats
+
+    async def aclose(self) -> None:
+        for task in list(self._in_flight.values()):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._quote_cache.clear()
+
+
+def _quote_request(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """The upstream /quotes body shared by equal requests.
+
+    Quotes are market data: it carries the sorted, de-duplicated, upper-cased
+    symbol set and the options, not the user (the agent defaults it).
+    """
+    options = {k: v for k, v in payload.items() if k not in ("symbols", "user_id")}
+    symbols = sorted({str(symbol).upper() for symbol in payload.get("symbols") or []})
+    return {"symbols": symbols, **options}
+
+
+trading_client = TradingClient()
+
 
 async def _post_json(path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-    url = settings.trading_agent_url.rstrip("/") + path
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        resp = await client.post(url, json=payload)
-        resp.raise_for_status()
-        return resp.json()
+    return await trading_client.post_json(path, payload)
 
 
 class TradingQuoteTool(BaseTool):
@@ -29,7 +155,7 @@ class TradingQuoteTool(BaseTool):
             "include_details": True,
             "user_id": overrides.get("user_id", "default_trader"),
         }
-        data = await _post_json("/quotes", payload)
+        data = await trading_client.quotes(payload)
         return ToolResult(ok=True, value=data)
 
 
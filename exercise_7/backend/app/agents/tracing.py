@@ -1,30 +1,240 @@
+import asyncio
+import json
+import logging
 import time
 import uuid
+from collections import OrderedDict, deque
 from contextlib import contextmanager
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Deque
 
+from app.config import settings
+from .cost_report import cost_aggregator
+
+logger = logging.getLogger(__name__)
+
+SPANS_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS agent_spans (
+    span_id TEXT PRIMARY KEY,
+    trace_id TEXT NOT NULL,
+    parent_span_id TEXT,
+    name TEXT NOT NULL,
+    start_ts DOUBLE PRECISION NOT NULL,
+    end_ts DOUBLE PRECISION NOT NULL,
+    attributes JSONB NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_agent_spans_trace_id ON agent_spans(trace_id, start_ts);
+"""
+
+
+class SpanRecord:
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "start", "end", "attributes")
+
+    def __init__(self, trace_id: str, span: Dict[str, Any]) -> None:
+        self.trace_id = trace_id
+        self.span_id = span["span_id"]
+        self.parent_span_id = span.get("parent_span_id")
+        self.name = span["name"]
+        self.start = span["start"]
+        self.end = span["end"]
+        self.attributes = span.get("attributes") or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "attributes": self.attributes,
+        }
+
+
+class TraceEntry:
+    __slots__ = ("created_at", "spans", "dropped_spans")
+
+    def __init__(self, created_at: float) -> None:
+        self.created_at = created_at
+        self.spans: List[SpanRecord] = []
+        self.dropped_spans = 0
+
+
+class TraceExporter:
+    """Batches finished spans into Postgres from a background task.
+
+    The request path only appends to a bounded queue; when the queue is full
+    the oldest spans are dropped. Without a database (demo mode) nothing is
+    queued and traces live in the in-memory buffer only.
+    """
 
-class TraceStore:
     def __init__(self) -> None:
-        self._traces: Dict[str, Dict[str, Any]] = {}
-        self._spans: Dict[str, List[Dict[str, Any]]] = {}
+        self._queue: Deque[SpanRecord] = deque(maxlen=settings.trace_export_queue_max)
+        self._pool = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._stats = {"exported": 0, "dropped": 0, "failed": 0, "batches": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self._pool is not None
+
+    async def start(self, pool=None) -> None:
+        if not settings.trace_export_enabled:
+            return
+        if pool is None:
+            from app.database import connection_pool
+            pool = connection_pool
+        if pool is None:
+            logger.info("Trace export disabled: no database connection")
+            return
+        async with pool.acquire() as conn:
+            await conn.execute(SPANS_TABLE_DDL)
+        self._pool = pool
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # A flag rather than cancel(): wait_for can swallow a cancellation that races the wakeup
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pool is not None:
+            while self._queue:
+                if not await self.flush():
+                    break
+        self._pool = None
+
+    def enqueue(self, record: SpanRecord) -> None:
+        if self._pool is None:
+            return
+        if len(self._queue) == self._queue.maxlen:
+            self._stats["dropped"] += 1
+        self._queue.append(record)
+        if len(self._queue) >= settings.trace_export_batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> bool:
+        """Write one batch; returns False if the write failed (the batch is dropped)."""
+        batch = [self._queue.popleft() for _ in range(min(len(self._queue), settings.trace_export_batch_size))]
+        if not batch:
+            return True
+        try:
+            async with self._pool.acquire() as conn:
+                await conn.executemany(
+                    "INSERT INTO agent_spans (span_id, trace_id, parent_span_id, name, start_ts, end_ts, attributes) "
+                    "VALUES ($1, $2, $3, $4, $5, $6, $7::jsonb) ON CONFLICT (span_id) DO NOTHING",
+                    [
+                        (r.span_id, r.trace_id, r.parent_span_id, r.name, r.start, r.end,
+                         json.dumps(r.attributes, default=str))
+                        for r in batch
+                    ],
+                )
+        except Exception as e:
+            self._stats["failed"] += len(batch)
+            logger.warning(f"⚠️ Trace export failed, dropped {len(batch)} spans: {e}")
+            return False
+        self._stats["exported"] += len(batch)
+        self._stats["batches"] += 1
+        return True
+
+    async def fetch_trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        if self._pool is None:
+            return None
+        async with self._pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT span_id, parent_span_id, name, start_ts, end_ts, attributes "
+                "FROM agent_spans WHERE trace_id = $1 ORDER BY start_ts",
+                trace_id,
+            )
+        if not rows:
+            return None
+        return {
+            "trace": {"trace_id": trace_id, "created_at": rows[0]["start_ts"]},
+            "spans": [
+                {
+                    "span_id": row["span_id"],
+                    "parent_span_id": row["parent_span_id"],
+                    "name": row["name"],
+                    "start": row["start_ts"],
+                    "end": row["end_ts"],
+                    "attributes": json.loads(row["attributes"]) if row["attributes"] else {},
+                }
+                for row in rows
+            ],
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "enabled": self.enabled, "queued": len(self._queue)}
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.trace_export_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._queue and not self._stopping:
+                if not await self.flush():
+                    break
+
+
+class TraceStore:
+    """Ring buffer of the most recent traces (LRU), backed by the exporter's store."""
+
+    def __init__(self, max_traces: int = settings.trace_buffer_max_traces) -> None:
+        self.max_traces = max_traces
+        self._traces: "OrderedDict[str, TraceEntry]" = OrderedDict()
+        self._evicted = 0
 
     def new_trace(self, trace_id: Optional[str] = None) -> str:
         tid = trace_id or str(uuid.uuid4())
-        self._traces[tid] = {"trace_id": tid, "created_at": time.time()}
-        self._spans[tid] = []
+        self._traces[tid] = TraceEntry(time.time())
+        self._touch(tid)
         return tid
 
     def add_span(self, trace_id: str, span: Dict[str, Any]) -> None:
-        self._spans.setdefault(trace_id, []).append(span)
+        record = SpanRecord(trace_id, span)
+        entry = self._traces.get(trace_id)
+        if entry is None:
+            entry = self._traces[trace_id] = TraceEntry(record.start)
+        self._touch(trace_id)
+        if len(entry.spans) < settings.trace_max_spans_per_trace:
+            entry.spans.append(record)
+        else:
+            entry.dropped_spans += 1
+        trace_exporter.enqueue(record)
+        cost_aggregator.fold(record)
 
     def get_trace(self, trace_id: str) -> Dict[str, Any]:
-        return {
-            "trace": self._traces.get(trace_id, {"trace_id": trace_id}),
-            "spans": self._spans.get(trace_id, []),
-        }
+        entry = self._traces.get(trace_id)
+        if entry is None:
+            return {"trace": {"trace_id": trace_id}, "spans": []}
+        self._traces.move_to_end(trace_id)
+        trace = {"trace_id": trace_id, "created_at": entry.created_at}
+        if entry.dropped_spans:
+            trace["dropped_spans"] = entry.dropped_spans
+        return {"trace": trace, "spans": [record.to_dict() for record in entry.spans]}
+
+    async def load_trace(self, trace_id: str) -> Dict[str, Any]:
+        """Buffer first, then the persistent store for traces evicted or from before a restart."""
+        if trace_id in self._traces:
+            return self.get_trace(trace_id)
+        stored = await trace_exporter.fetch_trace(trace_id)
+        return stored or {"trace": {"trace_id": trace_id}, "spans": []}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"buffered_traces": len(self._traces), "max_traces": self.max_traces, "evicted": self._evicted}
 
+    def _touch(self, trace_id: str) -> None:
+        self._traces.move_to_end(trace_id)
+        while len(self._traces) > self.max_traces:
+            self._traces.popitem(last=False)
+            self._evicted += 1
 
+
+trace_exporter = TraceExporter()
 trace_store = TraceStore()
 
 
@@ -37,6 +247,11 @@ def span(trace_id: str, name: str, parent_span_id: Optional[str] = None, attribu
         yield span_id, attrs
         status = "ok"
         error_code = None
+    except asyncio.CancelledError:
+        # Deadline hit or a sibling failed (see controller.execute_dag)
+        status = "cancelled"
+        error_code = "CancelledError"
+        raise
     except Exception as e:
         status = "error"
         error_code = type(e).__name__
@@ -54,5 +269,3 @@ def span(trace_id: str, name: str, parent_span_id: Optional[str] = None, attribu
                 "attributes": {**attrs, "tool_status": status, "error_code": error_code, "latency_ms": int((end - start) * 1000)},
             },
         )
-
-
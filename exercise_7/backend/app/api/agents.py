@@ -38,12 +38,10 @@ async def run_agent(payload: Dict[str, Any], background: BackgroundTasks) -> Dic
 
 @router.get("/trace/{trace_id}")
 async def get_trace(trace_id: str) -> Dict[str, Any]:
-    """Return a mock trace with spans for UI development.
-    Students will replace with real persisted trace data.
-    """
+    """Return a trace with its spans: recent traces from memory, older ones from Postgres."""
     try:
         from app.agents.tracing import trace_store
-        return trace_store.get_trace(trace_id)
+        return await trace_store.load_trace(trace_id)
     except Exception:
         return {"trace": {"trace_id": trace_id}, "spans": []}
 
@@ -63,20 +61,37 @@ async def switch_prompt(name: str, v: int) -> Dict[str, Any]:
     return {"status": "ok", "name": name, "active_version": v}
 
 
-@router.get("/report/cost")
-async def report_cost(from_ts: str | None = None, to_ts: str | None = None) -> Dict[str, Any]:
-    """Return mock aggregates for cost dashboard (students to implement)."""
+@router.get("/stats/trading-client")
+async def trading_client_stats() -> Dict[str, Any]:
+    """Connection pool, request coalescing and quote cache counters of the trading agent client."""
+    from app.agents.tools_trading import trading_client
+    return trading_client.get_stats()
+
+
+@router.get("/stats/traces")
+async def trace_stats() -> Dict[str, Any]:
+    """Trace buffer occupancy and span export counters."""
+    from app.agents.tracing import trace_store, trace_exporter
+    from app.agents.cost_report import cost_aggregator
     return {
-        "summary": {"total_cost_usd": 0.0123, "total_traces": 3},
-        "by_prompt_version": [
-            {"version": "v1", "cost_usd": 0.008, "traces": 2},
-            {"version": "v2", "cost_usd": 0.0043, "traces": 1},
-        ],
-        "by_tool": [
-            {"tool": "SearchTool", "cost_usd": 0.004},
-            {"tool": "PriceTool", "cost_usd": 0.007},
-            {"tool": "CacheTool", "cost_usd": 0.0013},
-        ],
+        "buffer": trace_store.get_stats(),
+        "export": trace_exporter.get_stats(),
+        "cost_rollups": cost_aggregator.get_stats(),
     }
 
 
+@router.get("/report/cost")
+async def report_cost(from_ts: str | None = None, to_ts: str | None = None) -> Dict[str, Any]:
+    """Cost, counts and latency percentiles per tool, prompt version and model.
+
+    ``from_ts``/``to_ts`` are epoch seconds or ISO 8601; the window is widened
+    to whole buckets and defaults to everything retained.
+    """
+    from app.agents.cost_report import cost_aggregator, parse_timestamp
+    try:
+        start, end = parse_timestamp(from_ts), parse_timestamp(to_ts)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from_ts/to_ts must be epoch seconds or ISO 8601")
+    return cost_aggregator.report(start, end)
+
+
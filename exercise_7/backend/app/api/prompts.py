@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from typing import Dict, Any, Optional
 
-from app.services.prompt_store import list_versions, create_version, set_deploy, resolve_prompt
+from app.services.prompt_store import list_versions, create_version, set_deploy, resolve_prompt, prompt_cache
 
 
 router = APIRouter(prefix="/api/prompts", tags=["Prompts"])
@@ -35,6 +35,11 @@ async def deploy_prompt(prompt_id: str, body: Dict[str, Any]):
     return await set_deploy(env, prompt_id, strategy, int(active_version or 1), ab_alt_version, int(traffic_split or 0))
 
 
+@router.get("/cache/stats")
+async def cache_stats():
+    return prompt_cache.get_stats()
+
+
 @router.get("/resolve")
 async def resolve(prompt: str, env: str = "development", user_key: Optional[str] = None):
     return await resolve_prompt(prompt, env, user_key)
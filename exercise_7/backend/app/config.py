@@ -153,11 +153,37 @@ class Settings(BaseSettings):
     circuit_window_seconds: int = Field(default=60, env="CIRCUIT_WINDOW_SECONDS")
     circuit_cooldown_seconds: int = Field(default=60, env="CIRCUIT_COOLDOWN_SECONDS")
 
+    # Plan execution: nodes run concurrently as their dependencies finish
+    plan_max_concurrency: int = Field(default=4, env="PLAN_MAX_CONCURRENCY")
+    plan_node_timeout_seconds: float = Field(default=10.0, env="PLAN_NODE_TIMEOUT_SECONDS")
+    plan_run_timeout_seconds: float = Field(default=30.0, env="PLAN_RUN_TIMEOUT_SECONDS")
+
+    # Tracing: in-memory ring buffer of recent traces, spans batch-exported to Postgres
+    trace_buffer_max_traces: int = Field(default=1000, env="TRACE_BUFFER_MAX_TRACES")
+    trace_max_spans_per_trace: int = Field(default=500, env="TRACE_MAX_SPANS_PER_TRACE")
+    trace_export_enabled: bool = Field(default=True, env="TRACE_EXPORT_ENABLED")
+    trace_export_batch_size: int = Field(default=200, env="TRACE_EXPORT_BATCH_SIZE")
+    trace_export_interval_seconds: float = Field(default=1.0, env="TRACE_EXPORT_INTERVAL_SECONDS")
+    trace_export_queue_max: int = Field(default=10000, env="TRACE_EXPORT_QUEUE_MAX")
+
+    # Cost report: spans folded into cumulative rollups checkpointed every bucket
+    cost_bucket_seconds: int = Field(default=60, env="COST_BUCKET_SECONDS")
+    cost_retention_hours: float = Field(default=24.0, env="COST_RETENTION_HOURS")
+    cost_max_keys_per_dimension: int = Field(default=100, env="COST_MAX_KEYS_PER_DIMENSION")
+
     # Prompt AB
     prompt_ab_v2_percent: float = Field(default=0.10, env="PROMPT_AB_V2_PERCENT")
+    # Prompt resolution: deploys/versions cached in-process, invalidated via LISTEN/NOTIFY
+    prompt_cache_enabled: bool = Field(default=True, env="PROMPT_CACHE_ENABLED")
 
     # Trading agent integration
     trading_agent_url: str = Field(default="http://localhost:8001", env="TRADING_AGENT_URL")
+    trading_timeout_seconds: float = Field(default=20.0, env="TRADING_TIMEOUT_SECONDS")
+    trading_http2: bool = Field(default=True, env="TRADING_HTTP2")
+    trading_max_connections: int = Field(default=20, env="TRADING_MAX_CONNECTIONS")
+    trading_max_keepalive_connections: int = Field(default=10, env="TRADING_MAX_KEEPALIVE_CONNECTIONS")
+    trading_keepalive_expiry_seconds: float = Field(default=30.0, env="TRADING_KEEPALIVE_EXPIRY_SECONDS")
+    trading_quote_cache_ttl_seconds: float = Field(default=2.0, env="TRADING_QUOTE_CACHE_TTL_SECONDS")
     
     # =============================================================================
     # VALIDATORS
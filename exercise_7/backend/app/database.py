@@ -4,11 +4,13 @@ Handles PostgreSQL with pgvector extension
 """
 
 import logging
+import struct
 from datetime import datetime
 from typing import AsyncGenerator, Dict, Any, Optional
 from contextlib import asynccontextmanager
 
 import asyncpg
+import numpy as np
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from sqlalchemy import text
@@ -57,6 +59,7 @@ async def init_database():
             min_size=5,
             max_size=settings.db_pool_size,
             command_timeout=settings.db_pool_timeout,
+            init=register_vector_codec,
         )
         
         # Test connection
@@ -152,7 +155,9 @@ async def get_connection() -> asyncpg.Connection:
         logger.warning("Connection pool not available, creating direct connection")
         # Convert SQLAlchemy URL to asyncpg format
         asyncpg_url = settings.database_url.replace("postgresql+asyncpg://", "postgresql://")
-        return await asyncpg.connect(asyncpg_url)
+        conn = await asyncpg.connect(asyncpg_url)
+        await register_vector_codec(conn)
+        return conn
 
 
 @asynccontextmanager
@@ -211,6 +216,35 @@ async def get_database_health() -> Dict[str, Any]:
 # VECTOR OPERATIONS
 # =============================================================================
 
+def encode_vector(value) -> bytes:
+    """Encode a sequence of floats as pgvector binary (uint16 dim, uint16 unused, float4[dim])"""
+    vector = np.asarray(value, dtype='>f4')
+    if vector.ndim != 1:
+        raise ValueError(f"Expected a 1-D vector, got shape {vector.shape}")
+    return struct.pack('>HH', vector.shape[0], 0) + vector.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    """Decode pgvector binary into a float32 NumPy array"""
+    dimension, _ = struct.unpack_from('>HH', data)
+    return np.frombuffer(data, dtype='>f4', count=dimension, offset=4).astype(np.float32)
+
+
+async def register_vector_codec(conn: asyncpg.Connection):
+    """Register a binary codec for the pgvector ``vector`` type on a connection"""
+    try:
+        await conn.set_type_codec(
+            'vector',
+            schema='public',
+            encoder=encode_vector,
+            decoder=decode_vector,
+            format='binary',
+        )
+    except ValueError:
+        # Type lookup fails when the extension is missing; check_pgvector_extension reports it
+        logger.warning("pgvector type not found - binary vector codec not registered")
+
+
 async def create_vector_index(table_name: str, column_name: str, dimension: int):
     """Create vector index for similarity search"""
     try:
@@ -72,6 +72,20 @@ async def startup_event():
         logger.info("📊 Initializing database connection...")
         await init_database()
         
+        # Persist agent trace spans in the background
+        try:
+            from app.agents.tracing import trace_exporter
+            await trace_exporter.start()
+        except Exception as e:
+            logger.warning(f"⚠️ Trace export disabled: {e}")
+        
+        # Create the prompt tables once and start listening for prompt changes
+        try:
+            from app.services.prompt_store import prompt_cache
+            await prompt_cache.start()
+        except Exception as e:
+            logger.warning(f"⚠️ Prompt cache disabled: {e}")
+        
         # Initialize ChromaDB
         logger.info("🔗 Initializing ChromaDB...")
         chromadb_success = await init_chromadb(
@@ -109,9 +123,21 @@ async def shutdown_event():
         # Close ChromaDB
         await close_chromadb()
         
+        # Flush queued trace spans while the database is still open
+        from app.agents.tracing import trace_exporter
+        await trace_exporter.stop()
+        
+        # Release the prompt cache's LISTEN connection
+        from app.services.prompt_store import prompt_cache
+        await prompt_cache.stop()
+        
         # Close database
         await close_database()
         
+        # Close the pooled trading agent client
+        from app.agents.tools_trading import trading_client
+        await trading_client.aclose()
+        
         logger.info("✅ Shutdown completed")
         
     except Exception as e:
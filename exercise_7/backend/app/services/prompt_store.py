@@ -1,9 +1,20 @@
 import asyncio
+import json
+import logging
 from typing import Any, Dict, List, Optional, Tuple
 import random
 
+from app.config import settings
 from app.database import execute_raw_command, execute_raw_query, check_table_exists
 
+logger = logging.getLogger(__name__)
+
+# Writers NOTIFY this channel so every worker drops its cached entries
+INVALIDATION_CHANNEL = "prompt_store_invalidate"
+
+_schema_ready = False
+_schema_lock = asyncio.Lock()
+
 
 PROMPT_SEED = {
     "agent/planner": [
@@ -26,6 +37,17 @@ PROMPT_SEED = {
 
 
 async def ensure_schema() -> None:
+    """Create and seed the prompt tables; runs once per process (at startup)."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    async with _schema_lock:
+        if not _schema_ready:
+            await _create_schema()
+            _schema_ready = True
+
+
+async def _create_schema() -> None:
     if not await check_table_exists("prompts"):
         await execute_raw_command(
             """
@@ -104,6 +126,156 @@ async def ensure_schema() -> None:
         )
 
 
+class PromptCache:
+    """In-process cache of prompt deploys and versions for resolve_prompt.
+
+    Versions are immutable once created, so they are cached for good. Deploys
+    and each prompt's latest version change with set_deploy/create_version:
+    writers drop their own entries and NOTIFY the other workers, which drop
+    theirs from a LISTEN connection. Deploys are only cached while that
+    listener is up; without it they are read from the database every time.
+    """
+
+    def __init__(self) -> None:
+        self._versions: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._deploys: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+        self._latest: Dict[str, Optional[int]] = {}
+        # Bumped on every invalidation so a load that raced one isn't cached
+        self._generation = 0
+        self._listener = None
+        self._listening = False
+        self._pool = None
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @property
+    def listening(self) -> bool:
+        return self._listening
+
+    async def start(self, pool=None) -> None:
+        if pool is None:
+            from app.database import connection_pool
+            pool = connection_pool
+        if pool is None:
+            return
+        await ensure_schema()
+        if not settings.prompt_cache_enabled:
+            return
+        conn = await pool.acquire()
+        try:
+            await conn.add_listener(INVALIDATION_CHANNEL, self._on_notify)
+        except Exception:
+            await pool.release(conn)
+            raise
+        conn.add_termination_listener(self._on_listener_lost)
+        self._pool, self._listener, self._listening = pool, conn, True
+        self.clear()
+
+    async def stop(self) -> None:
+        conn, self._listener, self._listening = self._listener, None, False
+        if conn is not None:
+            try:
+                await conn.remove_listener(INVALIDATION_CHANNEL, self._on_notify)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not unlisten prompt changes: {e}")
+            await self._pool.release(conn)
+        self._pool = None
+        self.clear()
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._deploys.clear()
+        self._latest.clear()
+
+    def invalidate(self, prompt_id: str, env: Optional[str] = None) -> None:
+        """Drop the deploy of ``env`` (all envs when None) and the latest version of ``prompt_id``."""
+        self._generation += 1
+        self._stats["invalidations"] += 1
+        self._latest.pop(prompt_id, None)
+        for key in [key for key in self._deploys if key[1] == prompt_id and env in (None, key[0])]:
+            del self._deploys[key]
+
+    async def deploy(self, env: str, prompt_id: str) -> Optional[Dict[str, Any]]:
+        key = (env, prompt_id)
+        if self.listening and key in self._deploys:
+            self._stats["hits"] += 1
+            return self._deploys[key]
+        self._stats["misses"] += 1
+        generation = self._generation
+        rows = await execute_raw_query(
+            "SELECT strategy, active_version, ab_alt_version, traffic_split FROM prompt_deploys WHERE env=$1 AND prompt_id=$2",
+            env,
+            prompt_id,
+        )
+        deploy = rows[0] if rows else None
+        if self.listening and generation == self._generation:
+            self._deploys[key] = deploy
+        return deploy
+
+    async def latest_version(self, prompt_id: str) -> Optional[int]:
+        if self.listening and prompt_id in self._latest:
+            self._stats["hits"] += 1
+            return self._latest[prompt_id]
+        self._stats["misses"] += 1
+        generation = self._generation
+        rows = await execute_raw_query(
+            "SELECT MAX(version) AS v FROM prompt_versions WHERE prompt_id=$1", prompt_id
+        )
+        latest = rows[0]["v"] if rows and rows[0]["v"] is not None else None
+        if self.listening and generation == self._generation:
+            self._latest[prompt_id] = latest
+        return latest
+
+    async def version(self, prompt_id: str, version: int) -> Optional[Dict[str, Any]]:
+        key = (prompt_id, int(version))
+        cached = self._versions.get(key)
+        if cached is not None:
+            self._stats["hits"] += 1
+            return cached
+        self._stats["misses"] += 1
+        rows = await execute_raw_query(
+            "SELECT version, template, metadata FROM prompt_versions WHERE prompt_id=$1 AND version=$2",
+            prompt_id,
+            version,
+        )
+        if not rows:
+            # Not cached: the version may still be created
+            return None
+        if settings.prompt_cache_enabled:
+            self._versions[key] = rows[0]
+        return rows[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "listening": self.listening,
+            "versions": len(self._versions),
+            "deploys": len(self._deploys),
+        }
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            message = json.loads(payload)
+            self.invalidate(message["prompt_id"], message.get("env"))
+        except (ValueError, KeyError, TypeError):
+            self.clear()
+
+    def _on_listener_lost(self, connection) -> None:
+        # Other workers' changes can no longer be seen, so stop caching deploys
+        logger.warning("⚠️ Prompt cache lost its LISTEN connection, deploys are read from the database")
+        self._listening = False
+        self.clear()
+
+
+prompt_cache = PromptCache()
+
+
+async def _notify_change(prompt_id: str, env: Optional[str] = None) -> None:
+    prompt_cache.invalidate(prompt_id, env)
+    await execute_raw_command(
+        "SELECT pg_notify($1, $2)", INVALIDATION_CHANNEL, json.dumps({"prompt_id": prompt_id, "env": env})
+    )
+
+
 async def list_versions(prompt_id: str) -> List[Dict[str, Any]]:
     await ensure_schema()
     rows = await execute_raw_query(
@@ -136,6 +308,8 @@ async def create_version(prompt_id: str, template: str, metadata: Dict[str, Any]
         changelog,
         created_by,
     )
+    # A new latest version changes what prompts without a deploy resolve to
+    await _notify_change(prompt_id)
     return {"prompt_id": prompt_id, "version": next_version}
 
 
@@ -159,25 +333,21 @@ async def set_deploy(env: str, prompt_id: str, strategy: str, active_version: in
         ab_alt_version,
         traffic_split or 0,
     )
+    await _notify_change(prompt_id, env)
     return {"env": env, "prompt_id": prompt_id, "strategy": strategy}
 
 
 async def resolve_prompt(prompt_uri: str, env: str, user_key: Optional[str] = None) -> Dict[str, Any]:
+    """Pick the deployed (or A/B) version of a prompt; served from prompt_cache when warm."""
     await ensure_schema()
     prompt_id = prompt_uri.replace("prompt://", "")
-    deploy = await execute_raw_query(
-        "SELECT strategy, active_version, ab_alt_version, traffic_split FROM prompt_deploys WHERE env=$1 AND prompt_id=$2",
-        env,
-        prompt_id,
-    )
-    if not deploy:
+    d = await prompt_cache.deploy(env, prompt_id)
+    if d is None:
         # fallback to latest version
-        versions = await list_versions(prompt_id)
-        if not versions:
+        version = await prompt_cache.latest_version(prompt_id)
+        if version is None:
             return {"prompt_id": prompt_id, "version": 1, "template": "", "metadata": {}}
-        version = int(versions[0]["version"])
     else:
-        d = deploy[0]
         if d["strategy"] == "ab" and d.get("ab_alt_version") and int(d.get("traffic_split") or 0) > 0:
             # deterministic split
             key = user_key or "default"
@@ -186,14 +356,7 @@ async def resolve_prompt(prompt_uri: str, env: str, user_key: Optional[str] = No
         else:
             version = d["active_version"]
 
-    row = await execute_raw_query(
-        "SELECT version, template, metadata FROM prompt_versions WHERE prompt_id=$1 AND version=$2",
-        prompt_id,
-        version,
-    )
-    if not row:
+    r = await prompt_cache.version(prompt_id, version)
+    if r is None:
         return {"prompt_id": prompt_id, "version": version, "template": "", "metadata": {}}
-    r = row[0]
     return {"prompt_id": prompt_id, "version": r["version"], "template": r["template"], "metadata": r["metadata"]}
-
-
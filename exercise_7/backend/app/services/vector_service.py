@@ -80,14 +80,14 @@ class PostgreSQLVectorService:
                     # Generate embedding
                     embedding = await self._generate_embedding(content)
                     
-                    # Insert chunk with embedding (convert to pgvector format)
-                    embedding_str = '[' + ','.join(map(str, embedding)) + ']'
+                    # Insert chunk with embedding (binary float32 via the vector codec)
+                    embedding_param = np.asarray(embedding, dtype=np.float32)
                     metadata_json = json.dumps(chunk.get('metadata', {}))
                     chunk_id = await conn.fetchval("""
                         INSERT INTO document_chunks (
                             document_id, chunk_index, content, content_hash,
                             token_count, char_count, embedding, metadata
-                        ) VALUES ($1, $2, $3, $4, $5, $6, $7::vector, $8::jsonb)
+                        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8::jsonb)
                         ON CONFLICT (document_id, chunk_index) 
                         DO UPDATE SET 
                             content = EXCLUDED.content,
@@ -98,7 +98,7 @@ class PostgreSQLVectorService:
                     """, 
                         document_id, i, content, content_hash,
                         chunk.get('token_count'), len(content), 
-                        embedding_str, metadata_json
+                        embedding_param, metadata_json
                     )
                     
                     chunk_ids.append(str(chunk_id))
@@ -126,8 +126,8 @@ class PostgreSQLVectorService:
             # Generate query embedding
             query_embedding = await self._generate_embedding(query)
             
-            # Build SQL query (convert query embedding to pgvector format)
-            query_embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
+            # Build SQL query (query embedding is sent in binary via the vector codec)
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
             sql = """
                 SELECT 
                     dc.id,
@@ -137,18 +137,18 @@ class PostgreSQLVectorService:
                     dc.metadata,
                     (dc.metadata->>'filename') as filename,
                     (dc.metadata->>'title') as title,
-                    1 - (dc.embedding <=> $1::vector) as similarity_score
+                    1 - (dc.embedding <=> $1) as similarity_score
                 FROM document_chunks dc
-                WHERE 1 - (dc.embedding <=> $1::vector) >= $2
+                WHERE 1 - (dc.embedding <=> $1) >= $2
             """
             
-            params = [query_embedding_str, similarity_threshold]
+            params = [query_vector, similarity_threshold]
             
             if knowledge_base_id:
                 sql += " AND (dc.metadata->>'knowledge_base_id') = $3"
                 params.append(knowledge_base_id)
             
-            sql += " ORDER BY dc.embedding <=> $1::vector LIMIT $" + str(len(params) + 1)
+            sql += " ORDER BY dc.embedding <=> $1 LIMIT $" + str(len(params) + 1)
             params.append(max_results)
             
             conn = await get_connection()
@@ -211,7 +211,8 @@ class PostgreSQLVectorService:
                     RETURNING id
                 """, 
                     kb_id, question, answer,
-                    question_embedding, answer_embedding,
+                    np.asarray(question_embedding, dtype=np.float32),
+                    np.asarray(answer_embedding, dtype=np.float32),
                     metadata.get('tags', []) if metadata else [],
                     metadata or {}
                 )
@@ -270,7 +271,7 @@ class PostgreSQLVectorService:
                 FROM all_matches
             """
             
-            params = [query_embedding, similarity_threshold]
+            params = [np.asarray(query_embedding, dtype=np.float32), similarity_threshold]
             
             if knowledge_base_id:
                 # Add knowledge base filter (need to join with knowledge_bases table)
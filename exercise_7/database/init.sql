@@ -162,6 +162,17 @@ CREATE TABLE search_analytics (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Agent trace spans, batch-exported by app/agents/tracing.py (which also creates the table)
+CREATE TABLE agent_spans (
+    span_id TEXT PRIMARY KEY,
+    trace_id TEXT NOT NULL,
+    parent_span_id TEXT,
+    name TEXT NOT NULL,
+    start_ts DOUBLE PRECISION NOT NULL,
+    end_ts DOUBLE PRECISION NOT NULL,
+    attributes JSONB NOT NULL DEFAULT '{}'
+);
+
 -- =============================================================================
 -- INDEXES FOR PERFORMANCE
 -- =============================================================================
@@ -207,6 +218,7 @@ CREATE INDEX idx_message_feedback_message_id ON message_feedback(message_id);
 CREATE INDEX idx_message_feedback_type ON message_feedback(feedback_type);
 CREATE INDEX idx_search_analytics_kb_id ON search_analytics(knowledge_base_id);
 CREATE INDEX idx_search_analytics_created ON search_analytics(created_at DESC);
+CREATE INDEX idx_agent_spans_trace_id ON agent_spans(trace_id, start_ts);
 
 -- =============================================================================
 -- FUNCTIONS AND TRIGGERS
@@ -5,6 +5,7 @@ Authentication API routes
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from datetime import timedelta
 
 from ..database import get_db
@@ -42,8 +43,8 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
             detail="Email already registered"
         )
     
-    # Create user
-    user = create_user(db, user_data)
+    # Create user (password hashing runs off the event loop)
+    user = await run_in_threadpool(create_user, db, user_data)
     return user
 
 
@@ -54,7 +55,8 @@ async def login(
 ):
     """Login and get access token"""
     print(f"🔍 Login attempt: username={form_data.username}, password={form_data.password}")
-    user = authenticate_user(db, form_data.username, form_data.password)
+    # Password verification is deliberately slow; keep it off the event loop
+    user = await run_in_threadpool(authenticate_user, db, form_data.username, form_data.password)
     print(f"🔍 Authentication result: {user}")
     if not user:
         raise HTTPException(
@@ -88,7 +90,7 @@ class SimpleLogin(PydanticBaseModel):
 @router.post("/test-login", response_model=Token)
 async def test_login(credentials: SimpleLogin, db: Session = Depends(get_db)):
     """Test login endpoint for debugging"""
-    user = authenticate_user(db, credentials.username, credentials.password)
+    user = await run_in_threadpool(authenticate_user, db, credentials.username, credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
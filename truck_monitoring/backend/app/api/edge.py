@@ -3,14 +3,21 @@ Edge computer API routes for truck detection
 These endpoints do NOT require authentication
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional, Tuple, Dict, Any
 from datetime import datetime
+import asyncio
+import json
 
-from ..database import get_db
-from ..models import Truck, DailyStatistics
+from ..database import SessionLocal, get_async_db, write_lock
+from ..models import Truck, EdgeDetection
+from ..statistics_rollup import fold_trucks, apply_statistics_delta
+from ..live_events import live_hub, ingest_events
 
 router = APIRouter(prefix="/api", tags=["Edge"])
 
@@ -53,78 +60,257 @@ class EdgeTruckResponse(BaseModel):
     timestamp: str
 
 
-def update_daily_statistics(db: Session, truck: Truck):
-    """Update daily statistics after adding a new truck"""
-    date_str = truck.date
-    
-    # Get or create daily statistics
-    stats = db.query(DailyStatistics).filter(DailyStatistics.date == date_str).first()
-    
-    if not stats:
-        stats = DailyStatistics(
-            date=date_str,
-            total_trucks=0,
-            avg_length=0.0,
-            avg_speed=0.0,
-            container_count=0,
-            flatbed_count=0,
-            tanker_count=0,
-            other_count=0,
-            peak_hour=0,
-            peak_hour_count=0
-        )
-        db.add(stats)
+class EdgeBatchItemResult(BaseModel):
+    """Outcome of one detection in a batch submission"""
+    index: int
+    id: Optional[int] = None
+    timestamp: Optional[str] = None
+    status: str  # success, duplicate, skipped or invalid
+    message: str
+    truck_id: int = 0
+
+
+class EdgeBatchResponse(BaseModel):
+    """Response for edge batch submission"""
+    status: str
+    received: int
+    inserted: int
+    duplicates: int
+    skipped: int
+    invalid: int
+    results: List[EdgeBatchItemResult]
+
+
+# Largest batch accepted in one request
+MAX_BATCH_SIZE = 5000
+
+# Keys per query when looking up already recorded detections
+KEY_LOOKUP_CHUNK = 400
+
+# Single detections waiting for the next group write: (data, truck, future of the truck id)
+_pending_writes: List[Tuple["EdgeTruckData", Truck, asyncio.Future]] = []
+
+# Writes queued detections group by group; started by the first ingest that finds it idle
+_group_writer: Optional[asyncio.Task] = None
+
+DIRECTION_MAP = {
+    0: "Unknown",
+    1: "Northbound",
+    2: "Southbound",
+    3: "Eastbound",
+    4: "Westbound"
+}
+
+
+def build_truck(data: EdgeTruckData) -> Tuple[Optional[Truck], str]:
+    """
+    Convert edge detection data into a Truck record
+    
+    Returns:
+        (truck, message); truck is None when the detection is skipped
+    """
+    # Skip if not classified as a truck
+    if not data.is_truck:
+        return None, "Not classified as a truck"
     
-    # Get all trucks for this date
-    all_trucks = db.query(Truck).filter(Truck.date == date_str).all()
+    # Skip if confidence too low (optional threshold)
+    if data.classification_confidence < 0.5:
+        return None, f"Confidence too low: {data.classification_confidence}"
     
-    # Update statistics
-    stats.total_trucks = len(all_trucks)
+    # Parse timestamp
+    try:
+        pass_time = datetime.fromisoformat(data.timestamp.replace('Z', '+00:00'))
+    except:
+        pass_time = datetime.now()
     
-    # Calculate averages
-    lengths = [t.length_meters for t in all_trucks if t.length_meters]
-    speeds = [t.speed_kmh for t in all_trucks if t.speed_kmh]
+    # Map direction
+    direction_str = DIRECTION_MAP.get(data.direction, "Unknown")
     
-    stats.avg_length = sum(lengths) / len(lengths) if lengths else 0.0
-    stats.avg_speed = sum(speeds) / len(speeds) if speeds else 0.0
+    # Convert length from mm to meters
+    length_meters = data.length_mm / 1000.0
     
-    # Count by type
-    type_counts = {"Container": 0, "Flatbed": 0, "Tanker": 0, "Box Truck": 0, "Small Truck": 0, "Other": 0}
-    for t in all_trucks:
-        truck_type = t.truck_type or "Other"
-        if truck_type in type_counts:
-            type_counts[truck_type] += 1
-        else:
-            type_counts["Other"] += 1
+    # Classify truck type based on length
+    if length_meters >= 12.0:
+        truck_type = "Container"
+    elif length_meters >= 8.0:
+        truck_type = "Flatbed"
+    elif length_meters >= 6.0:
+        truck_type = "Box Truck"
+    else:
+        truck_type = "Small Truck"
     
-    stats.container_count = type_counts.get("Container", 0)
-    stats.flatbed_count = type_counts.get("Flatbed", 0)
-    stats.tanker_count = type_counts.get("Tanker", 0)
-    stats.other_count = type_counts.get("Box Truck", 0) + type_counts.get("Small Truck", 0) + type_counts.get("Other", 0)
+    # Create truck record
+    truck = Truck(
+        truck_number=f"EDGE-{data.id}-{pass_time.strftime('%Y%m%d%H%M%S')}",
+        license_plate=None,  # Edge computer doesn't provide this
+        truck_type=truck_type,
+        length_meters=length_meters,
+        weight_tons=None,  # Not provided by edge
+        speed_kmh=data.speed_kmh if data.speed_kmh > 0 else None,
+        location="Edge Detection Point",
+        direction=direction_str,
+        pass_time=pass_time,
+        date=pass_time.strftime("%Y-%m-%d"),
+        image_url=f"/uploads/images/{data.image_path}" if data.image_path else None,
+        video_url=f"/uploads/videos/{data.video_path}" if data.video_path else None,
+        thumbnail_url=f"/uploads/thumbnails/{data.image_path}" if data.image_path else None,
+        company_name=None,
+        driver_name=None,
+        cargo_description=None,
+        notes=f"Edge detection | Confidence: {data.classification_confidence:.2%} | Height: {data.height_mm}mm"
+    )
+    return truck, f"Truck recorded successfully: {truck_type}"
+
+
+async def find_recorded_detections(db: AsyncSession, keys: List[Tuple[int, str]]) -> Dict[Tuple[int, str], int]:
+    """Map already recorded (edge id, timestamp) keys to their truck ids"""
+    recorded = {}
+    for start in range(0, len(keys), KEY_LOOKUP_CHUNK):
+        chunk = keys[start:start + KEY_LOOKUP_CHUNK]
+        rows = await db.execute(
+            select(EdgeDetection.edge_id, EdgeDetection.timestamp, EdgeDetection.truck_id)
+            .where(or_(*[
+                and_(EdgeDetection.edge_id == edge_id, EdgeDetection.timestamp == timestamp)
+                for edge_id, timestamp in chunk
+            ]))
+        )
+        for row in rows:
+            recorded[(row.edge_id, row.timestamp)] = row.truck_id
+    return recorded
+
+
+def record_trucks(items: List[Tuple[int, str, Truck]]) -> Tuple[List[int], List[Dict[str, Any]]]:
+    """
+    Insert new trucks with their edge detections and statistics in one transaction
     
-    # Find peak hour
-    hour_counts = {}
-    for t in all_trucks:
-        hour = t.pass_time.hour
-        hour_counts[hour] = hour_counts.get(hour, 0) + 1
+    Runs in the threadpool on the sync engine, under write_lock(): as one
+    call its statements aren't queued behind other requests on the event
+    loop, so the (SQLite) write lock is held only as long as the write.
+    Raises IntegrityError, with nothing written, if any detection was
+    already recorded.
     
-    if hour_counts:
-        peak_hour = max(hour_counts.items(), key=lambda x: x[1])
-        stats.peak_hour = peak_hour[0]
-        stats.peak_hour_count = peak_hour[1]
+    Args:
+        items: (edge id, timestamp, truck) of each new detection
     
-    db.commit()
+    Returns:
+        Truck ids in item order, and the live events to publish after commit
+    """
+    db = SessionLocal()
+    try:
+        trucks = [truck for _, _, truck in items]
+        db.add_all(trucks)
+        db.flush()
+        db.add_all([
+            EdgeDetection(edge_id=edge_id, timestamp=timestamp, truck_id=truck.id)
+            for edge_id, timestamp, truck in items
+        ])
+        # A replayed detection fails here, before any statistics are touched
+        db.flush()
+        
+        # One statistics update per affected date
+        deltas = fold_trucks(trucks)
+        for date_str, delta in deltas.items():
+            apply_statistics_delta(db, date_str, delta)
+        
+        events = ingest_events(trucks, deltas)
+        truck_ids = [truck.id for truck in trucks]
+        db.commit()
+        return truck_ids, events
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def record_truck(data: EdgeTruckData, truck: Truck) -> int:
+    """
+    Record one new detection and return its truck id
+    
+    Detections that arrive while a group is being written queue up, and the
+    group writer records all of them in the next transaction. Every ingest
+    updates the same statistics rows, so concurrent ingests would wait for
+    each other anyway (for the SQLite write lock, or for row locks
+    elsewhere); grouped, they share a commit and a trip to the threadpool.
+    
+    The writer is a task of its own, so a cancelled request never holds up
+    the others; its detection is dropped if no group has taken it yet.
+    """
+    global _group_writer
+    future = asyncio.get_running_loop().create_future()
+    _pending_writes.append((data, truck, future))
+    if _group_writer is None or _group_writer.done():
+        _group_writer = asyncio.create_task(_write_pending_groups())
+    return await future
+
+
+async def _write_pending_groups():
+    """Record queued detections one group at a time until none are left"""
+    try:
+        while _pending_writes:
+            # Skip detections whose request was cancelled while queued
+            group = [entry for entry in _pending_writes if not entry[2].done()]
+            _pending_writes.clear()
+            if group:
+                await _record_group(group)
+    finally:
+        # Only left over if this task was cancelled
+        for _, _, future in _pending_writes:
+            future.cancel()
+        _pending_writes.clear()
+
+
+async def _record_group(group: List[Tuple[EdgeTruckData, Truck, asyncio.Future]]):
+    """
+    Record queued detections together; if one was recorded concurrently, record them one by one
+    
+    Every future of the group is resolved when this returns, however it ends.
+    """
+    error: BaseException = RuntimeError("Detection was not recorded")
+    try:
+        async with write_lock():
+            truck_ids, events = await run_in_threadpool(
+                record_trucks, [(data.id, data.timestamp, truck) for data, truck, _ in group]
+            )
+        for (_, _, future), truck_id in zip(group, truck_ids):
+            if not future.done():
+                future.set_result(truck_id)
+        # Push to live dashboards once committed
+        live_hub.publish_many(events)
+    except IntegrityError as e:
+        error = e
+        if len(group) > 1:
+            for data, _, future in group:
+                # The rolled back Truck objects can't be added again
+                truck, _ = build_truck(data)
+                await _record_group([(data, truck, future)])
+    except Exception as e:
+        error = e
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        for _, _, future in group:
+            if future.done():
+                continue
+            if isinstance(error, Exception):
+                future.set_exception(error)
+            else:
+                future.cancel()
 
 
 @router.post("/truck-count", response_model=EdgeTruckResponse)
 async def receive_truck_from_edge(
     data: EdgeTruckData,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Receive truck detection data from edge computer.
     This endpoint does NOT require authentication.
     
+    Detections already recorded with the same (id, timestamp) are not
+    inserted again and return status "duplicate".
+    
     Direction mapping:
     - 0: Unknown
     - 1: Northbound
@@ -151,97 +337,198 @@ async def receive_truck_from_edge(
     ```
     """
     try:
-        # Skip if not classified as a truck
-        if not data.is_truck:
+        new_truck, message = build_truck(data)
+        if new_truck is None:
             return EdgeTruckResponse(
                 status="skipped",
-                message="Not classified as a truck",
+                message=message,
                 truck_id=0,
                 timestamp=data.timestamp
             )
         
-        # Skip if confidence too low (optional threshold)
-        if data.classification_confidence < 0.5:
+        # Replayed detection; a concurrent replay is caught by the unique key below
+        recorded = await find_recorded_detections(db, [(data.id, data.timestamp)])
+        if recorded:
             return EdgeTruckResponse(
-                status="skipped",
-                message=f"Confidence too low: {data.classification_confidence}",
-                truck_id=0,
+                status="duplicate",
+                message="Detection already recorded",
+                truck_id=recorded[(data.id, data.timestamp)],
                 timestamp=data.timestamp
             )
         
-        # Parse timestamp
-        try:
-            pass_time = datetime.fromisoformat(data.timestamp.replace('Z', '+00:00'))
-        except:
-            pass_time = datetime.now()
-        
-        # Map direction
-        direction_map = {
-            0: "Unknown",
-            1: "Northbound",
-            2: "Southbound",
-            3: "Eastbound",
-            4: "Westbound"
-        }
-        direction_str = direction_map.get(data.direction, "Unknown")
-        
-        # Convert length from mm to meters
-        length_meters = data.length_mm / 1000.0
-        
-        # Classify truck type based on length
-        if length_meters >= 12.0:
-            truck_type = "Container"
-        elif length_meters >= 8.0:
-            truck_type = "Flatbed"
-        elif length_meters >= 6.0:
-            truck_type = "Box Truck"
-        else:
-            truck_type = "Small Truck"
-        
-        # Create truck record
-        new_truck = Truck(
-            truck_number=f"EDGE-{data.id}-{pass_time.strftime('%Y%m%d%H%M%S')}",
-            license_plate=None,  # Edge computer doesn't provide this
-            truck_type=truck_type,
-            length_meters=length_meters,
-            weight_tons=None,  # Not provided by edge
-            speed_kmh=data.speed_kmh if data.speed_kmh > 0 else None,
-            location="Edge Detection Point",
-            direction=direction_str,
-            pass_time=pass_time,
-            date=pass_time.strftime("%Y-%m-%d"),
-            image_url=f"/uploads/images/{data.image_path}" if data.image_path else None,
-            video_url=f"/uploads/videos/{data.video_path}" if data.video_path else None,
-            thumbnail_url=f"/uploads/thumbnails/{data.image_path}" if data.image_path else None,
-            company_name=None,
-            driver_name=None,
-            cargo_description=None,
-            notes=f"Edge detection | Confidence: {data.classification_confidence:.2%} | Height: {data.height_mm}mm"
-        )
-        
-        db.add(new_truck)
-        db.commit()
-        db.refresh(new_truck)
-        
-        # Update daily statistics
-        update_daily_statistics(db, new_truck)
+        # Only the write transaction is serialized, not the duplicate check
+        truck_id = await record_truck(data, new_truck)
         
         return EdgeTruckResponse(
             status="success",
-            message=f"Truck recorded successfully: {truck_type}",
-            truck_id=new_truck.id,
+            message=message,
+            truck_id=truck_id,
             timestamp=data.timestamp
         )
         
+    except IntegrityError:
+        # The same detection was recorded concurrently
+        await db.rollback()
+        recorded = await find_recorded_detections(db, [(data.id, data.timestamp)])
+        return EdgeTruckResponse(
+            status="duplicate",
+            message="Detection already recorded",
+            truck_id=recorded.get((data.id, data.timestamp), 0),
+            timestamp=data.timestamp
+        )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error processing truck data: {str(e)}"
         )
 
 
+async def read_batch_items(request: Request) -> List[Any]:
+    """Read a batch body: a JSON array (or {"items": [...]}) or NDJSON, one detection per line"""
+    content_type = request.headers.get("content-type", "")
+    
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = []
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            items.extend(_parse_ndjson_line(line) for line in lines if line.strip())
+            if len(items) > MAX_BATCH_SIZE:
+                break
+        if buffer.strip():
+            items.append(_parse_ndjson_line(buffer))
+        return items
+    
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if isinstance(payload, dict):
+        payload = payload.get("items")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    return payload
 
 
+def _parse_ndjson_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        # Reported as an invalid item rather than failing the whole batch
+        return {"__error__": f"Invalid JSON: {e}"}
 
 
+@router.post("/truck-count/batch", response_model=EdgeBatchResponse)
+async def receive_truck_batch_from_edge(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Receive many truck detections from an edge computer in one request,
+    e.g. when replaying detections buffered during an outage.
+    This endpoint does NOT require authentication.
+    
+    The body is a JSON array of truck-count payloads, or NDJSON with
+    Content-Type: application/x-ndjson. All new trucks are inserted in one
+    transaction and daily statistics are updated once per affected date.
+    Detections already recorded (same id and timestamp) are reported as
+    "duplicate", so a batch can safely be sent again.
+    
+    Example usage:
+    ```bash
+    curl -X POST http://localhost:8095/api/truck-count/batch \
+      -H "Content-Type: application/x-ndjson" \
+      --data-binary @detections.ndjson
+    ```
+    """
+    items = await read_batch_items(request)
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_SIZE} detections")
+    
+    results: List[EdgeBatchItemResult] = []
+    pending: List[Tuple[EdgeBatchItemResult, EdgeTruckData, Truck]] = []
+    first_seen: Dict[Tuple[int, str], EdgeBatchItemResult] = {}
+    repeated: List[Tuple[EdgeBatchItemResult, EdgeBatchItemResult]] = []
+    
+    # Validate and convert every item before touching the database
+    for index, item in enumerate(items):
+        if isinstance(item, dict) and "__error__" in item:
+            results.append(EdgeBatchItemResult(index=index, status="invalid", message=item["__error__"]))
+            continue
+        try:
+            data = EdgeTruckData.model_validate(item)
+        except ValidationError as e:
+            results.append(EdgeBatchItemResult(
+                index=index, status="invalid", message=str(e.errors()[0].get("msg", e))
+            ))
+            continue
+        
+        result = EdgeBatchItemResult(index=index, id=data.id, timestamp=data.timestamp, status="success", message="")
+        results.append(result)
+        
+        truck, message = build_truck(data)
+        result.message = message
+        if truck is None:
+            result.status = "skipped"
+            continue
+        
+        key = (data.id, data.timestamp)
+        if key in first_seen:
+            result.status = "duplicate"
+            result.message = "Duplicate detection in batch"
+            repeated.append((result, first_seen[key]))
+            continue
+        first_seen[key] = result
+        pending.append((result, data, truck))
+    
+    try:
+        # Drop detections that were recorded by an earlier submission
+        recorded = await find_recorded_detections(db, [(data.id, data.timestamp) for _, data, _ in pending])
+        new_items = []
+        for result, data, truck in pending:
+            truck_id = recorded.get((data.id, data.timestamp))
+            if truck_id is not None:
+                result.status = "duplicate"
+                result.message = "Detection already recorded"
+                result.truck_id = truck_id
+            else:
+                new_items.append((result, data, truck))
+        
+        if new_items:
+            async with write_lock():
+                truck_ids, events = await run_in_threadpool(
+                    record_trucks, [(data.id, data.timestamp, truck) for _, data, truck in new_items]
+                )
+            for (result, _, _), truck_id in zip(new_items, truck_ids):
+                result.truck_id = truck_id
+            live_hub.publish_many(events)
+        
+        for result, first in repeated:
+            result.truck_id = first.truck_id
+        
+    except IntegrityError:
+        # Part of this batch was recorded concurrently; nothing was written, so a retry is safe
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Detections in this batch were recorded concurrently, retry the batch")
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing truck batch: {str(e)}"
+        )
+    
+    counts = {status: 0 for status in ("success", "duplicate", "skipped", "invalid")}
+    for result in results:
+        counts[result.status] += 1
+    
+    return EdgeBatchResponse(
+        status="success",
+        received=len(items),
+        inserted=counts["success"],
+        duplicates=counts["duplicate"],
+        skipped=counts["skipped"],
+        invalid=counts["invalid"],
+        results=results
+    )
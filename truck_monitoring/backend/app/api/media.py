@@ -4,56 +4,26 @@ Allows uploading images and videos for truck records
 """
 
 from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-import os
 from pathlib import Path
-import uuid
-from datetime import datetime
 
-from ..database import get_db
+from ..database import get_async_db, write_lock
 from ..models import Truck
+from ..media_storage import (
+    UPLOAD_DIRS, media_lock, receive_upload, store_upload, discard_upload,
+    schedule_thumbnail, is_media_referenced
+)
 
 router = APIRouter(prefix="/api/media", tags=["Media Upload"])
 
-# Create uploads directory structure
-UPLOAD_BASE = Path(__file__).parent.parent.parent / "uploads"
-UPLOAD_DIRS = {
-    "images": UPLOAD_BASE / "images",
-    "videos": UPLOAD_BASE / "videos",
-    "thumbnails": UPLOAD_BASE / "thumbnails"
-}
-
-# Create directories if they don't exist
-for directory in UPLOAD_DIRS.values():
-    directory.mkdir(parents=True, exist_ok=True)
-
-
-def save_file(file: UploadFile, file_type: str, truck_id: int) -> str:
-    """Save uploaded file and return the filename"""
-    # Get file extension
-    ext = Path(file.filename).suffix if file.filename else ""
-    
-    # Generate unique filename: truckID_timestamp_uuid.ext
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_id = str(uuid.uuid4())[:8]
-    filename = f"truck_{truck_id}_{timestamp}_{unique_id}{ext}"
-    
-    # Save file
-    file_path = UPLOAD_DIRS[file_type] / filename
-    with open(file_path, "wb") as buffer:
-        content = file.file.read()
-        buffer.write(content)
-    
-    return filename
-
 
 @router.post("/upload")
 async def upload_truck_media(
     truck_id: int = Form(...),
     image: Optional[UploadFile] = File(None),
     video: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload image and/or video for a truck record.
@@ -63,6 +33,11 @@ async def upload_truck_media(
     - `image`: Image file (JPG, PNG, etc.)
     - `video`: Video file (MP4, AVI, etc.) - optional
     
+    Files are streamed to disk in chunks and stored under their SHA-256
+    checksum, so re-uploading the same file does not store it twice.
+    Image thumbnails are generated in the background; until one is ready,
+    `thumbnail_url` points at the full image.
+    
     **Returns:**
     - Updated truck record with file paths
     
@@ -91,38 +66,60 @@ async def upload_truck_media(
     requests.post("http://localhost:8095/api/media/upload", files=files, data=data)
     ```
     """
+    received = []
     try:
         # Get truck record
-        truck = db.query(Truck).filter(Truck.id == truck_id).first()
+        truck = await db.get(Truck, truck_id)
         if not truck:
             raise HTTPException(status_code=404, detail=f"Truck ID {truck_id} not found")
         
         uploaded_files = {}
+        checksums = {}
+        thumbnail_status = None
         
-        # Process image
-        if image and image.filename:
-            image_filename = save_file(image, "images", truck_id)
-            truck.image_url = f"/uploads/images/{image_filename}"
-            uploaded_files['image'] = image_filename
-            
-            # Also create a thumbnail copy (in production, you'd resize it)
-            truck.thumbnail_url = f"/uploads/thumbnails/{image_filename}"
+        # Stream files to disk first, outside the media lock
+        for label, file_type, column, upload in (
+            ("image", "images", "image_url", image),
+            ("video", "videos", "video_url", video),
+        ):
+            if upload and upload.filename:
+                temp_path, filename, checksum, size = await receive_upload(upload, file_type)
+                received.append((temp_path, file_type, filename))
+                setattr(truck, column, f"/uploads/{file_type}/{filename}")
+                uploaded_files[label] = filename
+                checksums[label] = {"sha256": checksum, "size": size}
         
-        # Process video
-        if video and video.filename:
-            video_filename = save_file(video, "videos", truck_id)
-            truck.video_url = f"/uploads/videos/{video_filename}"
-            uploaded_files['video'] = video_filename
+        # Full image until the background thumbnail is ready
+        if 'image' in uploaded_files:
+            truck.thumbnail_url = truck.image_url
+        
+        # Put files in place and commit their references together, so a
+        # concurrent delete cannot remove a stored file this truck now shares
+        async with media_lock:
+            for temp_path, file_type, filename in received:
+                await store_upload(temp_path, file_type, filename)
+            async with write_lock():
+                await db.commit()
+            
+            if 'image' in uploaded_files:
+                thumbnail_url = schedule_thumbnail(truck_id, uploaded_files['image'])
+                if thumbnail_url:
+                    truck.thumbnail_url = thumbnail_url
+                    async with write_lock():
+                        await db.commit()
+                    thumbnail_status = "ready"
+                else:
+                    thumbnail_status = "pending"
         
-        # Update database
-        db.commit()
-        db.refresh(truck)
+        await db.refresh(truck)
         
         return {
             "status": "success",
             "message": "Media uploaded successfully",
             "truck_id": truck_id,
             "uploaded_files": uploaded_files,
+            "checksums": checksums,
+            "thumbnail_status": thumbnail_status,
             "truck": {
                 "id": truck.id,
                 "truck_number": truck.truck_number,
@@ -132,9 +129,15 @@ async def upload_truck_media(
             }
         }
         
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error uploading media: {str(e)}")
+    finally:
+        for temp_path, _, _ in received:
+            await discard_upload(temp_path)
 
 
 @router.get("/uploads/{file_type}/{filename}")
@@ -162,7 +165,7 @@ async def get_media_file(file_type: str, filename: str):
 @router.delete("/truck/{truck_id}/media")
 async def delete_truck_media(
     truck_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Delete all media files associated with a truck record
@@ -171,41 +174,37 @@ async def delete_truck_media(
     - `truck_id`: The truck ID
     """
     try:
-        truck = db.query(Truck).filter(Truck.id == truck_id).first()
+        truck = await db.get(Truck, truck_id)
         if not truck:
             raise HTTPException(status_code=404, detail=f"Truck ID {truck_id} not found")
         
         deleted_files = []
         
-        # Delete image
-        if truck.image_url:
-            filename = Path(truck.image_url).name
-            image_path = UPLOAD_DIRS["images"] / filename
-            if image_path.exists():
-                image_path.unlink()
-                deleted_files.append(f"image: {filename}")
-        
-        # Delete video
-        if truck.video_url:
-            filename = Path(truck.video_url).name
-            video_path = UPLOAD_DIRS["videos"] / filename
-            if video_path.exists():
-                video_path.unlink()
-                deleted_files.append(f"video: {filename}")
-        
-        # Delete thumbnail
-        if truck.thumbnail_url:
-            filename = Path(truck.thumbnail_url).name
-            thumb_path = UPLOAD_DIRS["thumbnails"] / filename
-            if thumb_path.exists():
-                thumb_path.unlink()
-                deleted_files.append(f"thumbnail: {filename}")
-        
-        # Update database
-        truck.image_url = None
-        truck.video_url = None
-        truck.thumbnail_url = None
-        db.commit()
+        # Files are deduplicated by checksum, so keep those other trucks still
+        # use; checked, unlinked and committed under the lock uploads store under
+        async with media_lock:
+            for label, file_type, column in (
+                ("image", "images", Truck.image_url),
+                ("video", "videos", Truck.video_url),
+                ("thumbnail", "thumbnails", Truck.thumbnail_url),
+            ):
+                url = getattr(truck, column.key)
+                if not url or not url.startswith(f"/uploads/{file_type}/"):
+                    continue
+                filename = Path(url).name
+                if await is_media_referenced(db, file_type, filename, truck_id):
+                    continue
+                file_path = UPLOAD_DIRS[file_type] / filename
+                if file_path.exists():
+                    file_path.unlink()
+                    deleted_files.append(f"{label}: {filename}")
+            
+            # Update database
+            truck.image_url = None
+            truck.video_url = None
+            truck.thumbnail_url = None
+            async with write_lock():
+                await db.commit()
         
         return {
             "status": "success",
@@ -214,8 +213,10 @@ async def delete_truck_media(
             "deleted_files": deleted_files
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error deleting media: {str(e)}")
 
 
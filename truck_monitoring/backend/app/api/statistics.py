@@ -2,20 +2,34 @@
 Statistics API routes
 """
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Dict, Any
+import os
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from typing import List, Dict, Any, Tuple
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, timedelta
 
-from ..database import get_db
+from ..database import get_async_db
 from ..auth import get_current_active_user
-from ..models import Truck, DailyStatistics, User
+from ..models import DailyStatistics, HourlyTruckRollup, StatisticsSummary, TruckTypeStatistics, User
+from ..statistics_rollup import SUMMARY_ID, UNKNOWN_DIMENSION
 
 router = APIRouter(prefix="/api/statistics", tags=["Statistics"])
 
+# Dashboard responses are reused for this long; every operator screen polls the endpoint
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "5"))
+
+# today (YYYY-MM-DD) -> (monotonic time computed, dashboard)
+_dashboard_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+# Range queries: widest window overall, and for hour-by-hour buckets
+MAX_RANGE_DAYS = 3660
+MAX_HOURLY_RANGE_DAYS = 366
+
 
 class DailyStatsResponse(BaseModel):
     date: str
@@ -44,51 +58,84 @@ class TruckTypeStats(BaseModel):
     percentage: float
 
 
+class RangeBucketStats(BaseModel):
+    bucket: str
+    direction: Optional[str] = None
+    truck_type: Optional[str] = None
+    count: int
+    avg_length: Optional[float]
+    avg_speed: Optional[float]
+
+
+class RangeStatsResponse(BaseModel):
+    start_date: str
+    end_date: str
+    bucket: str
+    group_by: Optional[str]
+    total_trucks: int
+    buckets: List[RangeBucketStats]
+
+
 @router.get("/daily", response_model=List[DailyStatsResponse])
 async def get_daily_statistics(
     days: int = Query(7, ge=1, le=90),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get daily statistics for the last N days"""
-    stats = db.query(DailyStatistics)\
-             .order_by(DailyStatistics.date.desc())\
-             .limit(days)\
-             .all()
-    return list(reversed(stats))
+    stats = await db.scalars(
+        select(DailyStatistics)
+        .order_by(DailyStatistics.date.desc())
+        .limit(days)
+    )
+    return list(reversed(stats.all()))
 
 
 @router.get("/dashboard")
 async def get_dashboard_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ) -> Dict[str, Any]:
-    """Get dashboard statistics"""
-    today = datetime.now().strftime("%Y-%m-%d")
-    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    """
+    Get dashboard statistics
     
-    # Today's stats
-    today_count = db.query(func.count(Truck.id))\
-                    .filter(Truck.date == today)\
-                    .scalar() or 0
+    Served from the statistics rollups (single-row lookups plus one row per
+    truck type), and cached for DASHBOARD_CACHE_TTL_SECONDS per day.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
     
-    # Yesterday's stats
-    yesterday_count = db.query(func.count(Truck.id))\
-                        .filter(Truck.date == yesterday)\
-                        .scalar() or 0
+    cached = _dashboard_cache.get(today)
+    if cached and time.monotonic() - cached[0] < DASHBOARD_CACHE_TTL_SECONDS:
+        computed_at, dashboard = cached
+    else:
+        computed_at, dashboard = time.monotonic(), await compute_dashboard_stats(db, today)
+        # Entries for previous days are never read again
+        _dashboard_cache.clear()
+        _dashboard_cache[today] = (computed_at, dashboard)
     
-    # Total trucks
-    total_trucks = db.query(func.count(Truck.id)).scalar() or 0
+    return {
+        **dashboard,
+        "cache_age_seconds": round(time.monotonic() - computed_at, 3)
+    }
+
+
+async def compute_dashboard_stats(db: AsyncSession, today: str) -> Dict[str, Any]:
+    """Dashboard numbers for ``today`` from DailyStatistics and the all-time summary"""
+    yesterday = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
     
-    # Average length
-    avg_length = db.query(func.avg(Truck.length_meters))\
-                   .filter(Truck.length_meters.isnot(None))\
-                   .scalar() or 0.0
+    # Today's and yesterday's stats
+    day_counts = dict((await db.execute(
+        select(DailyStatistics.date, DailyStatistics.total_trucks)
+        .where(DailyStatistics.date.in_([today, yesterday]))
+    )).all())
+    today_count = day_counts.get(today) or 0
+    yesterday_count = day_counts.get(yesterday) or 0
     
-    # Average speed
-    avg_speed = db.query(func.avg(Truck.speed_kmh))\
-                  .filter(Truck.speed_kmh.isnot(None))\
-                  .scalar() or 0.0
+    # Total trucks and averages
+    summary = await db.get(StatisticsSummary, SUMMARY_ID)
+    total_trucks = summary.total_trucks if summary else 0
+    avg_length = summary.length_sum / summary.length_count if summary and summary.length_count else 0.0
+    avg_speed = summary.speed_sum / summary.speed_count if summary and summary.speed_count else 0.0
     
     # Percentage change
     if yesterday_count > 0:
@@ -96,24 +143,6 @@ async def get_dashboard_stats(
     else:
         percentage_change = 100 if today_count > 0 else 0
     
-    # Truck types distribution
-    type_stats = db.query(
-        Truck.truck_type,
-        func.count(Truck.id).label('count')
-    ).filter(Truck.truck_type.isnot(None))\
-     .group_by(Truck.truck_type)\
-     .all()
-    
-    truck_types = []
-    total_typed = sum(stat.count for stat in type_stats)
-    for stat in type_stats:
-        percentage = (stat.count / total_typed * 100) if total_typed > 0 else 0
-        truck_types.append({
-            "truck_type": stat.truck_type,
-            "count": stat.count,
-            "percentage": round(percentage, 1)
-        })
-    
     return {
         "today_count": today_count,
         "yesterday_count": yesterday_count,
@@ -121,24 +150,55 @@ async def get_dashboard_stats(
         "percentage_change": round(percentage_change, 1),
         "avg_length_meters": round(avg_length, 2),
         "avg_speed_kmh": round(avg_speed, 2),
-        "truck_types": truck_types
+        "truck_types": [stat.model_dump() for stat in await truck_type_distribution(db)],
+        "generated_at": datetime.now().isoformat()
     }
 
 
+async def truck_type_distribution(
+    db: AsyncSession,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> List[TruckTypeStats]:
+    """Truck count and share per type between two dates (inclusive), all time by default"""
+    if not start_date and not end_date:
+        # All time: one small row per type, kept current on ingest
+        results = [
+            (result.truck_type, result.truck_count) for result in await db.scalars(
+                select(TruckTypeStatistics)
+                .where(TruckTypeStatistics.truck_count > 0)
+                .order_by(TruckTypeStatistics.truck_type)
+            )
+        ]
+    else:
+        results = [
+            (result.truck_type, result.count)
+            for result in await rollup_totals(db, start_date, end_date, [HourlyTruckRollup.truck_type])
+            if result.truck_type != UNKNOWN_DIMENSION
+        ]
+    total = sum(count for _, count in results)
+    
+    return [
+        TruckTypeStats(
+            truck_type=truck_type,
+            count=count,
+            percentage=round((count / total * 100), 1) if total > 0 else 0
+        )
+        for truck_type, count in results
+    ]
+
+
 @router.get("/hourly/{date}")
 async def get_hourly_distribution(
     date: str,
-    db: Session = Depends(get_db),
+    direction: Optional[str] = None,
+    truck_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ) -> List[HourlyStats]:
     """Get hourly distribution of trucks for a specific date"""
-    results = db.query(
-        func.hour(Truck.pass_time).label('hour'),
-        func.count(Truck.id).label('count')
-    ).filter(Truck.date == date)\
-     .group_by(func.hour(Truck.pass_time))\
-     .order_by('hour')\
-     .all()
+    parse_date(date)
+    results = await rollup_totals(db, date, date, [HourlyTruckRollup.hour], direction, truck_type)
     
     return [
         {"hour": result.hour, "count": result.count}
@@ -148,18 +208,12 @@ async def get_hourly_distribution(
 
 @router.get("/weekly")
 async def get_weekly_trend(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ) -> List[Dict[str, Any]]:
     """Get weekly trend (last 7 days)"""
-    results = db.query(
-        Truck.date,
-        func.count(Truck.id).label('count')
-    ).filter(
-        Truck.date >= (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
-    ).group_by(Truck.date)\
-     .order_by(Truck.date)\
-     .all()
+    start = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
+    results = await rollup_totals(db, start, None, [HourlyTruckRollup.date])
     
     return [
         {"date": result.date, "count": result.count}
@@ -169,25 +223,144 @@ async def get_weekly_trend(
 
 @router.get("/types")
 async def get_truck_types_stats(
-    db: Session = Depends(get_db),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ) -> List[TruckTypeStats]:
-    """Get statistics by truck type"""
-    results = db.query(
-        Truck.truck_type,
-        func.count(Truck.id).label('count')
-    ).filter(Truck.truck_type.isnot(None))\
-     .group_by(Truck.truck_type)\
-     .all()
+    """Get statistics by truck type, all time or for a date range (YYYY-MM-DD, inclusive)"""
+    for value in (start_date, end_date):
+        if value:
+            parse_date(value)
+    return await truck_type_distribution(db, start_date, end_date)
+
+
+@router.get("/range", response_model=RangeStatsResponse)
+async def get_range_statistics(
+    start_date: Optional[str] = Query(None, description="First day (YYYY-MM-DD); defaults to `days` before end_date"),
+    end_date: Optional[str] = Query(None, description="Last day (YYYY-MM-DD), inclusive; defaults to today"),
+    days: int = Query(7, ge=1, le=MAX_RANGE_DAYS),
+    bucket: str = Query("day", pattern="^(hour|day|week|month|hour_of_day)$"),
+    group_by: Optional[str] = Query(None, pattern="^(direction|truck_type)$"),
+    direction: Optional[str] = None,
+    truck_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Truck counts and averages over an arbitrary date window
     
-    total = sum(result.count for result in results)
+    Buckets are ``hour`` (each hour of each day), ``day``, ``week`` (starting
+    Monday), ``month`` or ``hour_of_day`` (0-23 summed over the window), and can
+    be split by direction or truck type. Served from the hourly rollups, so
+    the cost depends on the window, not on the size of the trucks table.
+    """
+    end = parse_date(end_date) if end_date else datetime.now()
+    start = parse_date(start_date) if start_date else end - timedelta(days=days - 1)
+    span = (end - start).days + 1
+    if span < 1:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    max_days = MAX_HOURLY_RANGE_DAYS if bucket == "hour" else MAX_RANGE_DAYS
+    if span > max_days:
+        raise HTTPException(status_code=400, detail=f"Range too long for {bucket} buckets (max {max_days} days)")
     
-    return [
-        TruckTypeStats(
-            truck_type=result.truck_type,
-            count=result.count,
-            percentage=round((result.count / total * 100), 1) if total > 0 else 0
-        )
-        for result in results
-    ]
+    start_str, end_str = start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+    group_column = getattr(HourlyTruckRollup, group_by) if group_by else None
+    
+    # Day-level rows are folded into weeks/months here; the rest is grouped in SQL
+    if bucket == "hour":
+        keys = [HourlyTruckRollup.date, HourlyTruckRollup.hour]
+    elif bucket == "hour_of_day":
+        keys = [HourlyTruckRollup.hour]
+    else:
+        keys = [HourlyTruckRollup.date]
+    if group_column is not None:
+        keys.append(group_column)
+    
+    folded: Dict[Tuple, List[float]] = {}
+    for row in await rollup_totals(db, start_str, end_str, keys, direction, truck_type):
+        label = _bucket_label(bucket, row)
+        group = getattr(row, group_by) if group_by else None
+        totals = folded.setdefault((label, group), [0, 0.0, 0, 0.0, 0])
+        for i, value in enumerate((row.count, row.length_sum, row.length_count, row.speed_sum, row.speed_count)):
+            totals[i] += value or 0
+    
+    buckets = []
+    for (label, group), (count, length_sum, length_count, speed_sum, speed_count) in folded.items():
+        group = group or None  # UNKNOWN_DIMENSION
+        buckets.append({
+            "bucket": label,
+            "direction": group if group_by == "direction" else direction,
+            "truck_type": group if group_by == "truck_type" else truck_type,
+            "count": count,
+            "avg_length": round(length_sum / length_count, 2) if length_count else None,
+            "avg_speed": round(speed_sum / speed_count, 2) if speed_count else None,
+        })
+    
+    return {
+        "start_date": start_str,
+        "end_date": end_str,
+        "bucket": bucket,
+        "group_by": group_by,
+        "total_trucks": sum(item["count"] for item in buckets),
+        "buckets": buckets
+    }
+
+
+def parse_date(value: str) -> datetime:
+    """Parse a YYYY-MM-DD query value"""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+async def rollup_totals(
+    db: AsyncSession,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    keys: List[Any],
+    direction: Optional[str] = None,
+    truck_type: Optional[str] = None
+):
+    """
+    Sum HourlyTruckRollup rows between two dates (inclusive), grouped and ordered by ``keys``
+    
+    Rows carry count, length_sum, length_count, speed_sum and speed_count.
+    """
+    rollup = HourlyTruckRollup
+    query = select(
+        *keys,
+        func.sum(rollup.truck_count).label("count"),
+        func.sum(rollup.length_sum).label("length_sum"),
+        func.sum(rollup.length_count).label("length_count"),
+        func.sum(rollup.speed_sum).label("speed_sum"),
+        func.sum(rollup.speed_count).label("speed_count"),
+    )
+    if start_date:
+        query = query.where(rollup.date >= start_date)
+    if end_date:
+        query = query.where(rollup.date <= end_date)
+    if direction:
+        query = query.where(rollup.direction == direction)
+    if truck_type:
+        query = query.where(rollup.truck_type == truck_type)
+    result = await db.execute(
+        query.group_by(*keys)
+             .having(func.sum(rollup.truck_count) > 0)
+             .order_by(*keys)
+    )
+    return result.all()
+
 
+def _bucket_label(bucket: str, row) -> str:
+    if bucket == "hour":
+        return f"{row.date}T{row.hour:02d}:00"
+    if bucket == "hour_of_day":
+        return str(row.hour)
+    if bucket == "week":
+        day = datetime.strptime(row.date, "%Y-%m-%d")
+        return (day - timedelta(days=day.weekday())).strftime("%Y-%m-%d")
+    if bucket == "month":
+        return row.date[:7]
+    return row.date
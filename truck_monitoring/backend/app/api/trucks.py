@@ -2,16 +2,23 @@
 Truck management API routes
 """
 
+import base64
+import binascii
+
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, func, desc, and_, or_
+from typing import List, Optional, Tuple
 from pydantic import BaseModel
 from datetime import datetime
 
-from ..database import get_db
+from ..database import get_async_db
 from ..auth import get_current_active_user
-from ..models import Truck, User
+from ..models import Truck, User, DailyStatistics
+from ..plate_index import normalize_plate, candidate_truck_ids
+from ..statistics_rollup import TYPE_COUNTERS
+from ..truck_archive import archive_available, read_archived_trucks
 
 router = APIRouter(prefix="/api/trucks", tags=["Trucks"])
 
@@ -42,9 +49,42 @@ class TruckResponse(BaseModel):
 
 class TruckListResponse(BaseModel):
     trucks: List[TruckResponse]
-    total: int
+    total: Optional[int]
+    total_is_estimate: bool = False
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(truck: Truck) -> str:
+    """Opaque cursor pointing just past ``truck`` in (pass_time, id) descending order"""
+    raw = f"{truck.pass_time.isoformat()}|{truck.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parse a cursor from encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        pass_time, truck_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(pass_time), int(truck_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def estimate_total(db: AsyncSession, date: Optional[str], truck_type: Optional[str]) -> Optional[int]:
+    """
+    Truck count from the daily statistics rollups instead of counting rows
+
+    Returns None when the filters can't be answered from the rollups.
+    """
+    if truck_type and truck_type not in TYPE_COUNTERS:
+        return None
+    column = getattr(DailyStatistics, TYPE_COUNTERS[truck_type]) if truck_type else DailyStatistics.total_trucks
+    query = select(func.coalesce(func.sum(column), 0))
+    if date:
+        query = query.where(DailyStatistics.date == date)
+    return await db.scalar(query)
 
 
 @router.get("/", response_model=TruckListResponse)
@@ -53,45 +93,98 @@ async def list_trucks(
     page_size: int = Query(20, ge=1, le=100),
     date: Optional[str] = None,
     truck_type: Optional[str] = None,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page; takes precedence over page"),
+    count: str = Query("exact", pattern="^(exact|estimate|none)$",
+                       description="exact: COUNT(*), estimate: from daily statistics, none: skip the total"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     List all trucks with pagination and filters
+    
+    Pass the returned ``next_cursor`` back as ``cursor`` to fetch the next page;
+    cursor pages seek on the (pass_time, id) index, so deep pages cost the same
+    as the first one. ``page`` (OFFSET) paging is kept for compatibility.
     """
-    query = db.query(Truck)
+    query = select(Truck)
     
     # Apply filters
     if date:
-        query = query.filter(Truck.date == date)
+        query = query.where(Truck.date == date)
     if truck_type:
-        query = query.filter(Truck.truck_type == truck_type)
+        query = query.where(Truck.truck_type == truck_type)
     
     # Get total count
-    total = query.count()
+    total = None
+    total_is_estimate = False
+    if count == "estimate":
+        total = await estimate_total(db, date, truck_type)
+        total_is_estimate = total is not None
+    if count == "exact" or (count == "estimate" and total is None):
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
     
     # Apply pagination
-    trucks = query.order_by(desc(Truck.pass_time))\
-                  .offset((page - 1) * page_size)\
-                  .limit(page_size)\
-                  .all()
+    query = query.order_by(desc(Truck.pass_time), desc(Truck.id))
+    if cursor:
+        pass_time, truck_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Truck.pass_time < pass_time,
+            and_(Truck.pass_time == pass_time, Truck.id < truck_id)
+        ))
+    else:
+        query = query.offset((page - 1) * page_size)
+    
+    # One extra row tells whether there is a next page
+    trucks = (await db.scalars(query.limit(page_size + 1))).all()
+    has_more = len(trucks) > page_size
+    trucks = trucks[:page_size]
     
     return {
         "trucks": trucks,
         "total": total,
+        "total_is_estimate": total_is_estimate,
         "page": page,
-        "page_size": page_size
+        "page_size": page_size,
+        "next_cursor": encode_cursor(trucks[-1]) if has_more else None
     }
 
 
+@router.get("/archive", response_model=List[TruckResponse])
+async def list_archived_trucks(
+    start_date: str,
+    end_date: Optional[str] = None,
+    truck_type: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Trucks from archived months (YYYY-MM-DD range, inclusive), most recent first
+    
+    Months older than the retention window live in Parquet files rather than
+    the trucks table; only the files overlapping the range are read.
+    """
+    end_date = end_date or start_date
+    for value in (start_date, end_date):
+        try:
+            datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid date '{value}', expected YYYY-MM-DD")
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    if not archive_available():
+        raise HTTPException(status_code=503, detail="Reading truck archives needs pyarrow")
+    
+    return await run_in_threadpool(read_archived_trucks, start_date, end_date, truck_type, limit)
+
+
 @router.get("/{truck_id}", response_model=TruckResponse)
 async def get_truck(
     truck_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get truck details by ID"""
-    truck = db.query(Truck).filter(Truck.id == truck_id).first()
+    truck = await db.get(Truck, truck_id)
     if not truck:
         raise HTTPException(status_code=404, detail="Truck not found")
     return truck
@@ -100,29 +193,41 @@ async def get_truck(
 @router.get("/search/by-plate/{license_plate}", response_model=List[TruckResponse])
 async def search_by_plate(
     license_plate: str,
-    db: Session = Depends(get_db),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Search trucks by license plate"""
-    trucks = db.query(Truck)\
-              .filter(Truck.license_plate.like(f"%{license_plate}%"))\
-              .order_by(desc(Truck.pass_time))\
-              .all()
-    return trucks
+    """Search trucks by license plate (case-insensitive substring), most recent first"""
+    plate = normalize_plate(license_plate)
+    query = select(Truck)
+    
+    # The trigram index narrows the candidates; LIKE confirms the substring match
+    candidates = candidate_truck_ids(plate)
+    if candidates is not None:
+        query = query.where(Truck.id.in_(candidates))
+    
+    pattern = plate.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    trucks = await db.scalars(
+        query.where(func.upper(Truck.license_plate).like(f"%{pattern}%", escape="\\"))
+             .order_by(desc(Truck.pass_time))
+             .limit(limit)
+    )
+    return trucks.all()
 
 
 @router.get("/search/by-date/{date}", response_model=List[TruckResponse])
 async def get_trucks_by_date(
     date: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get all trucks for a specific date (YYYY-MM-DD)"""
-    trucks = db.query(Truck)\
-              .filter(Truck.date == date)\
-              .order_by(Truck.pass_time)\
-              .all()
-    return trucks
+    trucks = await db.scalars(
+        select(Truck)
+        .where(Truck.date == date)
+        .order_by(Truck.pass_time)
+    )
+    return trucks.all()
 
 
 
@@ -2,9 +2,14 @@
 Database configuration and session management
 """
 
-from sqlalchemy import create_engine
+import asyncio
+from contextlib import asynccontextmanager
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import os
 from dotenv import load_dotenv
 
@@ -17,6 +22,30 @@ DATABASE_URL = os.getenv(
     "sqlite:///./truck_monitoring.db"
 )
 
+# Same database through an async driver, used by the API routers
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Swap the driver of a database URL for its async counterpart"""
+    scheme, rest = url.split("://", 1)
+    backend = scheme.split("+", 1)[0]
+    return f"{ASYNC_DRIVERS.get(backend, scheme)}://{rest}"
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Connection pool tuning (per engine)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
 # Create SQLAlchemy engine
 engine = create_engine(
     DATABASE_URL,
@@ -28,6 +57,41 @@ engine = create_engine(
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine; SQLite connections are cheap to keep but not to check, so no pre-ping there
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=not IS_SQLITE,
+    # Sessions already roll back on close; a second rollback is one more aiosqlite thread hop
+    pool_reset_on_return=None if IS_SQLITE else "rollback",
+    echo=False
+)
+
+# Objects stay usable after commit; async sessions can't lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers proceed while a write is in progress"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+# SQLite has a single writer; concurrent async write transactions would only
+# contend for its lock (and fail after busy_timeout), so they queue here instead
+_sqlite_write_lock = asyncio.Lock() if IS_SQLITE else None
+
 # Create Base class for models
 Base = declarative_base()
 
@@ -43,10 +107,36 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Dependency for getting an async database session
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+@asynccontextmanager
+async def write_lock():
+    """
+    Serialize write transactions on SQLite; a no-op for other databases
+    """
+    if _sqlite_write_lock is None:
+        yield
+        return
+    async with _sqlite_write_lock:
+        yield
+
+
 def init_db():
     """
     Initialize database - create all tables
+    
+    create_all skips tables that already exist, so indexes added to a model
+    later are created separately.
     """
     Base.metadata.create_all(bind=engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
     print("✅ Database tables created successfully")
 
@@ -0,0 +1,152 @@
+"""
+In-process broadcast hub for live truck events
+
+Edge ingest publishes each committed truck and the statistics delta it
+caused; dashboards subscribe over SSE or WebSocket instead of polling.
+Every subscriber has a bounded queue. Publishing never waits: a client
+whose queue is full is dropped (it gets a final "dropped" event and can
+reconnect), so a slow screen can't stall ingest.
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .models import Truck
+
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_EVENTS_QUEUE_SIZE", "100"))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_EVENTS_MAX_SUBSCRIBERS", "500"))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_EVENTS_HEARTBEAT_SECONDS", "15"))
+
+# (event type, JSON envelope); serialized once per event, not per subscriber
+Message = Tuple[str, str]
+
+TRUCK_EVENT_FIELDS = (
+    "id", "truck_number", "license_plate", "truck_type", "length_meters", "speed_kmh",
+    "location", "direction", "pass_time", "date", "image_url", "thumbnail_url",
+)
+
+
+class Subscriber:
+    """One connected client"""
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    async def next_message(self, timeout: float) -> Optional[Message]:
+        """Next message, or None when nothing arrived within ``timeout`` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class BroadcastHub:
+    """Fan-out of published events to every subscriber's bounded queue"""
+
+    def __init__(self, queue_size: int = LIVE_QUEUE_SIZE, max_subscribers: int = LIVE_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats = {"published": 0, "delivered": 0, "dropped_clients": 0}
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Bind the hub to the server's event loop (publishers may run in other threads)"""
+        self._loop = loop
+
+    def subscribe(self) -> Subscriber:
+        """Register a client; must be called on the event loop"""
+        if len(self._subscribers) >= self.max_subscribers:
+            raise RuntimeError("Too many live event subscribers")
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event_type: str, data: Dict[str, Any]):
+        """Queue an event for every subscriber without blocking"""
+        self.publish_many([(event_type, data)])
+
+    def publish_many(self, events: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Queue several events, in order, for every subscriber without blocking"""
+        messages = [
+            (event_type, json.dumps({"event": event_type, "data": data}, default=str))
+            for event_type, data in events
+        ]
+        if not messages or self._loop is None or self._loop.is_closed():
+            return
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        # Handlers running in the threadpool hand delivery over to the loop
+        if running_loop is self._loop:
+            self._deliver(messages)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, messages)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "subscribers": len(self._subscribers),
+            "queue_size": self.queue_size,
+        }
+
+    def _deliver(self, messages: List[Message]):
+        self._stats["published"] += len(messages)
+        for subscriber in list(self._subscribers):
+            try:
+                for message in messages:
+                    subscriber.queue.put_nowait(message)
+                    self._stats["delivered"] += 1
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def _drop(self, subscriber: Subscriber):
+        """Disconnect a client that fell behind; its backlog is discarded"""
+        self._subscribers.discard(subscriber)
+        subscriber.dropped = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(("dropped", json.dumps({
+            "event": "dropped",
+            "data": {"reason": "Client too slow, reconnect to resume"}
+        })))
+        self._stats["dropped_clients"] += 1
+
+
+def truck_event(truck: Truck) -> Dict[str, Any]:
+    """Payload of a "truck" event; read before commit, while the attributes are loaded"""
+    return {field: getattr(truck, field) for field in TRUCK_EVENT_FIELDS}
+
+
+def stats_event(date_str: str, delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload of a "stats" event: the change a statistics delta made to one date"""
+    return {
+        "date": date_str,
+        "total_trucks": delta["total_trucks"],
+        "by_type": delta["types"],
+        "by_hour": {str(hour): count for hour, count in sorted(delta["hours"].items())},
+        "length_sum": delta["length_sum"],
+        "length_count": delta["length_present"],
+        "speed_sum": delta["speed_sum"],
+        "speed_count": delta["speed_present"],
+    }
+
+
+def ingest_events(trucks: List[Truck], deltas: Dict[str, Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Events for newly inserted trucks and the statistics deltas they caused"""
+    events = [("truck", truck_event(truck)) for truck in trucks]
+    events.extend(("stats", stats_event(date_str, delta)) for date_str, delta in deltas.items())
+    return events
+
+
+# Global instance
+live_hub = BroadcastHub()
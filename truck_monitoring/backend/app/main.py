@@ -2,15 +2,27 @@
 Main FastAPI Application for Truck Monitoring System
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional
+import asyncio
 
-from .database import init_db
+from .database import init_db, AsyncSessionLocal, async_engine
+from .auth import get_current_active_user, get_current_user
 from .api import auth_routes, trucks, statistics, edge, media
 from .seed_data import seed_database
+from .statistics_rollup import upgrade_statistics_schema
+from .plate_index import ensure_plate_index
+from .media_storage import shutdown_thumbnail_workers
+from .truck_archive import (
+    archive_available, run_retention_job, upgrade_archive_schema,
+    TRUCK_RETENTION_MONTHS, TRUCK_ARCHIVE_INTERVAL_HOURS
+)
+from .live_events import live_hub, Subscriber, LIVE_HEARTBEAT_SECONDS
 
 
 @asynccontextmanager
@@ -19,11 +31,28 @@ async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Starting Truck Monitoring System...")
     init_db()
+    upgrade_statistics_schema()
+    upgrade_archive_schema()
     seed_database()
+    ensure_plate_index()
+    live_hub.start(asyncio.get_running_loop())
+    retention_task = None
+    if TRUCK_RETENTION_MONTHS > 0:
+        if archive_available():
+            retention_task = asyncio.create_task(
+                run_retention_job(TRUCK_RETENTION_MONTHS, TRUCK_ARCHIVE_INTERVAL_HOURS)
+            )
+            print(f"📦 Archiving trucks older than {TRUCK_RETENTION_MONTHS} months")
+        else:
+            print("⚠️  TRUCK_RETENTION_MONTHS is set but pyarrow is not installed, trucks are not archived")
     print("✅ Server ready at http://localhost:8095")
     yield
     # Shutdown
     print("👋 Shutting down...")
+    if retention_task is not None:
+        retention_task.cancel()
+    shutdown_thumbnail_workers()
+    await async_engine.dispose()
 
 
 app = FastAPI(
@@ -74,7 +103,109 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "truck-monitoring"}
+    return {"status": "healthy", "service": "truck-monitoring", "live_events": live_hub.get_stats()}
+
+
+# =============================================================================
+# LIVE EVENTS
+# =============================================================================
+
+async def authenticate_live_client(token: Optional[str]):
+    """
+    Validate the token of a live event client
+    
+    EventSource and browser WebSockets can't send an Authorization header,
+    so the token may also come as a query parameter. The session is closed
+    before streaming starts rather than held for the whole connection.
+    """
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    async with AsyncSessionLocal() as db:
+        return await get_current_active_user(await get_current_user(token=token, db=db))
+
+
+def subscribe_live_client() -> Subscriber:
+    try:
+        return live_hub.subscribe()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.get("/api/live/events")
+async def live_events_stream(request: Request, token: Optional[str] = None):
+    """
+    Server-Sent Events stream of new trucks ("truck") and statistics deltas ("stats")
+    
+    Authenticate with ``?token=`` or an Authorization header. A client that
+    falls too far behind gets a "dropped" event and should reconnect.
+    """
+    authorization = request.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    await authenticate_live_client(token)
+    subscriber = subscribe_live_client()
+    
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                message = await subscriber.next_message(LIVE_HEARTBEAT_SECONDS)
+                if message is None:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                event_type, payload = message
+                yield f"event: {event_type}\ndata: {payload}\n\n"
+                if event_type == "dropped":
+                    break
+        finally:
+            live_hub.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.websocket("/ws/live")
+async def live_events_websocket(websocket: WebSocket, token: Optional[str] = None):
+    """WebSocket variant of /api/live/events; every message is {"event": ..., "data": ...}"""
+    try:
+        await authenticate_live_client(token)
+        subscriber = subscribe_live_client()
+    except HTTPException as e:
+        await websocket.close(code=1013 if e.status_code == 503 else 1008)
+        return
+    
+    async def send_events():
+        while True:
+            message = await subscriber.next_message(LIVE_HEARTBEAT_SECONDS)
+            if message is None:
+                await websocket.send_text('{"event": "ping", "data": {}}')
+                continue
+            event_type, payload = message
+            await websocket.send_text(payload)
+            if event_type == "dropped":
+                await websocket.close(code=1013)
+                return
+    
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    
+    tasks = []
+    try:
+        await websocket.accept()
+        tasks = [asyncio.create_task(send_events()), asyncio.create_task(wait_for_disconnect())]
+        # Whichever ends first (dropped, send failure or client gone) ends the connection
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        live_hub.unsubscribe(subscriber)
 
 
 if __name__ == "__main__":
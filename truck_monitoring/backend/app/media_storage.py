@@ -0,0 +1,218 @@
+"""
+Media storage for truck images and videos
+
+Uploads are streamed to disk in chunks off the event loop, capped in size and
+stored under their SHA-256 checksum so identical files are kept once.
+Thumbnails are produced by a background thread pool.
+
+Because trucks share checksum-named files, putting an upload in place and
+deleting a file that no other truck references are each done under
+``media_lock`` together with the commit that records the change: otherwise a
+delete could remove a file an upload has just found already stored, before
+that upload's commit makes the reference visible.
+"""
+
+import asyncio
+import hashlib
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import or_, select
+from starlette.concurrency import run_in_threadpool
+
+from .database import SessionLocal
+from .models import Truck
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; thumbnails fall back to the full image
+    Image = None
+    ImageOps = None
+
+UPLOAD_BASE = Path(__file__).parent.parent / "uploads"
+UPLOAD_DIRS = {
+    "images": UPLOAD_BASE / "images",
+    "videos": UPLOAD_BASE / "videos",
+    "thumbnails": UPLOAD_BASE / "thumbnails"
+}
+
+# Size caps per media type (bytes)
+MAX_UPLOAD_BYTES = {
+    "images": int(os.getenv("MAX_IMAGE_UPLOAD_MB", "20")) * 1024 * 1024,
+    "videos": int(os.getenv("MAX_VIDEO_UPLOAD_MB", "500")) * 1024 * 1024,
+}
+
+CHUNK_SIZE = 1024 * 1024
+THUMBNAIL_SIZE = (320, 240)
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+_thumbnail_pool: Optional[ThreadPoolExecutor] = None
+
+# Serializes storing uploads and deleting unreferenced files, each with its commit
+media_lock = asyncio.Lock()
+
+for directory in UPLOAD_DIRS.values():
+    directory.mkdir(parents=True, exist_ok=True)
+
+
+async def receive_upload(file: UploadFile, file_type: str) -> Tuple[Path, str, str, int]:
+    """
+    Stream an upload to a temporary file, hashing it on the way
+
+    Returns:
+        (temporary path, checksum filename, sha256 hex digest, size in bytes);
+        pass the path to store_upload, or discard_upload on failure
+    """
+    ext = Path(file.filename).suffix.lower() if file.filename else ""
+    max_bytes = MAX_UPLOAD_BYTES[file_type]
+    temp_path = UPLOAD_DIRS[file_type] / f".upload_{uuid.uuid4().hex}.part"
+
+    digest = hashlib.sha256()
+    size = 0
+    buffer = await run_in_threadpool(open, temp_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"{file_type[:-1].capitalize()} exceeds {max_bytes // (1024 * 1024)}MB limit"
+                )
+            digest.update(chunk)
+            await run_in_threadpool(buffer.write, chunk)
+    except BaseException:
+        await run_in_threadpool(buffer.close)
+        await run_in_threadpool(_remove, temp_path)
+        raise
+    await run_in_threadpool(buffer.close)
+
+    checksum = digest.hexdigest()
+    return temp_path, f"{checksum}{ext}", checksum, size
+
+
+async def store_upload(temp_path: Path, file_type: str, filename: str):
+    """
+    Move a received upload to its checksum name, or drop it if that content is
+    already stored
+
+    Call under media_lock and commit the truck's reference before releasing it.
+    """
+    final_path = UPLOAD_DIRS[file_type] / filename
+    if final_path.exists():
+        # Same content already stored
+        await run_in_threadpool(_remove, temp_path)
+    else:
+        await run_in_threadpool(os.replace, temp_path, final_path)
+
+
+async def discard_upload(temp_path: Path):
+    """Remove a received upload's temporary file, if store_upload did not consume it"""
+    await run_in_threadpool(_remove, temp_path)
+
+
+def schedule_thumbnail(truck_id: int, image_filename: str) -> Optional[str]:
+    """
+    Return the thumbnail URL for a stored image, generating it in the background if needed
+
+    Returns:
+        The thumbnail URL when it already exists, otherwise None (the truck
+        record is updated once the worker has written it)
+    """
+    thumbnail_name = f"{Path(image_filename).stem}.jpg"
+    thumbnail_path = UPLOAD_DIRS["thumbnails"] / thumbnail_name
+    if thumbnail_path.exists():
+        return f"/uploads/thumbnails/{thumbnail_name}"
+    if Image is None:
+        return None
+
+    _get_thumbnail_pool().submit(
+        _generate_thumbnail, truck_id, UPLOAD_DIRS["images"] / image_filename, thumbnail_path
+    )
+    return None
+
+
+def shutdown_thumbnail_workers():
+    """Stop the thumbnail pool, finishing queued thumbnails"""
+    global _thumbnail_pool
+    if _thumbnail_pool is not None:
+        _thumbnail_pool.shutdown(wait=True)
+        _thumbnail_pool = None
+
+
+async def is_media_referenced(db, file_type: str, filename: str, exclude_truck_id: int) -> bool:
+    """
+    Whether another truck still uses a (deduplicated) media file
+
+    A thumbnail also counts as used by every truck showing its image, since
+    that truck's background thumbnail may point at it any moment.
+    """
+    url = f"/uploads/{file_type}/{filename}"
+    if file_type == "images":
+        condition = or_(Truck.image_url == url, Truck.thumbnail_url == url)
+    elif file_type == "thumbnails":
+        condition = or_(
+            Truck.thumbnail_url == url,
+            Truck.image_url.like(f"/uploads/images/{Path(filename).stem}%")
+        )
+    else:
+        condition = Truck.video_url == url
+
+    truck_id = await db.scalar(
+        select(Truck.id)
+        .where(condition, Truck.id != exclude_truck_id)
+        .limit(1)
+    )
+    return truck_id is not None
+
+
+def _get_thumbnail_pool() -> ThreadPoolExecutor:
+    global _thumbnail_pool
+    if _thumbnail_pool is None:
+        _thumbnail_pool = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+    return _thumbnail_pool
+
+
+def _generate_thumbnail(truck_id: int, image_path: Path, thumbnail_path: Path):
+    """Downscale an image to a JPEG thumbnail and point the truck record at it"""
+    temp_path = thumbnail_path.with_name(f".{uuid.uuid4().hex}.part")
+    try:
+        with Image.open(image_path) as image:
+            # Let JPEG decode at reduced size, much cheaper than a full decode
+            image.draft("RGB", THUMBNAIL_SIZE)
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(THUMBNAIL_SIZE)
+            image.convert("RGB").save(temp_path, "JPEG", quality=80, optimize=True)
+        os.replace(temp_path, thumbnail_path)
+    except Exception as e:
+        _remove(temp_path)
+        print(f"❌ Thumbnail generation failed for {image_path.name}: {e}")
+        return
+
+    image_url = f"/uploads/images/{image_path.name}"
+    db = SessionLocal()
+    try:
+        # Only if the truck still shows this image
+        db.query(Truck)\
+          .filter(Truck.id == truck_id, Truck.image_url == image_url)\
+          .update({Truck.thumbnail_url: f"/uploads/thumbnails/{thumbnail_path.name}"},
+                  synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Failed to record thumbnail for truck {truck_id}: {e}")
+    finally:
+        db.close()
+
+
+def _remove(path: Path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
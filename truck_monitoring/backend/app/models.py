@@ -2,7 +2,7 @@
 Database models for truck monitoring system
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -28,6 +28,12 @@ class User(Base):
 class Truck(Base):
     """Truck passing record"""
     __tablename__ = "trucks"
+    __table_args__ = (
+        # Filtered list pages (date / type) read in pass_time order straight from the index
+        Index("ix_trucks_date_type_pass_time", "date", "truck_type", "pass_time"),
+        # Keyset pagination over (pass_time, id)
+        Index("ix_trucks_pass_time_id", "pass_time", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     truck_number = Column(String(50), index=True, nullable=False)
@@ -64,6 +70,52 @@ class Truck(Base):
         return f"<Truck {self.truck_number} at {self.pass_time}>"
 
 
+class EdgeDetection(Base):
+    """Detection received from an edge computer, keyed by (edge id, timestamp) so replays are ignored"""
+    __tablename__ = "edge_detections"
+    __table_args__ = (UniqueConstraint("edge_id", "timestamp", name="uq_edge_detections_edge_id_timestamp"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    edge_id = Column(Integer, nullable=False)
+    timestamp = Column(String(64), nullable=False)  # As sent by the edge computer
+    truck_id = Column(Integer, ForeignKey("trucks.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<EdgeDetection {self.edge_id} at {self.timestamp}>"
+
+
+class TruckPlateTrigram(Base):
+    """Trigrams of a truck's license plate, the index behind substring plate search"""
+    __tablename__ = "truck_plate_trigrams"
+    __table_args__ = (Index("ix_truck_plate_trigrams_trigram_truck", "trigram", "truck_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    trigram = Column(String(3), nullable=False)
+    truck_id = Column(Integer, ForeignKey("trucks.id", ondelete="CASCADE"), nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<PlateTrigram {self.trigram} -> {self.truck_id}>"
+
+
+class TruckArchive(Base):
+    """A month of trucks moved out of the trucks table into a Parquet file"""
+    __tablename__ = "truck_archives"
+
+    id = Column(Integer, primary_key=True, index=True)
+    month = Column(String(7), unique=True, index=True, nullable=False)  # YYYY-MM
+    file_name = Column(String(255), nullable=False)  # Relative to the archive directory
+    row_count = Column(Integer, default=0, nullable=False)
+    archived_at = Column(DateTime)  # None until the month's file is first written
+    
+    # Process currently archiving this month, and when it last renewed its claim
+    claimed_by = Column(String(64))
+    claimed_at = Column(DateTime)
+    
+    def __repr__(self):
+        return f"<TruckArchive {self.month}: {self.row_count} trucks>"
+
+
 class DailyStatistics(Base):
     """Daily aggregated statistics"""
     __tablename__ = "daily_statistics"
@@ -82,6 +134,12 @@ class DailyStatistics(Base):
     tanker_count = Column(Integer, default=0)
     other_count = Column(Integer, default=0)
     
+    # Running sums behind the averages (maintained incrementally on ingest)
+    length_sum = Column(Float, default=0.0, server_default="0")
+    length_count = Column(Integer, default=0, server_default="0")
+    speed_sum = Column(Float, default=0.0, server_default="0")
+    speed_count = Column(Integer, default=0, server_default="0")
+    
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -89,6 +147,79 @@ class DailyStatistics(Base):
         return f"<DailyStats {self.date}: {self.total_trucks} trucks>"
 
 
+class HourlyStatistics(Base):
+    """Per-hour truck counts (24 buckets per day), used for the daily peak hour"""
+    __tablename__ = "hourly_statistics"
+    __table_args__ = (UniqueConstraint("date", "hour", name="uq_hourly_statistics_date_hour"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(String(10), index=True, nullable=False)  # YYYY-MM-DD
+    hour = Column(Integer, nullable=False)  # 0-23
+    truck_count = Column(Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f"<HourlyStats {self.date} {self.hour:02d}h: {self.truck_count} trucks>"
+
+
+class HourlyTruckRollup(Base):
+    """
+    Truck counts and running sums per (date, hour, direction, truck type)
+    
+    Unknown direction or truck type is stored as "" so the unique key also
+    covers them (NULLs never collide in a unique constraint).
+    """
+    __tablename__ = "hourly_truck_rollups"
+    __table_args__ = (
+        UniqueConstraint("date", "hour", "direction", "truck_type", name="uq_hourly_truck_rollups_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(String(10), nullable=False)  # YYYY-MM-DD
+    hour = Column(Integer, nullable=False)  # 0-23
+    direction = Column(String(20), nullable=False, default="")
+    truck_type = Column(String(50), nullable=False, default="")
+    truck_count = Column(Integer, default=0, nullable=False)
+    
+    # Sums and counts over non-null values, matching AVG() on the trucks table
+    length_sum = Column(Float, default=0.0, nullable=False)
+    length_count = Column(Integer, default=0, nullable=False)
+    speed_sum = Column(Float, default=0.0, nullable=False)
+    speed_count = Column(Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f"<HourlyRollup {self.date} {self.hour:02d}h {self.direction}/{self.truck_type}: {self.truck_count}>"
+
+
+class StatisticsSummary(Base):
+    """All-time totals behind the dashboard (a single row), maintained on ingest"""
+    __tablename__ = "statistics_summary"
+
+    id = Column(Integer, primary_key=True, index=True)
+    total_trucks = Column(Integer, default=0, nullable=False)
+    
+    # Sums and counts over non-null values, matching AVG() on the trucks table
+    length_sum = Column(Float, default=0.0, nullable=False)
+    length_count = Column(Integer, default=0, nullable=False)
+    speed_sum = Column(Float, default=0.0, nullable=False)
+    speed_count = Column(Integer, default=0, nullable=False)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<StatisticsSummary {self.total_trucks} trucks>"
+
+
+class TruckTypeStatistics(Base):
+    """All-time truck count per truck type"""
+    __tablename__ = "truck_type_statistics"
+
+    id = Column(Integer, primary_key=True, index=True)
+    truck_type = Column(String(50), unique=True, index=True, nullable=False)
+    truck_count = Column(Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f"<TruckTypeStats {self.truck_type}: {self.truck_count} trucks>"
+
 
 
 
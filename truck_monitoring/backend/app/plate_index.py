@@ -0,0 +1,119 @@
+"""
+Trigram index for license plate substring search
+
+Every truck's plate is split into overlapping 3-character grams stored in
+truck_plate_trigrams. A substring query only has to look at trucks that
+contain all of the query's trigrams, instead of scanning every plate with
+``LIKE '%...%'``. The index is kept in sync by mapper events, so any code
+path that adds, edits or deletes trucks through the ORM maintains it.
+"""
+
+from typing import List, Optional, Set
+
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import Truck, TruckPlateTrigram
+
+TRIGRAM_LENGTH = 3
+BACKFILL_BATCH_SIZE = 1000
+
+
+def normalize_plate(plate: str) -> str:
+    """Plates are matched case-insensitively"""
+    return plate.strip().upper()
+
+
+def plate_trigrams(plate: Optional[str]) -> Set[str]:
+    """Distinct trigrams of a plate"""
+    if not plate:
+        return set()
+    plate = normalize_plate(plate)
+    return {plate[i:i + TRIGRAM_LENGTH] for i in range(len(plate) - TRIGRAM_LENGTH + 1)}
+
+
+def candidate_truck_ids(query: str):
+    """
+    Subquery of truck ids whose plates contain every trigram of ``query``
+
+    Returns None when the query is too short to have trigrams.
+    """
+    grams = plate_trigrams(query)
+    if not grams:
+        return None
+    return select(TruckPlateTrigram.truck_id)\
+        .where(TruckPlateTrigram.trigram.in_(grams))\
+        .group_by(TruckPlateTrigram.truck_id)\
+        .having(func.count(func.distinct(TruckPlateTrigram.trigram)) == len(grams))
+
+
+def rebuild_plate_index(db: Session) -> int:
+    """Recompute the whole trigram index from the trucks table; the caller commits"""
+    db.execute(delete(TruckPlateTrigram))
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = db.query(Truck.id, Truck.license_plate)\
+                 .filter(Truck.id > last_id, Truck.license_plate.isnot(None))\
+                 .order_by(Truck.id)\
+                 .limit(BACKFILL_BATCH_SIZE)\
+                 .all()
+        if not rows:
+            break
+        values = [
+            {"trigram": gram, "truck_id": row.id}
+            for row in rows for gram in plate_trigrams(row.license_plate)
+        ]
+        if values:
+            db.execute(insert(TruckPlateTrigram), values)
+        indexed += len(rows)
+        last_id = rows[-1].id
+    return indexed
+
+
+def ensure_plate_index():
+    """Build the trigram index for an existing database that predates it"""
+    db = SessionLocal()
+    try:
+        if db.query(TruckPlateTrigram.id).first() is not None:
+            return
+        if db.query(Truck.id).filter(Truck.license_plate.isnot(None)).first() is None:
+            return
+        indexed = rebuild_plate_index(db)
+        db.commit()
+        print(f"✅ Built license plate index for {indexed} trucks")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error building license plate index: {e}")
+    finally:
+        db.close()
+
+
+# =============================================================================
+# ORM EVENTS
+# =============================================================================
+
+def _insert_trigrams(connection, truck_id: int, plate: Optional[str]):
+    values: List[dict] = [{"trigram": gram, "truck_id": truck_id} for gram in plate_trigrams(plate)]
+    if values:
+        connection.execute(insert(TruckPlateTrigram), values)
+
+
+@event.listens_for(Truck, "after_insert")
+def _index_new_truck(mapper, connection, target):
+    _insert_trigrams(connection, target.id, target.license_plate)
+
+
+@event.listens_for(Truck, "after_update")
+def _reindex_truck(mapper, connection, target):
+    if not inspect(target).attrs.license_plate.history.has_changes():
+        return
+    connection.execute(delete(TruckPlateTrigram).where(TruckPlateTrigram.truck_id == target.id))
+    _insert_trigrams(connection, target.id, target.license_plate)
+
+
+@event.listens_for(Truck, "after_delete")
+def _unindex_truck(mapper, connection, target):
+    # SQLite doesn't enforce the foreign key cascade by default
+    connection.execute(delete(TruckPlateTrigram).where(TruckPlateTrigram.truck_id == target.id))
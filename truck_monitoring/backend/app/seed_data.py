@@ -8,8 +8,10 @@ import random
 from faker import Faker
 
 from .database import SessionLocal, engine
-from .models import User, Truck, DailyStatistics, Base
+from .models import User, Truck, Base
 from .auth import get_password_hash
+from .statistics_rollup import rebuild_statistics
+from .plate_index import rebuild_plate_index
 
 fake = Faker()
 
@@ -80,7 +82,6 @@ def seed_database():
         
         # Create truck data for the last 30 days
         trucks_created = 0
-        daily_stats = {}
         
         for days_ago in range(30, -1, -1):
             date = datetime.now() - timedelta(days=days_ago)
@@ -89,17 +90,6 @@ def seed_database():
             # Random number of trucks per day (20-80)
             num_trucks = random.randint(20, 80)
             
-            # Track daily statistics
-            daily_counts = {
-                "Container": 0,
-                "Flatbed": 0,
-                "Tanker": 0,
-                "other": 0
-            }
-            total_length = 0
-            total_speed = 0
-            hourly_counts = [0] * 24
-            
             for _ in range(num_trucks):
                 # Random time during the day
                 hour = random.randint(0, 23)
@@ -132,37 +122,17 @@ def seed_database():
                     notes=fake.sentence(nb_words=10) if random.random() > 0.7 else None
                 )
                 db.add(truck)
-                
-                # Update statistics
-                if truck_type in daily_counts:
-                    daily_counts[truck_type] += 1
-                else:
-                    daily_counts["other"] += 1
-                total_length += length
-                total_speed += speed
-                hourly_counts[hour] += 1
-                
                 trucks_created += 1
-            
-            # Create daily statistics
-            peak_hour = hourly_counts.index(max(hourly_counts))
-            daily_stat = DailyStatistics(
-                date=date_str,
-                total_trucks=num_trucks,
-                avg_length=round(total_length / num_trucks, 2),
-                avg_speed=round(total_speed / num_trucks, 2),
-                peak_hour=peak_hour,
-                peak_hour_count=hourly_counts[peak_hour],
-                container_count=daily_counts.get("Container", 0),
-                flatbed_count=daily_counts.get("Flatbed", 0),
-                tanker_count=daily_counts.get("Tanker", 0),
-                other_count=daily_counts["other"]
-            )
-            db.add(daily_stat)
         
         db.commit()
         print(f"✅ Created {trucks_created} truck records across 31 days")
-        print(f"✅ Created 31 daily statistics records")
+        
+        # Build daily/hourly statistics from the seeded trucks
+        days = rebuild_statistics(db)
+        print(f"✅ Created {days} daily statistics records")
+        
+        rebuild_plate_index(db)
+        db.commit()
         print("🎉 Database seeding completed successfully!")
         
     except Exception as e:
@@ -0,0 +1,466 @@
+"""
+Incremental maintenance of truck statistics rollups
+
+Each new truck is folded into DailyStatistics (running sums, type counters),
+HourlyStatistics (24 buckets per day), HourlyTruckRollup (per hour, direction
+and truck type), StatisticsSummary (all-time totals) and TruckTypeStatistics
+(all-time count per type) with atomic in-database updates, so ingest cost
+does not grow with the number of trucks already recorded.
+
+Rollups of archived months (see truck_archive) are rebuilt from their
+archive files. Run as a module to rebuild the rollups (backfills):
+    python -m app.statistics_rollup [--date YYYY-MM-DD ...]
+"""
+
+import argparse
+import itertools
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional
+
+from sqlalchemy import and_, case, extract, func, inspect, or_, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal, engine
+from .models import (
+    Truck, DailyStatistics, HourlyStatistics, HourlyTruckRollup, StatisticsSummary, TruckTypeStatistics
+)
+from .truck_archive import archived_months, archive_readable, iter_archived_trucks, month_of
+
+# Truck types with their own counter; everything else is counted as "other"
+TYPE_COUNTERS = {
+    "Container": "container_count",
+    "Flatbed": "flatbed_count",
+    "Tanker": "tanker_count",
+}
+
+SUMMARY_ID = 1
+
+# Stored in HourlyTruckRollup for a missing direction or truck type
+UNKNOWN_DIMENSION = ""
+
+# Columns added to daily_statistics for incremental maintenance
+ROLLUP_COLUMNS = {
+    "length_sum": "FLOAT DEFAULT 0",
+    "length_count": "INTEGER DEFAULT 0",
+    "speed_sum": "FLOAT DEFAULT 0",
+    "speed_count": "INTEGER DEFAULT 0",
+}
+
+
+def empty_delta() -> Dict[str, Any]:
+    """Statistics change for one date, before any trucks are added"""
+    return {
+        "total_trucks": 0,
+        "length_sum": 0.0,
+        "length_count": 0,
+        "speed_sum": 0.0,
+        "speed_count": 0,
+        "container_count": 0,
+        "flatbed_count": 0,
+        "tanker_count": 0,
+        "other_count": 0,
+        "hours": {},
+        # All-time summary: non-null values (zeros included) and exact truck types
+        "length_present": 0,
+        "speed_present": 0,
+        "types": {},
+        # (hour, direction, truck_type) -> [count, length_sum, length_count, speed_sum, speed_count]
+        "buckets": {},
+    }
+
+
+def add_truck_to_delta(delta: Dict[str, Any], truck: Truck) -> Dict[str, Any]:
+    """Fold one truck into a statistics delta"""
+    delta["total_trucks"] += 1
+    if truck.length_meters:
+        delta["length_sum"] += truck.length_meters
+        delta["length_count"] += 1
+    if truck.speed_kmh:
+        delta["speed_sum"] += truck.speed_kmh
+        delta["speed_count"] += 1
+    delta[TYPE_COUNTERS.get(truck.truck_type, "other_count")] += 1
+    hour = truck.pass_time.hour
+    delta["hours"][hour] = delta["hours"].get(hour, 0) + 1
+    if truck.length_meters is not None:
+        delta["length_present"] += 1
+    if truck.speed_kmh is not None:
+        delta["speed_present"] += 1
+    if truck.truck_type is not None:
+        delta["types"][truck.truck_type] = delta["types"].get(truck.truck_type, 0) + 1
+
+    key = (hour, truck.direction or UNKNOWN_DIMENSION, truck.truck_type or UNKNOWN_DIMENSION)
+    bucket = delta["buckets"].setdefault(key, [0, 0.0, 0, 0.0, 0])
+    bucket[0] += 1
+    if truck.length_meters is not None:
+        bucket[1] += truck.length_meters
+        bucket[2] += 1
+    if truck.speed_kmh is not None:
+        bucket[3] += truck.speed_kmh
+        bucket[4] += 1
+    return delta
+
+
+def fold_trucks(trucks: Iterable[Truck]) -> Dict[str, Dict[str, Any]]:
+    """Group trucks into one statistics delta per date"""
+    deltas: Dict[str, Dict[str, Any]] = {}
+    for truck in trucks:
+        add_truck_to_delta(deltas.setdefault(truck.date, empty_delta()), truck)
+    return deltas
+
+
+def apply_statistics_delta(db: Session, date_str: str, delta: Dict[str, Any]):
+    """
+    Apply a statistics delta for one date with atomic UPDATEs
+
+    Counters are incremented in the database (``col = col + n``) so concurrent
+    ingests don't lose updates. The caller commits.
+    """
+    if not delta["total_trucks"]:
+        return
+
+    stats = DailyStatistics
+    values = {
+        getattr(stats, column): getattr(stats, column) + delta[column]
+        for column in (
+            "total_trucks", "length_sum", "length_count", "speed_sum", "speed_count",
+            "container_count", "flatbed_count", "tanker_count", "other_count",
+        )
+    }
+    # Averages from the updated sums (the right-hand side sees the old values)
+    values[stats.avg_length] = func.coalesce(
+        (stats.length_sum + delta["length_sum"]) / func.nullif(stats.length_count + delta["length_count"], 0),
+        0.0
+    )
+    values[stats.avg_speed] = func.coalesce(
+        (stats.speed_sum + delta["speed_sum"]) / func.nullif(stats.speed_count + delta["speed_count"], 0),
+        0.0
+    )
+    values[stats.updated_at] = datetime.utcnow()
+    _increment(db, stats, {"date": date_str}, values)
+
+    for hour, count in delta["hours"].items():
+        _increment(db, HourlyStatistics, {"date": date_str, "hour": hour},
+                   {HourlyStatistics.truck_count: HourlyStatistics.truck_count + count})
+
+        hour_count = db.query(HourlyStatistics.truck_count)\
+                       .filter(HourlyStatistics.date == date_str, HourlyStatistics.hour == hour)\
+                       .scalar()
+
+        # Move the peak when this hour overtakes it, or ties it earlier in the
+        # day (the rebuild also picks the earliest of equal hours)
+        peak_count = func.coalesce(stats.peak_hour_count, 0)
+        db.query(stats)\
+          .filter(stats.date == date_str, or_(
+              peak_count < hour_count,
+              and_(peak_count == hour_count, stats.peak_hour > hour)
+          ))\
+          .update({stats.peak_hour: hour, stats.peak_hour_count: hour_count},
+                  synchronize_session=False)
+
+    rollup = HourlyTruckRollup
+    for (hour, direction, truck_type), (count, length_sum, length_count, speed_sum, speed_count) \
+            in delta["buckets"].items():
+        keys = {"date": date_str, "hour": hour, "direction": direction, "truck_type": truck_type}
+        _increment(db, rollup, keys, {
+            rollup.truck_count: rollup.truck_count + count,
+            rollup.length_sum: rollup.length_sum + length_sum,
+            rollup.length_count: rollup.length_count + length_count,
+            rollup.speed_sum: rollup.speed_sum + speed_sum,
+            rollup.speed_count: rollup.speed_count + speed_count,
+        })
+
+    _apply_summary_delta(db, delta)
+
+
+def _apply_summary_delta(db: Session, delta: Dict[str, Any]):
+    """Add a delta to the all-time summary row and per-type totals"""
+    summary = StatisticsSummary
+    _increment(db, summary, {"id": SUMMARY_ID}, {
+        summary.total_trucks: summary.total_trucks + delta["total_trucks"],
+        summary.length_sum: summary.length_sum + delta["length_sum"],
+        summary.length_count: summary.length_count + delta["length_present"],
+        summary.speed_sum: summary.speed_sum + delta["speed_sum"],
+        summary.speed_count: summary.speed_count + delta["speed_present"],
+        summary.updated_at: datetime.utcnow(),
+    })
+
+    for truck_type, count in delta["types"].items():
+        _increment(db, TruckTypeStatistics, {"truck_type": truck_type},
+                   {TruckTypeStatistics.truck_count: TruckTypeStatistics.truck_count + count})
+
+
+def update_daily_statistics(db: Session, truck: Truck):
+    """Update daily statistics after adding a new truck (constant time)"""
+    apply_statistics_delta(db, truck.date, add_truck_to_delta(empty_delta(), truck))
+    db.commit()
+
+
+def rebuild_statistics(db: Session, dates: Optional[List[str]] = None) -> int:
+    """
+    Recompute DailyStatistics, HourlyStatistics and HourlyTruckRollup from the trucks table
+    
+    Archived months are recomputed from their archive files plus any trucks
+    of theirs that arrived after archiving. The all-time summary and type
+    totals are always recomputed in full.
+
+    Args:
+        db: Database session
+        dates: Dates (YYYY-MM-DD) to rebuild; all dates when omitted
+
+    Returns:
+        Number of dates rebuilt
+    """
+    archived = archived_months(db)
+
+    def for_dates(query, column):
+        if dates:
+            query = query.filter(column.in_(dates))
+        if archived:
+            # Rebuilt separately below
+            query = query.filter(func.substr(column, 1, 7).notin_(archived))
+        return query
+
+    for_dates(db.query(HourlyTruckRollup), HourlyTruckRollup.date).delete(synchronize_session=False)
+    for_dates(db.query(HourlyStatistics), HourlyStatistics.date).delete(synchronize_session=False)
+    for_dates(db.query(DailyStatistics), DailyStatistics.date).delete(synchronize_session=False)
+
+    length = case((Truck.length_meters != 0, Truck.length_meters))
+    speed = case((Truck.speed_kmh != 0, Truck.speed_kmh))
+    totals = for_dates(db.query(
+        Truck.date,
+        func.count(Truck.id).label("total"),
+        func.sum(length).label("length_sum"),
+        func.count(length).label("length_count"),
+        func.sum(speed).label("speed_sum"),
+        func.count(speed).label("speed_count"),
+    ), Truck.date).group_by(Truck.date).all()
+
+    type_counts: Dict[str, Dict[str, int]] = {}
+    for row in for_dates(db.query(Truck.date, Truck.truck_type, func.count(Truck.id).label("count")), Truck.date)\
+            .group_by(Truck.date, Truck.truck_type):
+        counters = type_counts.setdefault(row.date, {})
+        column = TYPE_COUNTERS.get(row.truck_type, "other_count")
+        counters[column] = counters.get(column, 0) + row.count
+
+    hour = extract("hour", Truck.pass_time)
+    hour_counts: Dict[str, List[int]] = {}
+    for row in for_dates(db.query(Truck.date, hour.label("hour"), func.count(Truck.id).label("count")), Truck.date)\
+            .group_by(Truck.date, hour):
+        hour_counts.setdefault(row.date, [0] * 24)[int(row.hour)] = row.count
+
+    for row in totals:
+        counters = type_counts.get(row.date, {})
+        hourly = hour_counts.get(row.date, [0] * 24)
+        peak_hour = hourly.index(max(hourly))
+        db.add(DailyStatistics(
+            date=row.date,
+            total_trucks=row.total,
+            length_sum=row.length_sum or 0.0,
+            length_count=row.length_count,
+            speed_sum=row.speed_sum or 0.0,
+            speed_count=row.speed_count,
+            avg_length=(row.length_sum / row.length_count) if row.length_count else 0.0,
+            avg_speed=(row.speed_sum / row.speed_count) if row.speed_count else 0.0,
+            peak_hour=peak_hour,
+            peak_hour_count=hourly[peak_hour],
+            container_count=counters.get("container_count", 0),
+            flatbed_count=counters.get("flatbed_count", 0),
+            tanker_count=counters.get("tanker_count", 0),
+            other_count=counters.get("other_count", 0),
+        ))
+        db.add_all(
+            HourlyStatistics(date=row.date, hour=h, truck_count=count)
+            for h, count in enumerate(hourly) if count
+        )
+
+    direction = func.coalesce(Truck.direction, UNKNOWN_DIMENSION)
+    truck_type = func.coalesce(Truck.truck_type, UNKNOWN_DIMENSION)
+    buckets = for_dates(db.query(
+        Truck.date,
+        hour.label("hour"),
+        direction.label("direction"),
+        truck_type.label("truck_type"),
+        func.count(Truck.id).label("count"),
+        func.sum(Truck.length_meters).label("length_sum"),
+        func.count(Truck.length_meters).label("length_count"),
+        func.sum(Truck.speed_kmh).label("speed_sum"),
+        func.count(Truck.speed_kmh).label("speed_count"),
+    ), Truck.date).group_by(Truck.date, hour, direction, truck_type)
+    db.add_all(
+        HourlyTruckRollup(
+            date=row.date,
+            hour=int(row.hour),
+            direction=row.direction,
+            truck_type=row.truck_type,
+            truck_count=row.count,
+            length_sum=row.length_sum or 0.0,
+            length_count=row.length_count,
+            speed_sum=row.speed_sum or 0.0,
+            speed_count=row.speed_count,
+        )
+        for row in buckets
+    )
+
+    rebuilt = len(totals)
+    if archived:
+        db.flush()
+        rebuilt += _rebuild_archived_dates(db, archived, dates)
+
+    db.flush()
+    rebuild_summary(db)
+    db.commit()
+    return rebuilt
+
+
+def _rebuild_archived_dates(db: Session, archived: Iterable[str], dates: Optional[List[str]]) -> int:
+    """
+    Recompute the rollups of archived months from their archive files
+
+    Trucks still in the database for such a month (late detections, or an
+    interrupted archive run) are added unless the file already has them.
+    Months whose file can't be read keep their current rollups.
+    """
+    rebuilt = 0
+    months = sorted({month_of(d) for d in dates} & set(archived)) if dates else sorted(archived)
+    for month in months:
+        if not archive_readable(month):
+            print(f"⚠️  Archive for {month} is unreadable, keeping its statistics")
+            continue
+        month_dates = [d for d in dates if month_of(d) == month] if dates else None
+
+        archived_trucks = list(iter_archived_trucks(month, month_dates))
+        archived_ids = {truck.id for truck in archived_trucks}
+        hot = db.query(Truck).filter(func.substr(Truck.date, 1, 7) == month)
+        if month_dates:
+            hot = hot.filter(Truck.date.in_(month_dates))
+        deltas = fold_trucks(itertools.chain(
+            archived_trucks, (truck for truck in hot if truck.id not in archived_ids)
+        ))
+
+        for model in (HourlyTruckRollup, HourlyStatistics, DailyStatistics):
+            stale = db.query(model).filter(func.substr(model.date, 1, 7) == month)
+            if month_dates:
+                stale = stale.filter(model.date.in_(month_dates))
+            stale.delete(synchronize_session=False)
+
+        for date_str in sorted(deltas):
+            delta = deltas[date_str]
+            # Ties for the peak go to the earliest hour, as in the SQL rebuild
+            delta["hours"] = dict(sorted(delta["hours"].items()))
+            apply_statistics_delta(db, date_str, delta)
+        rebuilt += len(deltas)
+    return rebuilt
+
+
+def rebuild_summary(db: Session):
+    """
+    Recompute StatisticsSummary and TruckTypeStatistics; the caller commits
+
+    They are summed from the hourly rollup rather than the trucks table, which
+    no longer holds archived months.
+    """
+    db.query(StatisticsSummary).delete(synchronize_session=False)
+    db.query(TruckTypeStatistics).delete(synchronize_session=False)
+
+    rollup = HourlyTruckRollup
+    row = db.query(
+        func.coalesce(func.sum(rollup.truck_count), 0).label("total"),
+        func.sum(rollup.length_sum).label("length_sum"),
+        func.coalesce(func.sum(rollup.length_count), 0).label("length_count"),
+        func.sum(rollup.speed_sum).label("speed_sum"),
+        func.coalesce(func.sum(rollup.speed_count), 0).label("speed_count"),
+    ).one()
+    db.add(StatisticsSummary(
+        id=SUMMARY_ID,
+        total_trucks=row.total,
+        length_sum=row.length_sum or 0.0,
+        length_count=row.length_count,
+        speed_sum=row.speed_sum or 0.0,
+        speed_count=row.speed_count,
+    ))
+    db.add_all(
+        TruckTypeStatistics(truck_type=type_row.truck_type, truck_count=type_row.count)
+        for type_row in db.query(rollup.truck_type, func.sum(rollup.truck_count).label("count"))
+                          .filter(rollup.truck_type != UNKNOWN_DIMENSION)
+                          .group_by(rollup.truck_type)
+    )
+
+
+def upgrade_statistics_schema():
+    """Add the running-sum columns to an existing daily_statistics table and backfill the rollups"""
+    existing = {column["name"] for column in inspect(engine).get_columns("daily_statistics")}
+    missing = [name for name in ROLLUP_COLUMNS if name not in existing]
+
+    if missing:
+        with engine.begin() as conn:
+            for name in missing:
+                conn.execute(text(f"ALTER TABLE daily_statistics ADD COLUMN {name} {ROLLUP_COLUMNS[name]}"))
+
+    db = SessionLocal()
+    try:
+        if missing:
+            rebuilt = rebuild_statistics(db)
+            print(f"✅ Added statistics rollup columns and rebuilt {rebuilt} days")
+        elif db.query(Truck.id).first() is not None and db.query(HourlyTruckRollup.id).first() is None:
+            # Database from before the hourly rollup table existed
+            rebuilt = rebuild_statistics(db)
+            print(f"✅ Built statistics rollups for {rebuilt} days")
+        elif db.query(HourlyTruckRollup.id).first() is not None and db.query(StatisticsSummary.id).first() is None:
+            # Database from before the all-time summary tables existed; the
+            # rollups already cover archived months
+            rebuild_summary(db)
+            db.commit()
+            print("✅ Built the all-time statistics summary")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild truck statistics rollups from the trucks table and archives")
+    parser.add_argument("--date", action="append", dest="dates", help="Date to rebuild (YYYY-MM-DD); repeatable")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rebuilt = rebuild_statistics(db, args.dates)
+        print(f"✅ Rebuilt statistics for {rebuilt} days")
+    except Exception as e:
+        print(f"❌ Error rebuilding statistics: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _increment(db: Session, model, keys: Dict[str, Any], values: Dict[Any, Any]):
+    """
+    Apply an increment UPDATE to the rollup row identified by ``keys``
+
+    The row usually exists, so the UPDATE is tried first and the row is only
+    created when it matched nothing: one statement per rollup row on the
+    common path instead of a lookup plus the UPDATE.
+    """
+    if db.query(model).filter_by(**keys).update(values, synchronize_session=False):
+        return
+    _ensure_row(db, model, **keys)
+    db.query(model).filter_by(**keys).update(values, synchronize_session=False)
+
+
+def _ensure_row(db: Session, model, **keys):
+    """Insert the rollup row identified by ``keys`` unless it already exists"""
+    if db.query(model.id).filter_by(**keys).first() is not None:
+        return
+    # begin_nested() flushes pending objects first; their errors must not be
+    # mistaken for a row created concurrently
+    db.flush()
+    try:
+        with db.begin_nested():
+            db.add(model(**keys))
+    except IntegrityError:
+        # Created concurrently by another ingest
+        pass
+
+
+if __name__ == "__main__":
+    main()
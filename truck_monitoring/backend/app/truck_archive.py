@@ -0,0 +1,399 @@
+"""
+Monthly archival of old truck records
+
+The trucks table only keeps recent ("hot") months, so its indexes, and with
+them every hot-day query, stay the same size however many years a site has
+been running. Older months are written to one Parquet file per month
+(archive/trucks_YYYY-MM.parquet, sorted by pass_time) and removed from the
+database. The statistics rollups are kept, so dashboards and range
+statistics still cover archived months; archived trucks are read back from
+only the month files that overlap the requested dates.
+
+Every server process runs the retention job, and cron may run the module
+too, so a month is only archived under a claim on its truck_archives row;
+other processes skip it while the claim is held.
+
+Run as a module to archive (e.g. from cron):
+    python -m app.truck_archive [--retention-months N] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from sqlalchemy import and_, func, inspect, or_, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .database import SessionLocal, engine
+from .models import Truck, TruckArchive, EdgeDetection, TruckPlateTrigram
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; without it nothing is archived
+    pa = None
+    pc = None
+    pq = None
+
+# Months kept in the trucks table besides the current one; 0 keeps everything
+TRUCK_RETENTION_MONTHS = int(os.getenv("TRUCK_RETENTION_MONTHS", "0"))
+TRUCK_ARCHIVE_DIR = Path(os.getenv("TRUCK_ARCHIVE_DIR", str(Path(__file__).parent.parent / "archive")))
+TRUCK_ARCHIVE_INTERVAL_HOURS = float(os.getenv("TRUCK_ARCHIVE_INTERVAL_HOURS", "24"))
+# A claim not renewed for this long is taken to be from a crashed run and can be taken over
+TRUCK_ARCHIVE_CLAIM_MINUTES = float(os.getenv("TRUCK_ARCHIVE_CLAIM_MINUTES", "60"))
+
+# Rows per query / Parquet row group, and per delete transaction
+ARCHIVE_BATCH_SIZE = 5000
+
+# Columns needed to fold archived trucks into statistics
+STATISTICS_COLUMNS = ["id", "date", "pass_time", "length_meters", "speed_kmh", "truck_type", "direction"]
+
+# Columns added to truck_archives for archive claims
+CLAIM_COLUMNS = {
+    "claimed_by": "VARCHAR(64)",
+    "claimed_at": "TIMESTAMP",
+}
+
+
+def archive_available() -> bool:
+    return pq is not None
+
+
+def month_of(date_str: str) -> str:
+    """YYYY-MM of a YYYY-MM-DD date"""
+    return date_str[:7]
+
+
+def month_bounds(month: str) -> tuple:
+    """(first date of ``month``, first date of the next month) as YYYY-MM-DD"""
+    year, number = int(month[:4]), int(month[5:7])
+    next_year, next_number = (year + 1, 1) if number == 12 else (year, number + 1)
+    return f"{year:04d}-{number:02d}-01", f"{next_year:04d}-{next_number:02d}-01"
+
+
+def months_between(start_date: str, end_date: str) -> List[str]:
+    """Every YYYY-MM from the month of ``start_date`` to that of ``end_date``"""
+    months = []
+    month = month_of(start_date)
+    while month <= month_of(end_date):
+        months.append(month)
+        month = month_of(month_bounds(month)[1])
+    return months
+
+
+def retention_cutoff(retention_months: int, today: Optional[date] = None) -> str:
+    """First date that stays hot: the 1st of the month ``retention_months`` before this one"""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - retention_months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}-01"
+
+
+def archive_path(month: str) -> Path:
+    return TRUCK_ARCHIVE_DIR / f"trucks_{month}.parquet"
+
+
+def archived_months(db: Session) -> Set[str]:
+    """Months with an archive file (a month claimed for its first archive has none yet)"""
+    return {row.month for row in db.query(TruckArchive.month).filter(TruckArchive.archived_at.isnot(None))}
+
+
+def archive_readable(month: str) -> bool:
+    return pq is not None and archive_path(month).exists()
+
+
+# =============================================================================
+# ARCHIVING
+# =============================================================================
+
+def archivable_months(db: Session, retention_months: int, today: Optional[date] = None) -> List[str]:
+    """Months before the retention cutoff that still have trucks in the database"""
+    month = func.substr(Truck.date, 1, 7)
+    rows = db.query(month.label("month"))\
+             .filter(Truck.date < retention_cutoff(retention_months, today))\
+             .group_by(month)\
+             .order_by(month)
+    return [row.month for row in rows]
+
+
+def archive_month(db: Session, month: str) -> Optional[int]:
+    """
+    Move one month of trucks from the database into its Parquet file
+
+    A month that was archived before (late detections) is merged into the
+    existing file. The file is complete before any row is deleted, and rows
+    still in the database replace their copy in the file, so an interrupted
+    run is finished by running it again.
+
+    Returns:
+        Number of trucks moved out of the database, or None when another
+        process holds the month's claim
+    """
+    _require_pyarrow()
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[-64:]
+    if not claim_month(db, month, owner):
+        return None
+    try:
+        return _move_month(db, month, owner)
+    finally:
+        db.rollback()
+        release_month(db, month, owner)
+
+
+def claim_month(db: Session, month: str, owner: str) -> bool:
+    """
+    Claim ``month`` for archiving; commits
+
+    The claim lives on the month's truck_archives row (inserted the first
+    time a month is archived), so it holds across processes. It is taken
+    only when free or when its holder hasn't renewed it for
+    TRUCK_ARCHIVE_CLAIM_MINUTES; a conditional UPDATE, so of two processes
+    claiming at once only one matches.
+    """
+    now = datetime.utcnow()
+    claimable = or_(
+        TruckArchive.claimed_by.is_(None),
+        TruckArchive.claimed_at < now - timedelta(minutes=TRUCK_ARCHIVE_CLAIM_MINUTES)
+    )
+    claimed = db.query(TruckArchive)\
+                .filter(TruckArchive.month == month, claimable)\
+                .update({TruckArchive.claimed_by: owner, TruckArchive.claimed_at: now}, synchronize_session=False)
+    if not claimed:
+        if db.query(TruckArchive.id).filter(TruckArchive.month == month).first() is not None:
+            db.rollback()
+            return False
+        db.add(TruckArchive(month=month, file_name=archive_path(month).name, claimed_by=owner, claimed_at=now))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another process inserted the month's row first
+        db.rollback()
+        return False
+    return True
+
+
+def release_month(db: Session, month: str, owner: str):
+    """Give up a claim from claim_month; a month whose first archive failed loses its row"""
+    mine = db.query(TruckArchive).filter(TruckArchive.month == month, TruckArchive.claimed_by == owner)
+    mine.filter(TruckArchive.archived_at.is_(None)).delete(synchronize_session=False)
+    mine.update({TruckArchive.claimed_by: None, TruckArchive.claimed_at: None}, synchronize_session=False)
+    db.commit()
+
+
+def _renew_claim(db: Session, month: str, owner: str):
+    """Extend the claim in the current transaction, or fail if another process took the month over"""
+    renewed = db.query(TruckArchive)\
+                .filter(TruckArchive.month == month, TruckArchive.claimed_by == owner)\
+                .update({TruckArchive.claimed_at: datetime.utcnow()}, synchronize_session=False)
+    if not renewed:
+        raise RuntimeError(f"Lost the archive claim on {month} to another process")
+
+
+def _move_month(db: Session, month: str, owner: str) -> int:
+    """archive_month under the month's claim"""
+    first_date, next_first_date = month_bounds(month)
+    in_month = and_(Truck.date >= first_date, Truck.date < next_first_date)
+    truck_ids = [
+        row.id for row in db.query(Truck.id).filter(in_month).order_by(Truck.pass_time, Truck.id)
+    ]
+    if not truck_ids:
+        return 0
+
+    TRUCK_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    path = archive_path(month)
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+    schema = _archive_schema()
+    columns = Truck.__table__.columns
+    try:
+        with pq.ParquetWriter(temp_path, schema, compression="zstd") as writer:
+            if path.exists():
+                hot_ids = pa.array(truck_ids, type=pa.int64())
+                for batch in pq.ParquetFile(path).iter_batches(batch_size=ARCHIVE_BATCH_SIZE):
+                    batch = batch.filter(pc.invert(pc.is_in(batch.column("id"), value_set=hot_ids)))
+                    if batch.num_rows:
+                        writer.write_batch(batch)
+            for chunk in _chunks(truck_ids):
+                rows = db.query(*columns).filter(Truck.id.in_(chunk)).order_by(Truck.pass_time, Truck.id)
+                writer.write_batch(pa.RecordBatch.from_pylist([row._asdict() for row in rows], schema=schema))
+        # Writing may have taken a while; only the claim holder replaces the file
+        _renew_claim(db, month, owner)
+        db.commit()
+        os.replace(temp_path, path)
+    except BaseException:
+        _remove(temp_path)
+        raise
+
+    archive = db.query(TruckArchive).filter(TruckArchive.month == month).one()
+    archive.file_name = path.name
+    archive.row_count = pq.ParquetFile(path).metadata.num_rows
+    archive.archived_at = datetime.utcnow()
+    db.commit()
+
+    # Short delete transactions so ingest isn't locked out for the whole month.
+    # Bulk deletes skip the ORM events, so the plate index and edge detections
+    # (no cascade on SQLite) are cleared explicitly.
+    for chunk in _chunks(truck_ids):
+        db.query(TruckPlateTrigram).filter(TruckPlateTrigram.truck_id.in_(chunk)).delete(synchronize_session=False)
+        db.query(EdgeDetection).filter(EdgeDetection.truck_id.in_(chunk)).delete(synchronize_session=False)
+        db.query(Truck).filter(Truck.id.in_(chunk)).delete(synchronize_session=False)
+        _renew_claim(db, month, owner)
+        db.commit()
+
+    return len(truck_ids)
+
+
+def archive_old_months(retention_months: int = TRUCK_RETENTION_MONTHS, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Archive every month older than the retention window
+
+    Returns:
+        Trucks archived (or, for a dry run, archivable) per month
+    """
+    db = SessionLocal()
+    try:
+        archived = {}
+        for month in archivable_months(db, retention_months):
+            if dry_run:
+                first_date, next_first_date = month_bounds(month)
+                archived[month] = db.query(func.count(Truck.id))\
+                                    .filter(Truck.date >= first_date, Truck.date < next_first_date)\
+                                    .scalar()
+                continue
+            moved = archive_month(db, month)
+            if moved is None:
+                print(f"⏭️  {month} is being archived by another process, skipped")
+                continue
+            archived[month] = moved
+            print(f"📦 Archived {moved} trucks from {month} to {archive_path(month).name}")
+        return archived
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def upgrade_archive_schema():
+    """Add the claim columns to a truck_archives table created before they existed"""
+    existing = {column["name"] for column in inspect(engine).get_columns("truck_archives")}
+    missing = [name for name in CLAIM_COLUMNS if name not in existing]
+    if missing:
+        with engine.begin() as conn:
+            for name in missing:
+                conn.execute(text(f"ALTER TABLE truck_archives ADD COLUMN {name} {CLAIM_COLUMNS[name]}"))
+        print("✅ Added archive claim columns")
+
+
+async def run_retention_job(retention_months: int, interval_hours: float):
+    """Archive old months now and then every ``interval_hours``, off the event loop"""
+    while True:
+        try:
+            await run_in_threadpool(archive_old_months, retention_months)
+        except Exception as e:
+            print(f"❌ Truck archival failed: {e}")
+        await asyncio.sleep(interval_hours * 3600)
+
+
+# =============================================================================
+# READING
+# =============================================================================
+
+def read_archived_trucks(
+    start_date: str,
+    end_date: str,
+    truck_type: Optional[str] = None,
+    limit: int = 100
+) -> List[Dict[str, Any]]:
+    """
+    Archived trucks between two dates (inclusive), most recent first
+
+    Only the month files overlapping the range are opened, newest first, and
+    reading stops once ``limit`` trucks were found. Within a file the date
+    filter skips row groups by their min/max statistics.
+    """
+    _require_pyarrow()
+    filters = [("date", ">=", start_date), ("date", "<=", end_date)]
+    if truck_type:
+        filters.append(("truck_type", "==", truck_type))
+
+    trucks: List[Dict[str, Any]] = []
+    for month in reversed(months_between(start_date, end_date)):
+        path = archive_path(month)
+        if not path.exists():
+            continue
+        table = pq.read_table(path, filters=filters)\
+                  .sort_by([("pass_time", "descending"), ("id", "descending")])
+        trucks.extend(table.slice(0, limit - len(trucks)).to_pylist())
+        if len(trucks) >= limit:
+            break
+    return trucks
+
+
+def iter_archived_trucks(month: str, dates: Optional[List[str]] = None) -> Iterator[SimpleNamespace]:
+    """Archived trucks of one month (optionally only some dates), with the columns statistics need"""
+    _require_pyarrow()
+    filters = [("date", "in", sorted(dates))] if dates else None
+    table = pq.read_table(archive_path(month), columns=STATISTICS_COLUMNS, filters=filters)
+    for batch in table.to_batches(max_chunksize=ARCHIVE_BATCH_SIZE):
+        for row in batch.to_pylist():
+            yield SimpleNamespace(**row)
+
+
+def _archive_schema():
+    """Arrow schema mirroring the trucks table"""
+    arrow_types = {int: pa.int64(), float: pa.float64(), datetime: pa.timestamp("us"), str: pa.string()}
+    return pa.schema([
+        (column.name, arrow_types[column.type.python_type]) for column in Truck.__table__.columns
+    ])
+
+
+def _require_pyarrow():
+    if pq is None:
+        raise RuntimeError("Truck archives need pyarrow (pip install pyarrow)")
+
+
+def _chunks(values: List[int]) -> Iterator[List[int]]:
+    for start in range(0, len(values), ARCHIVE_BATCH_SIZE):
+        yield values[start:start + ARCHIVE_BATCH_SIZE]
+
+
+def _remove(path: Path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old months of trucks into Parquet archive files")
+    parser.add_argument("--retention-months", type=int, default=TRUCK_RETENTION_MONTHS,
+                        help="Months kept in the database besides the current one")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the months that would be archived")
+    args = parser.parse_args()
+
+    if args.retention_months <= 0:
+        print("❌ Set --retention-months (or TRUCK_RETENTION_MONTHS) to a positive number of months")
+        return
+    if not archive_available():
+        print("❌ Truck archives need pyarrow (pip install pyarrow)")
+        return
+
+    upgrade_archive_schema()
+    archived = archive_old_months(args.retention_months, args.dry_run)
+    if args.dry_run:
+        for month, count in archived.items():
+            print(f"📦 {month}: {count} trucks would be archived")
+    print(f"✅ {'Found' if args.dry_run else 'Archived'} {sum(archived.values())} trucks "
+          f"in {len(archived)} months (cutoff {retention_cutoff(args.retention_months)})")
+
+
+if __name__ == "__main__":
+    main()
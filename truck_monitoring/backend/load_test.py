@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Load test for the truck monitoring API
+Sends concurrent requests and reports throughput and latency percentiles
+
+Usage:
+    python load_test.py --scenario reads --concurrency 32 --requests 2000
+    python load_test.py --scenario ingest --concurrency 16 --requests 1000
+    python load_test.py --scenario mixed
+"""
+
+import argparse
+import itertools
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+DEFAULT_URL = "http://localhost:8095"
+
+
+class LoadTest:
+    """Runs one scenario with a pool of worker threads, one HTTP session per thread"""
+
+    def __init__(self, base_url: str, username: str, password: str):
+        self.base_url = base_url.rstrip("/")
+        self.local = threading.local()
+        self.edge_id = random.randint(10_000, 99_999)
+        self.sequence = itertools.count()
+        self.start_time = datetime.now() - timedelta(hours=1)
+
+        response = requests.post(
+            f"{self.base_url}/api/auth/login",
+            data={"username": username, "password": password}
+        )
+        response.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        trucks = requests.get(
+            f"{self.base_url}/api/trucks/?page_size=100&count=none", headers=self.headers
+        ).json()["trucks"]
+        self.truck_ids = [truck["id"] for truck in trucks] or [1]
+        self.dates = sorted({truck["date"] for truck in trucks}) or [datetime.now().strftime("%Y-%m-%d")]
+
+    @property
+    def session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    # =============================================================================
+    # REQUESTS
+    # =============================================================================
+
+    def read_request(self):
+        choice = random.random()
+        if choice < 0.35:
+            path = "/api/trucks/?page_size=20&count=estimate"
+        elif choice < 0.55:
+            path = f"/api/trucks/{random.choice(self.truck_ids)}"
+        elif choice < 0.75:
+            path = f"/api/statistics/hourly/{random.choice(self.dates)}"
+        elif choice < 0.9:
+            path = "/api/statistics/range?days=30&bucket=day"
+        else:
+            path = "/api/statistics/dashboard"
+        return self.session.get(f"{self.base_url}{path}", headers=self.headers)
+
+    def ingest_request(self):
+        # Unique (id, timestamp) per request so nothing is rejected as a duplicate
+        n = next(self.sequence)
+        timestamp = (self.start_time + timedelta(milliseconds=n)).isoformat(timespec="milliseconds")
+        return self.session.post(f"{self.base_url}/api/truck-count", json={
+            "id": self.edge_id,
+            "timestamp": timestamp,
+            "length_mm": random.randint(5000, 18000),
+            "height_mm": random.randint(2500, 4200),
+            "is_truck": True,
+            "classification_confidence": 0.9,
+            "image_path": f"load_{uuid.uuid4().hex[:8]}.jpg",
+            "direction": random.randint(0, 4),
+            "speed_kmh": round(random.uniform(30, 90), 1)
+        })
+
+    def mixed_request(self):
+        return self.ingest_request() if random.random() < 0.2 else self.read_request()
+
+    # =============================================================================
+    # RUNNER
+    # =============================================================================
+
+    def run(self, scenario: str, concurrency: int, total: int) -> dict:
+        request = {"reads": self.read_request, "ingest": self.ingest_request, "mixed": self.mixed_request}[scenario]
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+
+        def one(_):
+            nonlocal errors
+            start = time.perf_counter()
+            try:
+                ok = request().status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(total)))
+        duration = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "requests": total,
+            "errors": errors,
+            "duration_s": duration,
+            "throughput_rps": total / duration,
+            "p50_ms": latencies[len(latencies) // 2] * 1000,
+            "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+            "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+            "mean_ms": statistics.mean(latencies) * 1000,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the truck monitoring API")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--scenario", choices=("reads", "ingest", "mixed"), default="reads")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    args = parser.parse_args()
+
+    print("🚛 Truck Monitoring Load Test")
+    print("=" * 50)
+    print(f"Target: {args.url} | scenario: {args.scenario} | "
+          f"concurrency: {args.concurrency} | requests: {args.requests}")
+
+    try:
+        load_test = LoadTest(args.url, args.username, args.password)
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Could not connect to server: {e}")
+        return
+
+    # Warm up connections and caches
+    load_test.run(args.scenario, args.concurrency, min(100, args.requests))
+    result = load_test.run(args.scenario, args.concurrency, args.requests)
+
+    print(f"✅ {result['requests']} requests in {result['duration_s']:.2f}s ({result['errors']} errors)")
+    print(f"   Throughput: {result['throughput_rps']:.1f} req/s")
+    print(f"   Latency:    p50 {result['p50_ms']:.1f} ms | p95 {result['p95_ms']:.1f} ms | "
+          f"p99 {result['p99_ms']:.1f} ms | mean {result['mean_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()